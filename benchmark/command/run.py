@@ -0,0 +1,50 @@
+import argparse
+from datetime import date
+import json
+import os
+import sys
+
+#benchmark.settings must be imported before resource_tracking
+from benchmark import settings
+from benchmark import seed,harness
+
+parser = argparse.ArgumentParser(prog="benchmark",description='Benchmark the archive and restore pipeline of the logged points with synthetic data and a local storage')
+parser.add_argument('--start-date',dest='start_date', type=date.fromisoformat, action='store',default=date(2020,1,1),help='The first seeded day, default is 2020-01-01')
+parser.add_argument('--days',dest='days', type=int, action='store',default=3,help='The number of seeded days, all days must be in the same month')
+parser.add_argument('--devices',dest='devices', type=int, action='store',default=100,help='The number of seeded devices')
+parser.add_argument('--points-per-day',dest='points_per_day', type=int, action='store',default=1440,help='The number of logged points of each device per day')
+parser.add_argument('--workers',dest="workers", type=int,action='store',help='The number of days exported concurrently by archive_by_month')
+parser.add_argument('--delete', action='store_true',help='Delete the archived logged points after archiving, and restore them into table tracking_loggedpoint at the end')
+parser.add_argument('--no-seed',dest='no_seed', action='store_true',help='Use the logged points seeded by the previous run')
+parser.add_argument('--container', action='store_true',help='Start a local postgis container for the benchmark and stop it at the end')
+parser.add_argument('--output',dest='output', action='store',help='The json file of the benchmark result, default is <benchmark folder>/result_<commit>.json')
+parser.add_argument('--compare',dest='compare', action='store',help='A previous benchmark result to compare with')
+
+def run():
+    args = parser.parse_args(sys.argv[2:])
+    if args.container:
+        seed.start_container()
+    try:
+        benchmark = harness.Benchmark(args.start_date,args.days,args.devices,args.points_per_day,workers=args.workers,delete=args.delete)
+        result = benchmark.run(seed_data=not args.no_seed)
+    finally:
+        if args.container:
+            seed.stop_container()
+
+    output = args.output or os.path.join(settings.BENCHMARK_FOLDER,"result_{}.json".format(result["commit"] or "unknown"))
+    harness.save(result,output)
+    for name,operation in result["operations"].items():
+        print("{}\t{:.3f}s\trows/s={}".format(name,operation["seconds"],operation["rows_per_second"]))
+        for stage,data in operation["stages"].items():
+            print("\t{}\tcalls={}\t{:.3f}s".format(stage,data["calls"],data["seconds"]))
+        print("\tconnections: checkouts={}\tcreated={}\twait={:.3f}s\tconnect={:.3f}s".format(
+            operation["pool"]["checkouts"],operation["pool"]["created"],operation["pool"]["wait_seconds"],operation["pool"]["connect_seconds"]
+        ))
+    print("The benchmark result is saved to {}".format(output))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print("Compare with {}(commit={})".format(args.compare,baseline.get("commit")))
+        for name,stage,baseline_seconds,seconds,ratio in harness.compare(result,baseline):
+            print("{}\t{}\t{:.3f}s -> {:.3f}s\t{}".format(name,stage or "total",baseline_seconds,seconds,"x{:.2f}".format(ratio) if ratio else ""))
@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import logging
+import threading
+import subprocess
+from datetime import timedelta
+
+from data_storage import IndexedGroupResourceRepository,LocalStorage
+
+from utils import timezone
+import utils
+
+from resource_tracking import settings as resource_tracking_settings
+from resource_tracking import archive,verify,loader,downloader
+
+from . import settings
+from . import seed
+
+logger = logging.getLogger(__name__)
+
+class StageTimer(object):
+    """
+    Accumulate the calls and the elapsed seconds of the stages of the archive and restore pipeline.
+    A stage is timed by replacing a function(or a method) with a timing wrapper, the original functions are put back by 'restore'.
+    The stages run in worker threads are accumulated too, so the seconds of a stage can be greater than the elapsed time of the operation.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._patched = []
+        self.stages = {}
+
+    def wrap(self,obj,name,stage):
+        func = getattr(obj,name)
+        def _func(*args,**kwargs):
+            starttime = time.time()
+            try:
+                return func(*args,**kwargs)
+            finally:
+                elapsed = time.time() - starttime
+                with self._lock:
+                    calls,seconds = self.stages.get(stage,(0,0))
+                    self.stages[stage] = (calls + 1,seconds + elapsed)
+        self._patched.append((obj,name,func))
+        setattr(obj,name,_func)
+
+    def restore(self):
+        while self._patched:
+            obj,name,func = self._patched.pop()
+            setattr(obj,name,func)
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+
+    def result(self):
+        return dict((stage,{"calls":calls,"seconds":round(seconds,3)}) for stage,(calls,seconds) in sorted(self.stages.items()))
+
+def _get_commit():
+    try:
+        return subprocess.check_output(["git","rev-parse","--short","HEAD"],cwd=settings.HOME_DIR,stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+class Benchmark(object):
+    """
+    Benchmark the archive and restore pipeline of the loggedpoints against the benchmark database and a local storage
+    start_date: the first seeded day, all seeded days must be in the same month
+    days: the number of seeded days
+    devices: the number of seeded devices
+    points_per_day: the number of loggedpoints of each device per day
+    workers: the number of days exported concurrently by 'archive_by_month'
+    delete: delete the archived loggedpoints after archiving; the month is restored into table tracking_loggedpoint at the end
+    """
+    def __init__(self,start_date,days,devices,points_per_day,workers=None,delete=False):
+        if (start_date + timedelta(days=days - 1)).month != start_date.month:
+            raise Exception("All seeded days must be in the same month")
+        self.start_date = start_date
+        self.days = days
+        self.devices = devices
+        self.points_per_day = points_per_day
+        self.workers = workers
+        self.delete = delete
+        self.folder = settings.BENCHMARK_FOLDER
+        self.storage_folder = os.path.join(self.folder,"storage")
+        self.download_folder = os.path.join(self.folder,"download")
+        self.timer = StageTimer()
+
+    def _setup(self):
+        """
+        Replace the blob resource with a local storage, and disable the features which require azure blob storage
+        Return the original settings which are restored after benchmarking
+        """
+        for folder in (self.storage_folder,self.download_folder):
+            if os.path.exists(folder):
+                utils.remove_folder(folder)
+            os.makedirs(folder)
+        archive._blob_storage = LocalStorage(self.storage_folder)
+        archive._blob_resource = IndexedGroupResourceRepository(
+            archive._blob_storage,
+            resource_tracking_settings.LOGGEDPOINT_RESOURCE_NAME,
+            archive.get_metaname,
+            archive=False,
+            index_metaname=archive.index_metaname
+        )
+        overrides = {
+            "LOGGEDPOINT_CATALOG_ENABLED":False,
+            "LOGGEDPOINT_JOURNAL_DIR":os.path.join(self.folder,"journal")
+        }
+        originals = dict((key,getattr(resource_tracking_settings,key)) for key in overrides)
+        for key,value in overrides.items():
+            setattr(resource_tracking_settings,key,value)
+
+        self.timer.wrap(archive,"export_archive","export")
+        self.timer.wrap(archive,"publish_archive","publish")
+        self.timer.wrap(archive._blob_resource,"push_file","upload")
+        self.timer.wrap(verify,"check","verify")
+        self.timer.wrap(archive,"_update_group_index","index")
+        self.timer.wrap(archive,"delete_archived_data","delete")
+        self.timer.wrap(downloader.GroupDownloader,"_download","download_file")
+        self.timer.wrap(loader,"load_files","load")
+        self.timer.wrap(loader,"_load_file","load_file")
+        self.timer.wrap(archive,"_restore_data","ogr2ogr_restore")
+        return originals
+
+    def _teardown(self,originals):
+        self.timer.restore()
+        for key,value in originals.items():
+            setattr(resource_tracking_settings,key,value)
+        archive._blob_resource = None
+        archive._blob_storage = None
+
+    def _get_operations(self):
+        d = self.start_date
+        check = verify.CHECK_FULL
+        operations = [
+            ("archive_by_date",self.points_per_day * self.devices,lambda:archive.archive_by_date(d,delete_after_archive=self.delete,check=check,overwrite=True)),
+            ("archive_by_month",self.points_per_day * self.devices * (self.days - 1 if self.delete else self.days),lambda:archive.archive_by_month(d.year,d.month,delete_after_archive=self.delete,check=check,overwrite=True,workers=self.workers)),
+            ("download_by_month",None,lambda:archive.download_by_month(d.year,d.month,folder=self.download_folder,overwrite=True)),
+            ("restore_by_date",self.points_per_day * self.devices,lambda:archive.restore_by_date(d)),
+            ("restore_by_month",self.points_per_day * self.devices * self.days,lambda:archive.restore_by_month(d.year,d.month))
+        ]
+        if self.delete:
+            #put the deleted loggedpoints back, so the benchmark can run again without seeding
+            operations.append(("restore_by_month_to_origin_table",self.points_per_day * self.devices * self.days,lambda:archive.restore_by_month(d.year,d.month,restore_to_origin_table=True)))
+        return operations
+
+    def run(self,seed_data=True):
+        """
+        Seed the data if required, then run and time the operations one by one
+        Return the benchmark result
+        """
+        db = resource_tracking_settings.DATABASE
+        result = {
+            "commit":_get_commit(),
+            "started":timezone.now().isoformat(),
+            "scale":{
+                "start_date":self.start_date.isoformat(),
+                "days":self.days,
+                "devices":self.devices,
+                "points_per_day":self.points_per_day
+            },
+            "settings":dict((key,getattr(resource_tracking_settings,key)) for key in (
+                "LOGGEDPOINT_ARCHIVE_FORMAT",
+                "LOGGEDPOINT_EXPORT_ENGINE",
+                "LOGGEDPOINT_RESTORE_ENGINE",
+                "LOGGEDPOINT_RESTORE_WORKERS",
+                "LOGGEDPOINT_DOWNLOAD_WORKERS",
+                "LOGGEDPOINT_DELETE_CHUNK_BY",
+                "LOGGEDPOINT_DELETE_CHUNK_SIZE",
+                "LOGGEDPOINT_ARCHIVE_CHUNK_THRESHOLD"
+            )),
+            "workers":self.workers,
+            "delete":self.delete,
+            "operations":{}
+        }
+        if seed_data:
+            starttime = time.time()
+            result["scale"]["rows"] = seed.seed(db,self.start_date,self.days,self.devices,self.points_per_day)
+            result["seed_seconds"] = round(time.time() - starttime,3)
+
+        originals = self._setup()
+        try:
+            for name,rows,func in self._get_operations():
+                logger.info("Begin to benchmark {}".format(name))
+                self.timer.reset()
+                pool_stats = db.pool_stats()
+                starttime = time.time()
+                func()
+                elapsed = time.time() - starttime
+                result["operations"][name] = {
+                    "seconds":round(elapsed,3),
+                    "rows_per_second":round(rows / elapsed,1) if rows and elapsed > 0 else None,
+                    "stages":self.timer.result(),
+                    "pool":_pool_delta(pool_stats,db.pool_stats())
+                }
+                logger.info("End to benchmark {}, elapsed={:.3f}s".format(name,elapsed))
+        finally:
+            self._teardown(originals)
+        return result
+
+def save(result,filename):
+    folder = os.path.dirname(os.path.abspath(filename))
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(filename,"w") as f:
+        json.dump(result,f,indent=4,sort_keys=True)
+
+def compare(result,baseline):
+    """
+    Compare the benchmark result with the baseline result
+    Return a list of (operation,stage,baseline seconds,seconds,ratio); the stage is None for the whole operation
+    """
+    rows = []
+    for name,operation in result["operations"].items():
+        baseline_operation = baseline.get("operations",{}).get(name)
+        if not baseline_operation:
+            continue
+        rows.append((name,None,baseline_operation["seconds"],operation["seconds"]))
+        for stage,data in operation["stages"].items():
+            baseline_stage = baseline_operation["stages"].get(stage)
+            if baseline_stage:
+                rows.append((name,stage,baseline_stage["seconds"],data["seconds"]))
+    return [(name,stage,baseline_seconds,seconds,seconds / baseline_seconds if baseline_seconds else None) for name,stage,baseline_seconds,seconds in rows]
+
+#the accumulated counters of the connection pool
+pool_counters = ("checkouts","wait_seconds","created","connect_seconds","closed","unhealthy")
+
+def _pool_delta(before,after):
+    """
+    Return the pool counters increased by an operation
+    """
+    return dict((key,round(after[key] - before[key],3)) for key in pool_counters)
@@ -0,0 +1,118 @@
+import time
+import logging
+import subprocess
+from datetime import timedelta
+
+from utils import timezone
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+#the prefix of the deviceid of the synthetic devices
+DEVICE_PREFIX = "benchmark"
+
+#the minimal schema of the tables used by archiving and restoring
+create_schema_sql = [
+    "CREATE EXTENSION IF NOT EXISTS postgis",
+    """CREATE TABLE IF NOT EXISTS tracking_device (
+        id serial PRIMARY KEY,
+        deviceid varchar(32) NOT NULL UNIQUE,
+        registration varchar(32)
+    )""",
+    """CREATE TABLE IF NOT EXISTS tracking_loggedpoint (
+        id bigserial PRIMARY KEY,
+        device_id integer NOT NULL REFERENCES tracking_device (id),
+        point geometry(Point,4326) NOT NULL,
+        heading double precision NOT NULL DEFAULT 0,
+        velocity double precision NOT NULL DEFAULT 0,
+        altitude double precision NOT NULL DEFAULT 0,
+        seen timestamp with time zone NOT NULL,
+        message integer NOT NULL DEFAULT 3,
+        source_device_type varchar(32) NOT NULL DEFAULT 'other',
+        raw text
+    )""",
+    "CREATE INDEX IF NOT EXISTS tracking_loggedpoint_seen_idx ON tracking_loggedpoint (seen)",
+    "CREATE INDEX IF NOT EXISTS tracking_loggedpoint_device_id_idx ON tracking_loggedpoint (device_id)"
+]
+
+seed_devices_sql = "INSERT INTO tracking_device (deviceid,registration) SELECT '{0}' || lpad(i::text,6,'0'),'REG' || i FROM generate_series(1,{1}) AS i ON CONFLICT (deviceid) DO NOTHING"
+
+delete_loggedpoints_sql = "DELETE FROM tracking_loggedpoint WHERE seen >= '{0}' AND seen < '{1}'"
+
+#the loggedpoints of a day, each device reports at a fixed interval from a random start offset
+seed_loggedpoints_sql = """INSERT INTO tracking_loggedpoint (device_id,point,heading,velocity,altitude,seen,message,source_device_type,raw)
+SELECT d.id,
+    ST_SetSRID(ST_MakePoint(113 + random() * 16,-35 + random() * 21),4326),
+    round((random() * 360)::numeric,1),
+    round((random() * 120)::numeric,1),
+    round((random() * 500)::numeric,1),
+    '{0}'::timestamptz + (s.i * {3} + random() * {3}) * interval '1 second',
+    (random() * 10)::integer,
+    (ARRAY['tracplus','iriditrak','dplus','spot','dfes','mp70','fleetcare','other'])[1 + (d.id % 8)],
+    '{{"lat":' || (-35 + random() * 21)::numeric(8,5) || ',"lon":' || (113 + random() * 16)::numeric(8,5) || '}}'
+FROM tracking_device d CROSS JOIN generate_series(0,{2} - 1) AS s(i)
+WHERE d.deviceid LIKE '{1}%'"""
+
+datetime_pattern = "%Y-%m-%d %H:%M:%S %Z"
+
+def start_container():
+    """
+    Start a local postgis container for the benchmark, and wait until the database accepts connections
+    """
+    logger.info("Start the postgis container({}) from image({}) on port {}".format(settings.BENCHMARK_CONTAINER_NAME,settings.BENCHMARK_CONTAINER_IMAGE,settings.BENCHMARK_CONTAINER_PORT))
+    subprocess.check_call([
+        "docker","run","-d","--rm",
+        "--name",settings.BENCHMARK_CONTAINER_NAME,
+        "-p","{}:5432".format(settings.BENCHMARK_CONTAINER_PORT),
+        "-e","POSTGRES_PASSWORD={}".format(settings.BENCHMARK_CONTAINER_PASSWORD),
+        settings.BENCHMARK_CONTAINER_IMAGE
+    ])
+    starttime = time.time()
+    while True:
+        #the postgis image restarts the server once after initializing the database, so wait for two successful checks
+        if subprocess.call(["docker","exec",settings.BENCHMARK_CONTAINER_NAME,"pg_isready","-U","postgres","-h","localhost"],stdout=subprocess.DEVNULL) == 0:
+            time.sleep(2)
+            if subprocess.call(["docker","exec",settings.BENCHMARK_CONTAINER_NAME,"pg_isready","-U","postgres","-h","localhost"],stdout=subprocess.DEVNULL) == 0:
+                break
+        if time.time() - starttime > 120:
+            stop_container()
+            raise Exception("The postgis container({}) is not ready after 120 seconds".format(settings.BENCHMARK_CONTAINER_NAME))
+        time.sleep(1)
+
+def stop_container():
+    logger.info("Stop the postgis container({})".format(settings.BENCHMARK_CONTAINER_NAME))
+    subprocess.call(["docker","stop",settings.BENCHMARK_CONTAINER_NAME],stdout=subprocess.DEVNULL)
+
+def seed(db,start_date,days,devices,points_per_day,random_seed=0.5):
+    """
+    Seed the synthetic devices and loggedpoints; the existing loggedpoints between the start date and the end date are deleted first.
+    Each day is inserted and committed in its own transaction.
+    start_date: the first day
+    days: the number of days
+    devices: the number of devices
+    points_per_day: the number of loggedpoints of each device per day
+    random_seed: the seed of the random values, so the seeded data is the same between runs
+    Return the number of seeded loggedpoints
+    """
+    for sql in create_schema_sql:
+        db.executeDDL(sql)
+    db.update(seed_devices_sql.format(DEVICE_PREFIX,devices))
+
+    start = timezone.datetime(start_date.year,start_date.month,start_date.day)
+    end = start + timedelta(days=days)
+    starttime = time.time()
+    logger.info("Begin to seed {} loggedpoints, devices={}, days={}, points per day={}".format(devices * days * points_per_day,devices,days,points_per_day))
+    rows = 0
+    with db:
+        db.update(delete_loggedpoints_sql.format(start.strftime(datetime_pattern),end.strftime(datetime_pattern)))
+        db.get("SELECT setseed({})".format(random_seed))
+        interval = 86400 / points_per_day
+        for i in range(days):
+            day = start + timedelta(days=i)
+            rows += db.update(seed_loggedpoints_sql.format(day.strftime(datetime_pattern),DEVICE_PREFIX,points_per_day,interval))
+            logger.debug("Seeded the loggedpoints of {}, seeded rows={}".format(day.date(),rows))
+    db.executeDDL("ANALYZE tracking_device")
+    db.executeDDL("ANALYZE tracking_loggedpoint")
+    logger.info("End to seed {} loggedpoints in {:.1f}s".format(rows,time.time() - starttime))
+    return rows
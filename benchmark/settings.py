@@ -0,0 +1,22 @@
+import os
+
+from common_settings import *
+
+#the port and the password of the local postgis container started by the benchmark
+BENCHMARK_CONTAINER_PORT = env("BENCHMARK_CONTAINER_PORT",vtype=int,default=55432)
+BENCHMARK_CONTAINER_PASSWORD = env("BENCHMARK_CONTAINER_PASSWORD",default="benchmark")
+#the docker image of the local postgis container
+BENCHMARK_CONTAINER_IMAGE = env("BENCHMARK_CONTAINER_IMAGE",default="postgis/postgis:12-3.0")
+#the name of the local postgis container
+BENCHMARK_CONTAINER_NAME = env("BENCHMARK_CONTAINER_NAME",default="loggedpoint_benchmark")
+#the database to seed and benchmark, the default is the local postgis container. never point it to a production database
+BENCHMARK_DATABASE_URL = env("BENCHMARK_DATABASE_URL",default="postgis://postgres:{}@localhost:{}/postgres".format(BENCHMARK_CONTAINER_PASSWORD,BENCHMARK_CONTAINER_PORT))
+#the folder of the local storage, the downloaded files and the benchmark results
+BENCHMARK_FOLDER = env("BENCHMARK_FOLDER",default=os.path.join(HOME_DIR,"benchmark_data"))
+
+#resource_tracking must use the benchmark database and a local storage, so the environment is set before 'resource_tracking.settings' is imported.
+#the azure settings are never used, because the blob resource is replaced by a local storage
+os.environ["RESOURCE_TRACKING_DATABASE_URL"] = BENCHMARK_DATABASE_URL
+os.environ["RESOURCE_TRACKING_STORAGE_CONNECTION_STRING"] = "benchmark"
+os.environ["RESOURCE_TRACKING_CONTAINER"] = "benchmark"
+os.environ["LOGGEDPOINT_RESOURCE_NAME"] = "loggedpoint_benchmark"
@@ -4,32 +4,202 @@ import subprocess
 import tempfile
 import re
 import os
+import json
+import uuid
+import hashlib
+import itertools
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from datetime import datetime,date,timezone
 
-import psycopg2
+import psycopg2.extras
 
-from utils import parse_db_connection_string,classproperty,gdal
+from utils import parse_db_connection_string,classproperty,gdal,gpkg,geoparquet,compression
 
 from . import exceptions
+from . import pool
+from . import pgcopy
 
 
 
 logger = logging.getLogger(__name__)
 
+#stream the exported data into geopackage or geoparquet in process
+EXPORT_ENGINE_NATIVE = "native"
+#export the data with gdal command 'ogr2ogr'
+EXPORT_ENGINE_OGR2OGR = "ogr2ogr"
+
+#the sql to check whether the sql returns any rows without scanning all rows
+exists_sql = "SELECT EXISTS ({})"
+#the sql to start a repeatable read transaction, must be executed before any query in the transaction
+repeatable_read_sql = "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY"
+
+#the formats of 'copy_out'
+#the formats supported by postgresql 'COPY'
+COPY_CSV = "csv"
+COPY_TEXT = "text"
+COPY_BINARY = "binary"
+#newline-delimited json, a json object per row
+COPY_NDJSON = "ndjson"
+copy_out_formats = (COPY_CSV,COPY_TEXT,COPY_BINARY,COPY_NDJSON)
+#the sql to export the rows of a query with 'COPY'
+copy_out_sql = "COPY ({0}) TO STDOUT (FORMAT {1}{2})"
+#the sql to export the rows of a query as newline-delimited json with 'COPY'.
+#jsonb never contains a raw control character, so a json document never contains the quote character, the delimiter or a newline, and is written as is by csv format
+copy_out_ndjson_sql = "COPY (SELECT to_jsonb(t)::text FROM ({0}) t) TO STDOUT (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')"
+
+#the placeholders of the bound parameters and the escaped '%'
+_placeholder_re = re.compile("%%|%s")
+
+def _to_prepared_sql(sql):
+    """
+    Convert the sql with psycopg2's '%s' placeholders to the sql used by 'PREPARE' with '$1','$2',... placeholders
+    """
+    counter = itertools.count(1)
+    return _placeholder_re.sub(lambda m:"%" if m.group(0) == "%%" else "${}".format(next(counter)),sql)
+
+def _pages(rows,page_size):
+    """
+    Split an iterable of rows into lists of at most page_size rows
+    """
+    rows = iter(rows)
+    while True:
+        page = list(itertools.islice(rows,page_size))
+        if not page:
+            return
+        yield page
+
+#the result types of 'iter_query'
+#yield a tuple per row
+ITER_TUPLE = "tuple"
+#yield a namedtuple per row, the fields are the column names
+ITER_RECORD = "record"
+#yield a dict of column name to the list of column values per batch of rows
+ITER_COLUMNS = "columns"
+
+#postgresql type oid to geopackage field type
+gpkg_field_types = {
+    16:"BOOLEAN",   #bool
+    17:"BLOB",      #bytea
+    20:"INTEGER",   #int8
+    21:"SMALLINT",  #int2
+    23:"MEDIUMINT", #int4
+    26:"INTEGER",   #oid
+    700:"FLOAT",    #float4
+    701:"REAL",     #float8
+    1700:"REAL",    #numeric
+    1082:"DATE",    #date
+    1114:"DATETIME",#timestamp
+    1184:"DATETIME",#timestamptz
+}
+
+def _to_gpkg_datetime(v):
+    if v.tzinfo:
+        v = v.astimezone(timezone.utc)
+    return v.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+def _to_gpkg_value(v):
+    """
+    Convert a value which is not supported by sqlite3 to a geopackage value
+    """
+    if v is None:
+        return None
+    elif isinstance(v,Decimal):
+        return float(v)
+    elif isinstance(v,datetime):
+        return _to_gpkg_datetime(v)
+    elif isinstance(v,date):
+        return v.isoformat()
+    elif isinstance(v,memoryview):
+        return v.tobytes()
+    elif isinstance(v,(dict,list)):
+        return json.dumps(v)
+    else:
+        return v
+
 
 class PostgreSQL(object):
+    """
+    The database object.
+    The connections are checked out from a thread safe connection pool shared by the database objects with the same database url,
+    and the connection and the cursor of a 'with' block are kept per thread, so a database object can be shared between threads.
+    The 'with' blocks are reentrant, a nested 'with' block uses the connection of the outermost 'with' block in the same thread.
+    pool_minsize,pool_maxsize,pool_idle_timeout,pool_health_check,pool_timeout: the options of the connection pool(see 'pool.ConnectionPool'),
+        only used by the first database object of the database url
+    The sql of 'query','get','update' and 'iter_query' can have bound parameters with '%s' placeholders which are passed by 'params'.
+    If 'prepared' is True, the sql is prepared as a named statement when it is first executed on a connection,
+    and the prepared statement is reused by the following executions on the same connection, so the sql is parsed and planned once per connection.
+    """
     non_char = re.compile("[^a-zA-Z0-9\_]+")
     head_or_tail_non_char = re.compile("^[^a-zA-Z0-9]+|[^a-zA-Z0-9]+$")
-    def __init__(self,db_url):
+    def __init__(self,db_url,pool_minsize=1,pool_maxsize=10,pool_idle_timeout=300,pool_health_check=30,pool_timeout=None):
+        self._db_url = db_url
         self._params = parse_db_connection_string(db_url)
-        self._connection = None
-        self._cursor = None
+        self._pool = pool.get_pool(
+            db_url,
+            self._params,
+            minsize=pool_minsize,
+            maxsize=pool_maxsize,
+            idle_timeout=pool_idle_timeout,
+            health_check=pool_health_check,
+            timeout=pool_timeout
+        )
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        return getattr(self._local,"connection",None)
+
+    @_connection.setter
+    def _connection(self,connection):
+        self._local.connection = connection
+
+    @property
+    def _cursor(self):
+        return getattr(self._local,"cursor",None)
+
+    @_cursor.setter
+    def _cursor(self,cursor):
+        self._local.cursor = cursor
+
+    def pool_stats(self):
+        """
+        Return the counters of the connection pool
+        """
+        return self._pool.stats()
+
+    @classmethod
+    def get_table_name(cls,name):
+        """
+        Return a valid table name from a layer name or file name
+        """
+        return cls.non_char.sub("_",cls.head_or_tail_non_char.sub("",name))
+
+    def clone(self):
+        """
+        Return a new database object with the same connection parameters, which shares the same connection pool.
+        """
+        return PostgreSQL(self._db_url)
 
     def __enter__(self):
-        self._connection = psycopg2.connect(host=self._params["host"],port=self._params["port"],dbname=self._params["dbname"],user=self._params["user"],password=self._params["password"])
-        self._cursor = self._connection.cursor()
+        depth = getattr(self._local,"depth",0)
+        if depth == 0:
+            self._connection = self._pool.getconn()
+            try:
+                self._cursor = self._connection.cursor()
+            except:
+                self._pool.putconn(self._connection,close=True)
+                self._connection = None
+                raise
+        self._local.depth = depth + 1
         return self
 
     def __exit__ (self, type, value, tb):
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
         if self._cursor:
             try:
                 self._cursor.close()
@@ -39,43 +209,118 @@ class PostgreSQL(object):
                 self._cursor = None
         if self._connection:
             try:
-                self._connection.close()
+                #the open transaction is rolled back and the broken connection is closed by the pool
+                self._pool.putconn(self._connection)
             except:
                 logger.error(traceback.format_exc())
             finally:
                 self._connection = None
 
-    def query(self,sql,columns=None):
+    def commit(self):
+        """
+        Commit the current transaction, only can be called in a 'with' block
+        """
+        self._connection.commit()
+
+    def rollback(self):
+        """
+        Rollback the current transaction, only can be called in a 'with' block
+        """
+        self._connection.rollback()
+
+    def _execute(self,sql,params=None,prepared=False):
+        """
+        Execute the sql with the bound parameters, prepare the sql on the connection first if prepared is True
+        """
+        if not prepared:
+            self._cursor.execute(sql,params)
+            return
+        name = "prepared_{}".format(hashlib.md5(sql.encode()).hexdigest())
+        statements = self._pool.prepared_statements(self._connection)
+        if name not in statements:
+            self._cursor.execute("PREPARE {} AS {}".format(name,_to_prepared_sql(sql)))
+            statements.add(name)
+        if params:
+            self._cursor.execute("EXECUTE {} ({})".format(name,",".join(["%s"] * len(params))),params)
+        else:
+            self._cursor.execute("EXECUTE {}".format(name))
+
+    def query(self,sql,columns=None,params=None,prepared=False):
         """
         Execute select sql and return a list of tuple or a list of dict if columns is not None
         """
         if self._cursor:
-            return self._query(sql,columns=columns)
+            return self._query(sql,columns=columns,params=params,prepared=prepared)
         else:
             with self as db:
-                return db._query(sql,columns=columns)
+                return db._query(sql,columns=columns,params=params,prepared=prepared)
                 
-    def _query(self,sql,columns=None):
-        self._cursor.execute(sql)
+    def _query(self,sql,columns=None,params=None,prepared=False):
+        self._execute(sql,params=params,prepared=prepared)
         if columns:
             return [dict(zip(columns,row)) for row in self._cursor.fetchall()]
         else:
             return self._cursor.fetchall()
 
+    def iter_query(self,sql,itersize=10000,result_type=ITER_TUPLE,params=None):
+        """
+        Execute select sql with a server side cursor and return a generator of the rows, the rows are fetched from the server batch by batch,
+        so a large result is iterated in constant memory.
+        itersize: the number of rows fetched from the server each time; the number of rows in each batch if result_type is ITER_COLUMNS
+        result_type: ITER_TUPLE: yield a tuple per row; ITER_RECORD: yield a namedtuple per row;
+                     ITER_COLUMNS: yield a dict of column name to the list of column values per batch of rows
+        The server side cursor only lives in the current transaction, so the transaction must not be ended before the iteration is finished.
+        If it is not called in a 'with' block, a connection is checked out until the iteration is finished or the generator is closed.
+        """
+        if result_type not in (ITER_TUPLE,ITER_RECORD,ITER_COLUMNS):
+            raise Exception("Result type({}) Not Support".format(result_type))
+        if self._cursor:
+            return self._iter_query(sql,itersize=itersize,result_type=result_type,params=params)
+        else:
+            return self._iter_query_in_connection(sql,itersize=itersize,result_type=result_type,params=params)
+
+    def _iter_query_in_connection(self,sql,itersize=10000,result_type=ITER_TUPLE,params=None):
+        with self as db:
+            yield from db._iter_query(sql,itersize=itersize,result_type=result_type,params=params)
+
+    def _iter_query(self,sql,itersize=10000,result_type=ITER_TUPLE,params=None):
+        cursor = self._connection.cursor(name="iter_{}".format(uuid.uuid4().hex))
+        try:
+            cursor.itersize = itersize
+            cursor.execute(sql,params)
+            rows = cursor.fetchmany(itersize)
+            if result_type == ITER_RECORD:
+                #the columns of a server side cursor are only available after the first fetch
+                record_class = collections.namedtuple("Record",[column.name for column in cursor.description],rename=True)
+                while rows:
+                    for row in rows:
+                        yield record_class._make(row)
+                    rows = cursor.fetchmany(itersize)
+            elif result_type == ITER_COLUMNS:
+                columns = [column.name for column in cursor.description]
+                while rows:
+                    yield dict(zip(columns,(list(values) for values in zip(*rows))))
+                    rows = cursor.fetchmany(itersize)
+            else:
+                while rows:
+                    yield from rows
+                    rows = cursor.fetchmany(itersize)
+        finally:
+            cursor.close()
         
-    def get(self,sql,columns=None):
+    def get(self,sql,columns=None,params=None,prepared=False):
         """
         Execute select sql and return a list of data or a dict if columns is not None
         Throw exception 'DataNotFound' if can't find the data 
         """
         if self._cursor:
-            return self._get(sql,columns=columns)
+            return self._get(sql,columns=columns,params=params,prepared=prepared)
         else:
             with self as db:
-                return db._get(sql,columns=columns)
+                return db._get(sql,columns=columns,params=params,prepared=prepared)
                 
-    def _get(self,sql,columns=None):
-        self._cursor.execute(sql)
+    def _get(self,sql,columns=None,params=None,prepared=False):
+        self._execute(sql,params=params,prepared=prepared)
         row = self._cursor.fetchone()
         if row is None:
             raise exceptions.DataNotExist()
@@ -85,29 +330,31 @@ class PostgreSQL(object):
             else:
                 return row
 
-    def update(self,sql,commit=True,autocommit=False):
+    def update(self,sql,commit=True,autocommit=False,params=None,prepared=False):
         """
         insert/update/delete data
         """
         if self._cursor:
-            return self._update(sql,commit=commit,autocommit=autocommit)
+            return self._update(sql,commit=commit,autocommit=autocommit,params=params,prepared=prepared)
         else:
             with self as db:
-                return db._update(sql,commit=commit)
+                return db._update(sql,commit=commit,autocommit=autocommit,params=params,prepared=prepared)
                 
-    def _update(self,sql,commit=True,autocommit=False):
+    def _update(self,sql,commit=True,autocommit=False,params=None,prepared=False):
         try:
             commit = False if autocommit else commit
             if autocommit:
                 self._connection.autocommit = True
-            self._cursor.execute(sql)
+            self._execute(sql,params=params,prepared=prepared)
             if commit:
                 self._connection.commit()
         except:
             self._connection.rollback()
             raise
         finally:
-            self._connection.autocommit = False
+            #autocommit can't be changed inside a transaction, which is left open if commit is False
+            if autocommit:
+                self._connection.autocommit = False
 
         return self._cursor.rowcount
 
@@ -144,7 +391,327 @@ class PostgreSQL(object):
         return self.get(count_sql)[0]
 
     def is_table_exist(self,table):
-        return True if self.get("SELECT COUNT(*) FROM pg_class WHERE relname = '{}'".format(table))[0] else False
+        return True if self.get("SELECT COUNT(*) FROM pg_class WHERE relname = %s",params=(table,),prepared=True)[0] else False
+
+    def execute_values(self,sql,rows,template=None,page_size=1000,commit=True,fetch=False):
+        """
+        Execute the sql for the rows page by page, each page is sent as one multi-row 'VALUES' list, see 'psycopg2.extras.execute_values'
+        sql: the sql with one '%s' placeholder for the 'VALUES' list, for example 'INSERT INTO t (a,b) VALUES %s'
+        rows: an iterable of row tuples, which is consumed page by page
+        template: the template of each row, for example '(%s,%s::timestamptz)'; if None, use '(%s,%s,...)'
+        commit: commit the transaction after all pages are executed
+        fetch: return the rows returned by the sql(for example by 'RETURNING') if True
+        Return the list of the returned rows if fetch is True; otherwise return the number of affected rows
+        """
+        if self._cursor:
+            return self._execute_values(sql,rows,template=template,page_size=page_size,commit=commit,fetch=fetch)
+        else:
+            with self as db:
+                return db._execute_values(sql,rows,template=template,page_size=page_size,commit=commit,fetch=fetch)
+
+    def _execute_values(self,sql,rows,template=None,page_size=1000,commit=True,fetch=False):
+        rowcount = 0
+        result = []
+        try:
+            for page in _pages(rows,page_size):
+                page_result = psycopg2.extras.execute_values(self._cursor,sql,page,template=template,page_size=len(page),fetch=fetch)
+                if fetch:
+                    result.extend(page_result)
+                else:
+                    rowcount += self._cursor.rowcount
+            if commit:
+                self._connection.commit()
+        except:
+            self._connection.rollback()
+            raise
+        return result if fetch else rowcount
+
+    def _get_spatial_export_definition(self,sql):
+        """
+        Inspect the columns of the sql and return the definition (select sql,fields,geometry column,srs_id,srs_definition) used to export the data into a geopackage
+        The geometry column is the first geometry column in the sql and is selected as wkb at the first position.
+        """
+        self._cursor.execute("SELECT oid FROM pg_type WHERE typname = 'geometry'")
+        row = self._cursor.fetchone()
+        geometry_oid = row[0] if row else None
+        self._cursor.execute("SELECT * FROM ({}) as tmp_a LIMIT 0".format(sql))
+        geometry_column = None
+        fields = []
+        for column in self._cursor.description:
+            if column.type_code == geometry_oid and geometry_column is None:
+                geometry_column = column.name
+            else:
+                fields.append((column.name,gpkg_field_types.get(column.type_code,"TEXT")))
+        if not geometry_column:
+            raise Exception("No geometry column found in sql({})".format(sql))
+
+        self._cursor.execute("SELECT ST_SRID(\"{1}\") FROM ({0}) as tmp_a WHERE \"{1}\" IS NOT NULL LIMIT 1".format(sql,geometry_column))
+        row = self._cursor.fetchone()
+        srs_id = row[0] if row and row[0] else 0
+        srs_definition = None
+        if srs_id not in (-1,0,4326):
+            self._cursor.execute("SELECT srtext FROM spatial_ref_sys WHERE srid = {}".format(srs_id))
+            row = self._cursor.fetchone()
+            srs_definition = row[0] if row else None
+
+        return (self._get_spatial_select_sql(sql,fields,geometry_column),fields,geometry_column,srs_id,srs_definition)
+
+    @staticmethod
+    def _get_spatial_select_sql(sql,fields,geometry_column):
+        """
+        Return the sql which selects the geometry as wkb at the first position followed by the fields
+        """
+        return "SELECT ST_AsBinary(\"{1}\"),{2} FROM ({0}) as tmp_a".format(
+            sql,
+            geometry_column,
+            ",".join("\"{}\"".format(name) for name,field_type in fields)
+        )
+
+    @staticmethod
+    def _get_gpkg_converters(fields):
+        """
+        Return a list of value converters for the exported row; None if no conversion is required for all fields
+        """
+        converters = [None]
+        for name,field_type in fields:
+            if field_type in ("MEDIUMINT","SMALLINT","INTEGER","BOOLEAN"):
+                converters.append(None)
+            else:
+                converters.append(_to_gpkg_value)
+
+        if all(c is None for c in converters):
+            return None
+        return converters
+
+    @staticmethod
+    def _get_spatial_writer(filename,layer,fields,geometry_column,srs_id,srs_definition,itersize):
+        """
+        Return a geoparquet writer for .parquet file; otherwise return a geopackage writer
+        """
+        if os.path.splitext(filename)[1].lower() == ".parquet":
+            return geoparquet.GeoParquetWriter(filename,layer,fields,geometry_column=geometry_column,srs_id=srs_id,srs_definition=srs_definition)
+        else:
+            return gpkg.GeoPackageWriter(filename,layer,fields,geometry_column=geometry_column,srs_id=srs_id,srs_definition=srs_definition,batch_size=itersize)
+
+    def split_export_spatial_data(self,sql,split_column,f_split,f_filename,f_layer,itersize=10000):
+        """
+        Read the data from the database once and split the rows into multiple geopackages(or geoparquet files if the file extension is .parquet) on the fly
+        sql: the sql to export; the rows must be ordered by the split key
+        split_column: the column used to compute the split key
+        f_split: a function which takes the value of split_column and returns the split key
+        f_filename: a function which takes the split key and returns the geopackage file
+        f_layer: a function which takes the split key and returns the layer name
+        Return a list of (split key,layer metadata,filename) in the order of split key
+        If split_column is None, all rows are exported into one geopackage
+        """
+        if self._cursor:
+            return self._split_export_spatial_data(sql,split_column,f_split,f_filename,f_layer,itersize=itersize)
+        else:
+            with self as db:
+                return db._split_export_spatial_data(sql,split_column,f_split,f_filename,f_layer,itersize=itersize)
+
+    def _split_export_spatial_data(self,sql,split_column,f_split,f_filename,f_layer,itersize=10000):
+        select_sql,fields,geometry_column,srs_id,srs_definition = self._get_spatial_export_definition(sql)
+        if split_column:
+            split_index = next((i for i,field in enumerate(fields) if field[0] == split_column),None)
+            if split_index is None:
+                raise Exception("The split column({}) is not found in sql({})".format(split_column,sql))
+            #the first column is the geometry
+            split_index += 1
+        else:
+            #export all rows into one geopackage
+            split_index = None
+        converters = self._get_gpkg_converters(fields)
+
+        result = []
+        writer = None
+        split_key = None
+        rows = self._iter_query(select_sql,itersize=itersize)
+        try:
+            for row in rows:
+                key = None if split_index is None else f_split(row[split_index])
+                if writer is None or key != split_key:
+                    if writer:
+                        result.append((split_key,writer.close(),writer.filename))
+                        logger.debug("Succeed to export {1} features to {0}".format(writer.filename,writer.features))
+                    split_key = key
+                    writer = self._get_spatial_writer(f_filename(key),f_layer(key),fields,geometry_column,srs_id,srs_definition,itersize)
+
+                if converters:
+                    row = [c(v) if c else v for c,v in zip(converters,row)]
+                writer.write(row)
+
+            if writer:
+                result.append((split_key,writer.close(),writer.filename))
+                logger.debug("Succeed to export {1} features to {0}".format(writer.filename,writer.features))
+                writer = None
+        finally:
+            if writer:
+                writer.abort()
+            rows.close()
+
+        return result
+
+    def export_spatial_data_in_chunks(self,sqls,filename,layer=None,definition_sql=None,itersize=10000):
+        """
+        Export the data of a list of sqls into one geopackage(or geoparquet file if the file extension is .parquet) in the order of sqls.
+        Each sql is read by its own server side cursor in its own transaction,
+        so the sort, the snapshot and the transaction of each query are bounded by the size of the chunk instead of the size of the whole export.
+        sqls: a list of sqls which return the same columns
+        definition_sql: the sql used to inspect the columns and the spatial reference; if None, use the first sql
+        Return (layer metadata ,filename) if exported;otherwise return None if no data to export
+        """
+        if self._cursor:
+            return self._export_spatial_data_in_chunks(sqls,filename,layer=layer,definition_sql=definition_sql,itersize=itersize)
+        else:
+            with self as db:
+                return db._export_spatial_data_in_chunks(sqls,filename,layer=layer,definition_sql=definition_sql,itersize=itersize)
+
+    def _export_spatial_data_in_chunks(self,sqls,filename,layer=None,definition_sql=None,itersize=10000):
+        select_sql,fields,geometry_column,srs_id,srs_definition = self._get_spatial_export_definition(definition_sql or sqls[0])
+        self._connection.commit()
+        converters = self._get_gpkg_converters(fields)
+
+        writer = None
+        try:
+            for i,sql in enumerate(sqls):
+                rows = self._iter_query(self._get_spatial_select_sql(sql,fields,geometry_column),itersize=itersize)
+                try:
+                    for row in rows:
+                        if writer is None:
+                            writer = self._get_spatial_writer(filename,layer or "sql_statement",fields,geometry_column,srs_id,srs_definition,itersize)
+                        if converters:
+                            row = [c(v) if c else v for c,v in zip(converters,row)]
+                        writer.write(row)
+                finally:
+                    rows.close()
+                #end the transaction of the chunk
+                self._connection.commit()
+                logger.debug("Exported chunk {}/{} to {}, exported features={}".format(i + 1,len(sqls),filename,writer.features if writer else 0))
+
+            if writer is None:
+                #no data to export
+                return None
+            layer_metadata = writer.close()
+            writer = None
+        finally:
+            if writer:
+                writer.abort()
+
+        logger.info("Succeed to export {1} features to {0} in {2} chunks".format(filename,layer_metadata["features"],len(sqls)))
+        return (layer_metadata,filename)
+
+    def estimate(self,sql):
+        """
+        Return the number of rows of the sql estimated by the query planner, the sql is not executed.
+        """
+        plan = self.get("EXPLAIN (FORMAT JSON) {}".format(sql))[0]
+        if isinstance(plan,str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def copy_from(self,table,f,columns=None,format="binary"):
+        """
+        Load the data from a readable file-like object into the table with 'COPY ... FROM STDIN'
+        f: a file-like object, for example 'db.pgcopy.BinaryCopyStream' for binary format
+        format: binary, csv or text
+        The data is committed if it is not called in a 'with' block
+        """
+        if self._cursor:
+            return self._copy_from(table,f,columns=columns,format=format)
+        else:
+            with self as db:
+                result = db._copy_from(table,f,columns=columns,format=format)
+                db._connection.commit()
+                return result
+
+    def copy_rows(self,table,rows,columns=None,types=None):
+        """
+        Load the rows from an iterable into the table with 'COPY ... FROM STDIN', the rows are encoded on the fly without buffering all rows in memory
+        rows: an iterable of row tuples
+        types: the postgresql types of the columns(see 'pgcopy.encoders') to copy the rows in binary format; if None, copy the rows in text format
+        The data is committed if it is not called in a 'with' block
+        Return the number of copied rows
+        """
+        if types:
+            stream = pgcopy.BinaryCopyStream(rows,types)
+        else:
+            stream = pgcopy.TextCopyStream(rows)
+        return self.copy_from(table,stream,columns=columns,format="binary" if types else "text")
+
+    def copy_out(self,sql,dest,format=COPY_CSV,header=True,codec=None,level=3,checksum=True,params=None):
+        """
+        Export the rows of the select sql into a file or a writable file-like object with 'COPY ... TO STDOUT'.
+        The data is streamed from the database into the destination, and compressed and hashed on the fly if required, no data is buffered in memory.
+        dest: a file name or a writable file-like object; a file is written into a temporary file first and renamed to the file name after the data is exported
+        format: csv, text, binary or ndjson
+        header: write the column names as the first line, only for csv format
+        codec: compress the data with the codec('gzip' or 'zstd') if not None
+        level: the compression level
+        checksum: compute the md5 of the exported data and the written data if True
+        params: the bound parameters of the sql
+        Return a dict
+            rows: the number of exported rows
+            size,md5: the size and md5 of the exported data before compression
+            file_size,file_md5: the size and md5 of the written data, same as size and md5 if not compressed
+        """
+        if format not in copy_out_formats:
+            raise Exception("Copy format({}) Not Support".format(format))
+        if not isinstance(dest,str):
+            if self._cursor:
+                return self._copy_out(sql,dest,format=format,header=header,codec=codec,level=level,checksum=checksum,params=params)
+            else:
+                with self as db:
+                    return db._copy_out(sql,dest,format=format,header=header,codec=codec,level=level,checksum=checksum,params=params)
+
+        tmp_filename = "{}.tmp".format(dest)
+        try:
+            with open(tmp_filename,"wb") as f:
+                result = self.copy_out(sql,f,format=format,header=header,codec=codec,level=level,checksum=checksum,params=params)
+            os.replace(tmp_filename,dest)
+            return result
+        finally:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+
+    def _copy_out(self,sql,f,format=COPY_CSV,header=True,codec=None,level=3,checksum=True,params=None):
+        if params:
+            sql = self._cursor.mogrify(sql,params).decode()
+        if format == COPY_NDJSON:
+            sql = copy_out_ndjson_sql.format(sql)
+        else:
+            sql = copy_out_sql.format(sql,format,", HEADER" if header and format == COPY_CSV else "")
+
+        file_writer = compression.HashingWriter(f,checksum=checksum)
+        if codec:
+            compressed_writer = compression.stream_writer(file_writer,codec=codec,level=level)
+            data_writer = compression.HashingWriter(compressed_writer,checksum=checksum)
+        else:
+            compressed_writer = None
+            data_writer = file_writer
+        self._cursor.copy_expert(sql,data_writer)
+        if compressed_writer:
+            #flush the compressed data
+            compressed_writer.close()
+        f.flush()
+        result = {
+            "rows":self._cursor.rowcount,
+            "size":data_writer.size,
+            "md5":data_writer.hexdigest,
+            "file_size":file_writer.size,
+            "file_md5":file_writer.hexdigest
+        }
+        logger.debug("Exported {} rows({} bytes) with 'COPY', format={}, codec={}, written bytes={}".format(result["rows"],result["size"],format,codec,result["file_size"]))
+        return result
+
+    def _copy_from(self,table,f,columns=None,format="binary"):
+        sql = "COPY \"{}\"{} FROM STDIN (FORMAT {})".format(
+            table,
+            " ({})".format(",".join("\"{}\"".format(c) for c in columns)) if columns else "",
+            format
+        )
+        self._cursor.copy_expert(sql,f,size=1024 * 1024)
+        return self._cursor.rowcount
 
     def import_spatial_data(self,spatialfile,layer=None,table=None,overwrite=True):
         """
@@ -154,7 +721,7 @@ class PostgreSQL(object):
         metadata = gdal.get_layers(spatialfile,layer=layer)[0]
         layer = metadata["layer"]
         if not table:
-            table = self.non_char.sub("_",self.head_or_tail_non_char.sub("",layer))
+            table = self.get_table_name(layer)
 
         folder,filename = os.path.split(spatialfile)
 
@@ -181,17 +748,20 @@ class PostgreSQL(object):
 
         return table
 
-    def export_spatial_data(self,sql,filename=None,file_ext=None,layer=None):
+    def export_spatial_data(self,sql,filename=None,file_ext=None,layer=None,engine=None,snapshot=False):
         """
         export spatial table data using gdal
         table can be a table or a view
-        check: Check whether the table count is equal with the exported feature count.
+        engine: the export engine. EXPORT_ENGINE_NATIVE: stream the data into geopackage or geoparquet in process; EXPORT_ENGINE_OGR2OGR: export the data with 'ogr2ogr'
+                if None, use EXPORT_ENGINE_NATIVE for geopackage and geoparquet, and EXPORT_ENGINE_OGR2OGR for other formats
+        An empty result is detected by an 'EXISTS' probe which stops at the first row.
+        EXPORT_ENGINE_NATIVE: the rows are scanned once, the number of the rows written by the export is checked against the feature count of the exported file.
+        EXPORT_ENGINE_OGR2OGR: the rows are counted before exporting, and the count is checked against the feature count of the exported file.
+        snapshot: only for EXPORT_ENGINE_NATIVE. If True, the export runs in a repeatable read transaction whose snapshot is exported by 'pg_export_snapshot',
+                  and the rows are counted in another connection with the same snapshot while exporting, the count is checked against the exported rows too.
+                  The isolation level can only be set at the beginning of a transaction, so the export runs on its own pooled connection and the open transaction of the caller is not affected.
         Return (layer metadata ,filename) if exported;otherwise return None if no data to export
         """
-        count = self.count(sql)
-        if count == 0:
-            #no data to export
-            return None
         if not filename and not file_ext:
             raise Exception("Please specify filename or file_ext to export")
 
@@ -202,6 +772,88 @@ class PostgreSQL(object):
             with tempfile.NamedTemporaryFile(prefix=self._params["dbname"],suffix=file_ext,delete=False) as f:
                 filename = f.name
 
+        is_native_format = os.path.splitext(filename)[1].lower() in (".gpkg",".parquet")
+        if engine is None:
+            engine = EXPORT_ENGINE_NATIVE if is_native_format else EXPORT_ENGINE_OGR2OGR
+
+        if engine == EXPORT_ENGINE_NATIVE:
+            if not is_native_format:
+                raise Exception("The export engine({}) only supports geopackage and geoparquet".format(engine))
+            logger.debug("Export spatial data from database to {}. ".format(filename))
+            if snapshot:
+                with self.clone() as db:
+                    exported = db._export_spatial_data_in_snapshot(sql,filename,layer)
+            else:
+                if not self.get(exists_sql.format(sql))[0]:
+                    #no data to export
+                    return None
+                exported = self.split_export_spatial_data(sql,None,None,lambda key:filename,lambda key:layer or "sql_statement")
+                exported = (exported[0][1],None) if exported else None
+            if not exported:
+                #no data to export
+                return None
+            layer_metadata,count = exported
+            if count is None:
+                count = layer_metadata["features"]
+        elif engine == EXPORT_ENGINE_OGR2OGR:
+            if not self.get(exists_sql.format(sql))[0]:
+                #no data to export
+                return None
+            count = self.count(sql)
+            layer_metadata = self._export_spatial_data_by_ogr2ogr(sql,filename,layer)
+        else:
+            raise Exception("Export engine({}) Not Support".format(engine))
+
+        file_features = gdal.get_layers(filename,layer=layer_metadata.get("layer"))[0]["features"]
+        if count == layer_metadata["features"] == file_features:
+            logger.info("Succeed to export {1} features to {0}".format(filename,count))
+        else:
+            raise Exception("Failed, {1}/{2} features were exported to {0}, the file has {3} features".format(filename,layer_metadata["features"],count,file_features))
+
+        return (layer_metadata,filename)
+
+    def _export_spatial_data_in_snapshot(self,sql,filename,layer):
+        """
+        Export the data in a repeatable read transaction, and count the rows with the exported snapshot in another connection at the same time
+        Return (layer metadata,the number of rows counted in the snapshot); return None if no data to export
+        """
+        #the isolation level can only be set at the beginning of a transaction, never end a transaction opened by others
+        if self._connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            raise Exception("Can't export the data in a snapshot, the connection is in a transaction")
+        self._cursor.execute(repeatable_read_sql)
+        try:
+            if not self._get(exists_sql.format(sql))[0]:
+                return None
+            snapshot_id = self._get("SELECT pg_export_snapshot()")[0]
+            logger.debug("Export spatial data from database to {} in snapshot({})".format(filename,snapshot_id))
+
+            def _count():
+                with self as db:
+                    db._cursor.execute(repeatable_read_sql)
+                    db._cursor.execute("SET TRANSACTION SNAPSHOT %s",(snapshot_id,))
+                    count = db._get("SELECT count(1) FROM ({}) as tmp_a".format(sql))[0]
+                    db._connection.rollback()
+                    return count
+
+            executor = ThreadPoolExecutor(max_workers=1,thread_name_prefix="export_count")
+            try:
+                future = executor.submit(_count)
+                exported = self._split_export_spatial_data(sql,None,None,lambda key:filename,lambda key:layer or "sql_statement")
+                #the snapshot is valid until the exporting transaction ends, so wait for the count before ending it
+                count = future.result()
+            finally:
+                executor.shutdown(wait=True)
+        finally:
+            self._connection.rollback()
+
+        if not exported:
+            return None
+        return (exported[0][1],count)
+
+    def _export_spatial_data_by_ogr2ogr(self,sql,filename,layer):
+        """
+        Export the data with 'ogr2ogr' and return the layer metadata of the exported file
+        """
         cmd = """ogr2ogr -overwrite  {0} PG:"host='{2}' {3} dbname='{4}' {5} {6}" {1} -sql "{7}" """.format(
             filename,
             "-nln {}".format(layer) if layer else "",
@@ -216,13 +868,7 @@ class PostgreSQL(object):
         logger.debug("Export spatial data from database. ")
         subprocess.check_call(cmd,shell=True)
 
-        layer_metadata = gdal.get_layers(filename)[0]
-        if count == layer_metadata["features"]:
-            logger.info("Succeed to export {1} features to {0}".format(filename,count))
-        else:
-            raise Exception("Failed, only {1}/{2} features were exported to {0}".format(filename,layer_metadata["features"],count))
-
-        return (layer_metadata,filename)
+        return gdal.get_layers(filename)[0]
 
 
 
@@ -0,0 +1,152 @@
+import io
+import json
+import struct
+from datetime import datetime,date,time
+
+#the header of postgresql binary copy format: signature, flags and header extension length
+BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii",0,0)
+#the trailer of postgresql binary copy format
+BINARY_TRAILER = struct.pack("!h",-1)
+
+NULL = struct.pack("!i",-1)
+
+def _encode_text(v):
+    if not isinstance(v,bytes):
+        v = str(v).encode()
+    return struct.pack("!i",len(v)) + v
+
+def _encode_bytea(v):
+    v = bytes(v)
+    return struct.pack("!i",len(v)) + v
+
+def to_ewkb(wkb,srid):
+    """
+    Convert a wkb geometry to a postgis ewkb geometry with srid
+    """
+    if not srid:
+        return bytes(wkb)
+    byteorder = "<" if wkb[0] == 1 else ">"
+    code = struct.unpack_from(byteorder + "I",wkb,1)[0]
+    if code & 0x20000000:
+        #already has srid
+        return bytes(wkb)
+    #convert the iso wkb type to ewkb type
+    base_code = code & 0x0FFFFFFF
+    flags = code & 0xE0000000
+    if base_code >= 3000:
+        flags |= 0xC0000000
+    elif base_code >= 2000:
+        flags |= 0x40000000
+    elif base_code >= 1000:
+        flags |= 0x80000000
+    code = (base_code % 1000) | flags | 0x20000000
+    return wkb[0:1] + struct.pack(byteorder + "Ii",code,srid) + wkb[5:]
+
+#the binary encoders of postgresql types
+encoders = {
+    "int2":lambda v:struct.pack("!ih",2,int(v)),
+    "int4":lambda v:struct.pack("!ii",4,int(v)),
+    "int8":lambda v:struct.pack("!iq",8,int(v)),
+    "float4":lambda v:struct.pack("!if",4,float(v)),
+    "float8":lambda v:struct.pack("!id",8,float(v)),
+    "bool":lambda v:struct.pack("!i?",1,bool(v)),
+    "text":_encode_text,
+    "varchar":_encode_text,
+    "bytea":_encode_bytea,
+    #geometry's binary input is (e)wkb
+    "geometry":_encode_bytea
+}
+
+def encode_row(row,row_encoders):
+    """
+    Encode a row into postgresql binary copy format
+    """
+    data = [struct.pack("!h",len(row_encoders))]
+    for encoder,v in zip(row_encoders,row):
+        data.append(NULL if v is None else encoder(v))
+    return b"".join(data)
+
+class BinaryCopyStream(io.RawIOBase):
+    """
+    A readable file-like object which encodes the rows into postgresql binary copy format on the fly.
+    It can be passed to psycopg2's 'copy_expert' to stream the rows into the database without buffering all data in memory.
+    rows: an iterable of row tuples
+    types: the list of postgresql types of the columns, each type must be a key of 'encoders'
+    """
+    def __init__(self,rows,types):
+        self._rows = iter(rows)
+        self._encoders = [encoders[t] for t in types]
+        self._buffer = bytearray(BINARY_HEADER)
+        self._finished = False
+        self.rows = 0
+
+    def readable(self):
+        return True
+
+    def _fill(self,size):
+        while not self._finished and len(self._buffer) < size:
+            try:
+                row = next(self._rows)
+            except StopIteration:
+                self._buffer += BINARY_TRAILER
+                self._finished = True
+                break
+            self._buffer += encode_row(row,self._encoders)
+            self.rows += 1
+
+    def read(self,size=-1):
+        if size is None or size < 0:
+            size = 1 << 62
+        self._fill(size)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readinto(self,b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+def _to_text(v):
+    if isinstance(v,bool):
+        return "t" if v else "f"
+    elif isinstance(v,(bytes,bytearray,memoryview)):
+        #bytea hex format
+        return "\\x" + bytes(v).hex()
+    elif isinstance(v,(datetime,date,time)):
+        return v.isoformat()
+    elif isinstance(v,(dict,list)):
+        return json.dumps(v)
+    else:
+        return str(v)
+
+#the characters escaped in postgresql text copy format
+_text_escapes = str.maketrans({"\\":"\\\\","\t":"\\t","\n":"\\n","\r":"\\r"})
+
+def encode_text_row(row):
+    """
+    Encode a row into postgresql text copy format
+    """
+    return ("\t".join("\\N" if v is None else _to_text(v).translate(_text_escapes) for v in row) + "\n").encode()
+
+class TextCopyStream(BinaryCopyStream):
+    """
+    A readable file-like object which encodes the rows into postgresql text copy format on the fly.
+    The values are converted by their text representation, so the column types are not required.
+    rows: an iterable of row tuples
+    """
+    def __init__(self,rows):
+        self._rows = iter(rows)
+        self._buffer = bytearray()
+        self._finished = False
+        self.rows = 0
+
+    def _fill(self,size):
+        while not self._finished and len(self._buffer) < size:
+            try:
+                row = next(self._rows)
+            except StopIteration:
+                self._finished = True
+                break
+            self._buffer += encode_text_row(row)
+            self.rows += 1
@@ -0,0 +1,213 @@
+import time
+import logging
+import threading
+import traceback
+import collections
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+class PoolTimeout(Exception):
+    pass
+
+class ConnectionPool(object):
+    """
+    A thread safe pool of psycopg2 connections.
+    A connection is checked out by 'getconn' and must be returned by 'putconn'; the most recently returned connection is reused first.
+    The open transaction of a returned connection is rolled back, and a broken connection is closed instead of being returned into the pool.
+    params: the connection parameters returned by 'utils.parse_db_connection_string'
+    minsize: the number of idle connections which are never closed for idleness
+    maxsize: the maximum number of open connections; a checkout waits for a returned connection if reached
+    idle_timeout: the seconds an idle connection is kept in the pool; None means forever
+    health_check: the idle seconds after which a connection is checked with 'SELECT 1' before checked out; 0 means always check; None means never
+    timeout: the maximum seconds to wait for a connection; None means forever
+    """
+    def __init__(self,params,minsize=1,maxsize=10,idle_timeout=300,health_check=30,timeout=None):
+        if maxsize < 1 or minsize > maxsize:
+            raise Exception("Invalid pool size, minsize={}, maxsize={}".format(minsize,maxsize))
+        self._params = params
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.health_check = health_check
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        #a list of (connection,returned time), the most recently returned connection is at the end
+        self._idle = collections.deque()
+        #the number of open connections, include the connections which are being opened
+        self._size = 0
+        #the names of the prepared statements of each open connection
+        self._prepared = {}
+        #the counters
+        self._checkouts = 0
+        self._wait_seconds = 0
+        self._created = 0
+        self._connect_seconds = 0
+        self._closed = 0
+        self._unhealthy = 0
+
+    def _connect(self):
+        starttime = time.time()
+        connection = psycopg2.connect(host=self._params["host"],port=self._params["port"],dbname=self._params["dbname"],user=self._params["user"],password=self._params["password"])
+        with self._cond:
+            self._created += 1
+            self._connect_seconds += time.time() - starttime
+        return connection
+
+    def _close(self,connection):
+        self._prepared.pop(id(connection),None)
+        try:
+            connection.close()
+        except:
+            logger.error(traceback.format_exc())
+
+    def prepared_statements(self,connection):
+        """
+        Return the set of the names of the statements prepared on the connection, the prepared statements live until the connection is closed
+        """
+        return self._prepared.setdefault(id(connection),set())
+
+    def _is_healthy(self,connection):
+        if connection.closed:
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except:
+            return False
+
+    def _close_expired(self):
+        """
+        Close the connections which are idle for more than idle_timeout seconds and are not required by minsize, must be called with the lock held
+        """
+        if self.idle_timeout is None:
+            return
+        now = time.time()
+        #the oldest idle connections are at the head of the deque
+        while self._idle and self._size > self.minsize and now - self._idle[0][1] > self.idle_timeout:
+            connection,returned = self._idle.popleft()
+            self._size -= 1
+            self._closed += 1
+            self._close(connection)
+
+    def getconn(self):
+        """
+        Check out a connection from the pool, open a new connection if no idle connection and the pool is not full
+        """
+        starttime = time.time()
+        with self._cond:
+            while True:
+                self._close_expired()
+                if self._idle:
+                    connection,returned = self._idle.pop()
+                    break
+                if self._size < self.maxsize:
+                    #reserve a connection slot, the connection is opened out of the lock
+                    self._size += 1
+                    connection,returned = None,None
+                    break
+                remaining = None if self.timeout is None else self.timeout - (time.time() - starttime)
+                if remaining is not None and remaining <= 0:
+                    raise PoolTimeout("No available connection in {} seconds, maxsize={}".format(self.timeout,self.maxsize))
+                self._cond.wait(remaining)
+            self._checkouts += 1
+            self._wait_seconds += time.time() - starttime
+
+        if connection is not None and self.health_check is not None and time.time() - returned >= self.health_check and not self._is_healthy(connection):
+            logger.debug("Discard an unhealthy connection which was idle for {:.1f} seconds".format(time.time() - returned))
+            self._close(connection)
+            with self._cond:
+                self._unhealthy += 1
+            connection = None
+
+        if connection is None:
+            try:
+                connection = self._connect()
+            except:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+        return connection
+
+    def putconn(self,connection,close=False):
+        """
+        Return the connection into the pool
+        close: close the connection instead of returning it into the pool
+        """
+        if not close:
+            if connection.closed:
+                close = True
+            else:
+                status = connection.get_transaction_status()
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    try:
+                        connection.rollback()
+                    except:
+                        close = True
+        if close:
+            self._close(connection)
+        with self._cond:
+            if close:
+                self._size -= 1
+                self._closed += 1
+            else:
+                self._idle.append((connection,time.time()))
+            self._cond.notify()
+
+    def closeall(self):
+        """
+        Close all idle connections
+        """
+        with self._cond:
+            while self._idle:
+                connection,returned = self._idle.pop()
+                self._size -= 1
+                self._closed += 1
+                self._close(connection)
+            self._cond.notify_all()
+
+    def stats(self):
+        """
+        Return a dict of the pool counters
+        checkouts: the number of checked out connections
+        wait_seconds: the seconds spent waiting for an idle connection or a free connection slot
+        created: the number of opened connections, 'checkouts - created' is the number of saved connection handshakes
+        connect_seconds: the seconds spent opening connections
+        closed: the number of closed connections
+        unhealthy: the number of connections discarded by the health check
+        size: the number of open connections
+        idle: the number of idle connections
+        """
+        with self._cond:
+            return {
+                "checkouts":self._checkouts,
+                "wait_seconds":round(self._wait_seconds,3),
+                "created":self._created,
+                "connect_seconds":round(self._connect_seconds,3),
+                "closed":self._closed,
+                "unhealthy":self._unhealthy,
+                "size":self._size,
+                "idle":len(self._idle)
+            }
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_url,params,**kwargs):
+    """
+    Return the connection pool of the database url, the pool is created with kwargs if it doesn't exist.
+    The database objects with the same database url share the same pool
+    """
+    with _pools_lock:
+        pool = _pools.get(db_url)
+        if pool is None:
+            pool = ConnectionPool(params,**kwargs)
+            _pools[db_url] = pool
+        return pool
@@ -1,22 +1,35 @@
 import os
+import json
+import time
 import traceback
 import logging
 import tempfile
+import collections
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date,timedelta
 
 
-from utils import timezone,gdal
+from utils import timezone,compression
 import utils
 
 from data_storage import IndexedGroupResourceRepository,AzureBlobStorage
 from data_storage.exceptions import ResourceAlreadyExist
 
+from db.database import PostgreSQL,EXPORT_ENGINE_NATIVE
+
 from . import settings
+from . import verify
+from . import loader
+from . import downloader
+from . import catalog
+from . import journal
+from . import planner
+from . import metrics
+from . import backup
+from . import partition
 
 logger = logging.getLogger(__name__)
 
-#the sql to find the earliest achiving date
-earliest_archive_date = "SELECT min(seen) FROM tracking_loggedpoint"
 #the sql to recreate the missing device from loggedpoint archive
 missing_device_sql = "INSERT INTO tracking_device (deviceid) SELECT distinct a.deviceid FROM {0} a WHERE NOT EXISTS(SELECT 1 FROM tracking_device b WHERE a.deviceid = b.deviceid)"
 #restore the loggedpoint from archive file to tracking_loggedpoint table with orignal id
@@ -31,12 +44,31 @@ restore_sql = """INSERT INTO tracking_loggedpoint (device_id,point,heading,veloc
 
 #The sql to return the loggedpoint data to archive
 archive_sql = "SELECT a.id,a.point,a.heading,a.velocity,a.altitude,a.message,a.source_device_type,a.raw,extract(epoch from a.seen)::bigint as seen,b.deviceid,b.registration FROM tracking_loggedpoint a JOIN tracking_device b ON a.device_id = b.id WHERE a.seen >= '{0}' AND a.seen < '{1}'"
-backup_sql_with_create_table = "SELECT a.id,a.point,a.heading,a.velocity,a.altitude,a.message,a.source_device_type,a.raw,a.seen,b.deviceid,b.registration INTO \"{2}\" FROM tracking_loggedpoint a JOIN tracking_device b ON a.device_id = b.id WHERE a.seen >= '{0}' AND a.seen < '{1}'"
-backup_sql = """INSERT INTO "{2}" (id,point,heading,velocity,altitude,message,source_device_type,raw,seen,deviceid,registration) 
-    SELECT a.id,a.point,a.heading,a.velocity,a.altitude,a.message,a.source_device_type,a.raw,a.seen,b.deviceid,b.registration 
-    FROM tracking_loggedpoint a JOIN tracking_device b ON a.device_id = b.id WHERE a.seen >= '{0}' AND a.seen < '{1}'"""
-#the sql to delete the archived loggedpoint from table tracking_loggedpoint
-del_sql = "DELETE FROM tracking_loggedpoint WHERE seen >= '{0}' AND seen < '{1}'"
+#the sql to return the loggedpoints to export into a tabular file, the point is exported as WKT; the parameters are the start date and the end date
+tabular_sql = "SELECT a.id,ST_AsText(a.point) AS point,a.heading,a.velocity,a.altitude,a.message,a.source_device_type,a.raw,a.seen,b.deviceid,b.registration FROM tracking_loggedpoint a JOIN tracking_device b ON a.device_id = b.id WHERE a.seen >= %s AND a.seen < %s ORDER BY a.seen"
+#the sql to return the backuped loggedpoints to export into a tabular file; the parameters are the start date and the end date
+backup_tabular_sql = "SELECT id,ST_AsText(point) AS point,heading,velocity,altitude,message,source_device_type,raw,seen,deviceid,registration FROM \"{0}\" WHERE seen >= %s AND seen < %s ORDER BY seen"
+#the sql to find the id range of the loggedpoints to delete, the parameters are the start date and the end date
+id_range_sql = "SELECT min(id),max(id) FROM tracking_loggedpoint WHERE seen >= %s AND seen < %s"
+#the sql to estimate the number of loggedpoints in a time range
+estimate_rows_sql = "SELECT 1 FROM tracking_loggedpoint WHERE seen >= '{0}' AND seen < '{1}'"
+#the sql to count the loggedpoints which are not deleted yet, the parameters are the start date and the end date
+remaining_rows_sql = "SELECT count(1) FROM tracking_loggedpoint WHERE seen >= %s AND seen < %s"
+#the sql to delete a chunk of the archived loggedpoint from table tracking_loggedpoint, {0} is the chunk column,
+#the parameters are the start date, the end date, the chunk start and the chunk end
+chunk_del_sql = "DELETE FROM tracking_loggedpoint WHERE seen >= %s AND seen < %s AND {0} >= %s AND {0} < %s"
+#the sql to move a chunk of the archived loggedpoint from table tracking_loggedpoint to the backup table in one statement, return the moved rows and the backuped rows
+#{0} is the chunk column and {1} is the backup table, the parameters are the same as chunk_del_sql
+chunk_move_sql = """WITH moved AS (
+    DELETE FROM tracking_loggedpoint WHERE seen >= %s AND seen < %s AND {0} >= %s AND {0} < %s
+    RETURNING id,device_id,point,heading,velocity,altitude,message,source_device_type,raw,seen
+), backuped AS (
+    INSERT INTO "{1}" (id,point,heading,velocity,altitude,message,source_device_type,raw,seen,deviceid,registration)
+    SELECT a.id,a.point,a.heading,a.velocity,a.altitude,a.message,a.source_device_type,a.raw,a.seen,b.deviceid,b.registration
+    FROM moved a JOIN tracking_device b ON a.device_id = b.id
+    RETURNING 1
+)
+SELECT (SELECT count(1) FROM moved),(SELECT count(1) FROM backuped)"""
 #the datetime pattern used in the sql
 datetime_pattern = "%Y-%m-%d %H:%M:%S %Z"
 #the vrt pattern to generate a union layer for monthly archive 
@@ -56,22 +88,58 @@ get_archive_group = lambda d:d.strftime("%Y-%m")
 get_archive_id= lambda d:d.strftime("loggedpoint%Y-%m-%d")
 
 get_vrt_id= lambda archive_group:"loggedpoint{}.vrt".format(archive_group)
+#the manifest which lists all geoparquet files in the same group, it is used to union the geoparquet files as the vrt file does for geopackages
+get_manifest_id= lambda archive_group:"loggedpoint{}.manifest.json".format(archive_group)
 get_vrt_layername= lambda archive_group:"loggedpoint{}".format(archive_group)
 
-get_backup_table= lambda d:"tracking_loggedpoint_{}".format(d.strftime('%Y'))
+get_backup_table = backup.get_backup_table
 
 index_metaname = "loggedpoint_index"
 
+ARCHIVE_FORMAT_GPKG = "gpkg"
+ARCHIVE_FORMAT_PARQUET = "parquet"
+#the file extension of the archive formats
+archive_file_exts = {
+    ARCHIVE_FORMAT_GPKG:".gpkg",
+    ARCHIVE_FORMAT_PARQUET:".parquet"
+}
+#the sort order of the loggedpoints in the archive file, geoparquet is sorted by device to make the row group statistics selective
+archive_sort_columns = {
+    ARCHIVE_FORMAT_GPKG:None,
+    ARCHIVE_FORMAT_PARQUET:"b.deviceid,a.seen"
+}
+
+def get_archive_format(archive_format=None):
+    """
+    Return the archive format; if archive_format is None, return settings.LOGGEDPOINT_ARCHIVE_FORMAT
+    """
+    archive_format = archive_format or settings.LOGGEDPOINT_ARCHIVE_FORMAT
+    if archive_format not in archive_file_exts:
+        raise Exception("Archive format({}) Not Support".format(archive_format))
+    return archive_format
+
+def get_archive_resource_id(archive_id,archive_format=None):
+    return "{}{}".format(archive_id,archive_file_exts[get_archive_format(archive_format)])
+
+def is_archive_file(resource_id):
+    """
+    Return True if the resource is an archived loggedpoint file
+    """
+    return any(resource_id.endswith(ext) for ext in archive_file_exts.values())
+
 get_metaname = """lambda archive_group:"loggedpoint{}".format(archive_group.split("-")[0])"""
 _blob_resource = None
+#the storage of the blob resource
+_blob_storage = None
 def get_blob_resource():
     """
     Return the blob resource client
     """
-    global _blob_resource
+    global _blob_resource,_blob_storage
     if _blob_resource is None:
+        _blob_storage = AzureBlobStorage(settings.AZURE_CONNECTION_STRING,settings.AZURE_CONTAINER)
         _blob_resource = IndexedGroupResourceRepository(
-            AzureBlobStorage(settings.AZURE_CONNECTION_STRING,settings.AZURE_CONTAINER),
+            _blob_storage,
             settings.LOGGEDPOINT_RESOURCE_NAME,
             get_metaname,
             archive=False,
@@ -79,52 +147,175 @@ def get_blob_resource():
         )
     return _blob_resource
 
-def continuous_archive(delete_after_archive=False,check=False,max_archive_days=None,overwrite=False,backup_to_archive_table=True):
+def is_azure_storage():
+    """
+    Return True if the blob resource is stored in azure blob storage.
+    The blob properties, ranged reads and streaming downloads are read from azure blob storage directly, which are not supported by other storages
+    """
+    get_blob_resource()
+    return isinstance(_blob_storage,AzureBlobStorage)
+
+def get_check_mode(check):
+    """
+    Return the check mode from the check argument(see 'verify.get_check_mode').
+    The quick check reads the blob properties and ranges from azure blob storage directly, so the full check is used if the blob resource is not stored in azure blob storage
+    """
+    check_mode = verify.get_check_mode(check)
+    if check_mode == verify.CHECK_QUICK and not is_azure_storage():
+        logger.debug("The quick check is only supported by azure blob storage, use the full check instead")
+        return verify.CHECK_FULL
+    return check_mode
+
+def _get_archived_resource_id(blob_resource,archive_group,archive_id):
+    """
+    Return the resource id of the archived file in any archive format; return None if not archived.
+    Check the local archive catalog instead of blob storage if the catalog is enabled
+    """
+    archive_catalog = catalog.get_catalog()
+    for archive_format in archive_file_exts:
+        resource_id = get_archive_resource_id(archive_id,archive_format)
+        if archive_catalog:
+            if archive_catalog.is_exist(archive_group,resource_id):
+                return resource_id
+        elif blob_resource.is_exist(archive_group,resource_id):
+            return resource_id
+    return None
+
+def continuous_archive(delete_after_archive=False,check=False,max_archive_days=None,overwrite=False,backup_to_archive_table=True,workers=None,max_archive_rows=None,max_archive_bytes=None,planner_mode=None):
     """
     Continuous archiving the loggedpoint.
+    The backlog is planned before archiving(see 'planner.get_plan'), the empty days are skipped and the backlog is limited by the budget.
+    If table tracking_loggedpoint is range-partitioned by seen and settings.LOGGEDPOINT_PARTITION_DETACH is enabled,
+    the archived partitions are detached instead of deleting the archived rows(see '_archive_partitions')
     delete_after_archive: delete the archived data from table tracking_loggedpoint
     check: check whether archiving is succeed or not
     max_archive_days: the maxmium days to arhive
+    max_archive_rows: the maxmium loggedpoints to archive
+    max_archive_bytes: the maxmium estimated bytes to archive
     overwrite: if true, overwrite the existing archived file;if false, throw exception if already archived 
+    workers: the number of days exported concurrently; if None, use settings.LOGGEDPOINT_ARCHIVE_WORKERS
+    planner_mode: the planner mode, 'exact' or 'cheap'; if None, use settings.LOGGEDPOINT_ARCHIVE_PLANNER
     """
-    db = settings.DATABASE
-    earliest_date = db.get(earliest_archive_date)[0]
-    if earliest_date is None:
-        logger.info("No more data to archive")
-        return
-
-    earliest_date = timezone.nativetime(earliest_date).date()
     if timezone.in_working_hour():
         logger.error("Please don't run continuous archive in working hour")
         return 
     today = timezone.now().date()
     last_archive_date = today - timedelta(days=settings.LOGGEDPOINT_ACTIVE_DAYS)
-    archive_date = earliest_date
-    archived_days = 0
     max_archive_days = max_archive_days if max_archive_days and  max_archive_days > 0 else None
+    max_archive_rows = max_archive_rows if max_archive_rows and  max_archive_rows > 0 else None
+    max_archive_bytes = max_archive_bytes if max_archive_bytes and  max_archive_bytes > 0 else None
+    workers = workers or settings.LOGGEDPOINT_ARCHIVE_WORKERS
 
-    logger.info("Begin to continuous archive loggedpoint, earliest archive date={0},last archive date = {1}, delete_after_archive={2}, check={3}, max_archive_days={4}".format(
-        earliest_date,last_archive_date,delete_after_archive,check,max_archive_days
-    ))
-    if archive_date >= last_archive_date:
+    archive_plan = planner.get_plan(last_archive_date,mode=planner_mode,blob_resource=get_blob_resource())
+    if not archive_plan.days:
         logger.info("No more data to archive")
         return
+    archive_days = archive_plan.budget(max_days=max_archive_days,max_rows=max_archive_rows,max_bytes=max_archive_bytes)
+    archive_rows = sum(rows for d,rows in archive_days)
+    eta = archive_plan.eta(archive_rows)
+
+    logger.info("Begin to continuous archive loggedpoint, earliest archive date={0},last archive date = {1}, delete_after_archive={2}, check={3}, max_archive_days={4}, max_archive_rows={5}, max_archive_bytes={6}, workers={7}, planned days={8}/{9}, planned rows={10}/{11}, eta={12}".format(
+        archive_days[0][0],last_archive_date,delete_after_archive,check,max_archive_days,max_archive_rows,max_archive_bytes,workers,
+        len(archive_days),len(archive_plan.days),archive_rows,archive_plan.rows,timedelta(seconds=int(eta)) if eta is not None else None
+    ))
 
-    while archive_date < last_archive_date and (not max_archive_days or archived_days < max_archive_days):
+    def _stop():
         if timezone.in_working_hour():
             logger.info("Stop archiving in working hour")
+            return True
+        return False
+
+    if delete_after_archive and settings.LOGGEDPOINT_PARTITION_DETACH and partition.is_partitioned(settings.DATABASE):
+        _archive_partitions(
+            archive_days,
+            last_archive_date,
+            truncated=len(archive_days) < len(archive_plan.days),
+            workers=workers,
+            f_stop=_stop,
+            check=check,
+            overwrite=overwrite,
+            backup_to_archive_table=backup_to_archive_table
+        )
+        return
+
+    _archive_dates_in_order((d for d,rows in archive_days),workers=workers,f_stop=_stop,delete_after_archive=delete_after_archive,check=check,overwrite=overwrite,backup_to_archive_table=backup_to_archive_table)
+
+def _get_archived_features(blob_resource,days):
+    """
+    Return the number of the archived features of the days, read from the local archive catalog if enabled, otherwise from blob storage
+    """
+    archive_catalog = catalog.get_catalog()
+    archive_ids = set(get_archive_id(d) for d in days)
+    features = 0
+    for archive_group in sorted(set(get_archive_group(d) for d in days)):
+        if archive_catalog:
+            metadatas = archive_catalog.resource_metadatas(archive_group)
+        else:
+            metadatas = blob_resource.metadata_client.resource_metadatas(resource_group=archive_group,throw_exception=False)
+        for m in metadatas:
+            if is_archive_file(m["resource_id"]) and os.path.splitext(m["resource_id"])[0] in archive_ids:
+                features += m["features"]
+    return features
+
+def _archive_partitions(archive_days,last_archive_date,truncated=False,workers=None,f_stop=None,check=False,overwrite=False,backup_to_archive_table=True):
+    """
+    Archive a partitioned tracking_loggedpoint partition by partition.
+    The planned days of a partition are archived without deleting the archived rows, then the partition is detached
+    and moved into the schema settings.LOGGEDPOINT_PARTITION_BACKUP_SCHEMA(if backup_to_archive_table is True) or dropped,
+    after the rows of the partition are validated against the archived features of all days in the partition.
+    The days archived by a previous run are not archived again unless overwrite is True, so a partition whose days were archived across runs is detached once all days are archived.
+    The days of a partition whose bounds are not at midnight are archived and deleted row by row as a non-partitioned table.
+    archive_days: the budgeted backlog, a list of (date,rows)
+    last_archive_date: the partitions which contain the days after it are not archived
+    truncated: True if the backlog was truncated by the budget, the partition which contains the truncated days is archived but not detached
+    Return the number of detached partitions
+    """
+    db = settings.DATABASE
+    blob_resource = get_blob_resource()
+    backup_schema = settings.LOGGEDPOINT_PARTITION_BACKUP_SCHEMA if backup_to_archive_table else None
+    planned_days = [d for d,rows in archive_days]
+    end_planned_date = planned_days[-1] + timedelta(days=1)
+    detached = 0
+    for p in partition.get_partitions(db):
+        if p.end.date() > last_archive_date:
+            #the partition contains the active days
             break
+        days = [d for d in planned_days if p.start.date() <= d < p.end.date()]
+        if not days:
+            continue
+        if f_stop and f_stop():
+            break
+        if not partition.is_day_aligned(p):
+            logger.warning("The bounds of the partition({}) are not at midnight, archive and delete its loggedpoints row by row, start={}, end={}".format(p.name,p.start,p.end))
+            archived_days = _archive_dates_in_order(days,workers=workers,f_stop=f_stop,delete_after_archive=True,check=check,overwrite=overwrite,backup_to_archive_table=backup_to_archive_table)
+            if archived_days < len(days):
+                break
+            continue
+
+        if not overwrite:
+            days = [d for d in days if not _get_archived_resource_id(blob_resource,get_archive_group(d),get_archive_id(d))]
+        logger.info("Begin to archive the partition({}), start={}, end={}, days to archive={}".format(p.name,p.start,p.end,len(days)))
+        archived_days = _archive_dates_in_order(days,workers=workers,f_stop=f_stop,delete_after_archive=False,check=check,overwrite=overwrite)
+        if archived_days < len(days):
+            break
+        if truncated and p.end.date() > end_planned_date:
+            logger.info("The days of the partition({}) after {} are out of the budget, detach it in the next run".format(p.name,end_planned_date))
+            break
+
+        partition.detach(db,p,_get_archived_features(blob_resource,partition.get_days(p)),backup_schema=backup_schema)
+        detached += 1
 
-        archive_by_date(archive_date,delete_after_archive=delete_after_archive,check=check,overwrite=overwrite,backup_to_archive_table=backup_to_archive_table)
-        archive_date += timedelta(days=1)
-        archived_days += 1
+    logger.info("Detached {} archived partitions from table tracking_loggedpoint".format(detached))
+    return detached
 
-def archive_by_month(year,month,delete_after_archive=False,check=False,overwrite=False,backup_to_archive_table=True):
+def archive_by_month(year,month,delete_after_archive=False,check=False,overwrite=False,backup_to_archive_table=True,workers=None,single_scan=None):
     """
     Archive the logged point for the month.
     delete_after_archive: delete the archived data from table tracking_loggedpoint
     check: check whether archiving is succeed or not
     overwrite: if true, overwrite the existing archived file;if false, throw exception if already archived 
+    workers: the number of days exported concurrently; if None, use settings.LOGGEDPOINT_ARCHIVE_WORKERS
+    single_scan: if true, read the month's loggedpoints in one query and split them into daily geopackages; if None, use settings.LOGGEDPOINT_ARCHIVE_MONTH_IN_SINGLE_SCAN
     """
     now = timezone.now()
     today = now.date()
@@ -135,21 +326,29 @@ def archive_by_month(year,month,delete_after_archive=False,check=False,overwrite
         last_archive_date = today
     if archive_date >= today:
         raise Exception("Can only archive the logged points happened before today")
+    workers = workers or settings.LOGGEDPOINT_ARCHIVE_WORKERS
 
-    logger.info("Begin to archive loggedpoint by month, month={0}/{1}, start archive date={2}, end archive date={3}".format(
-        year,month,archive_date,last_archive_date
+    logger.info("Begin to archive loggedpoint by month, month={0}/{1}, start archive date={2}, end archive date={3}, workers={4}".format(
+        year,month,archive_date,last_archive_date,workers
     ))
 
-    while archive_date < last_archive_date:
-        archive_by_date(archive_date,delete_after_archive=delete_after_archive,check=check,overwrite=overwrite,backup_to_archive_table=backup_to_archive_table)
-        archive_date += timedelta(days=1)
+    if single_scan is None:
+        single_scan = settings.LOGGEDPOINT_ARCHIVE_MONTH_IN_SINGLE_SCAN
+    if single_scan:
+        _archive_in_single_scan(archive_date,last_archive_date,delete_after_archive=delete_after_archive,check=check,overwrite=overwrite,backup_to_archive_table=backup_to_archive_table)
+        return
 
-def archive_by_date(d,delete_after_archive=False,check=False,overwrite=False,backup_to_archive_table=True):
+    def _archive_dates():
+        d = archive_date
+        while d < last_archive_date:
+            yield d
+            d += timedelta(days=1)
+
+    _archive_dates_in_order(_archive_dates(),workers=workers,delete_after_archive=delete_after_archive,check=check,overwrite=overwrite,backup_to_archive_table=backup_to_archive_table)
+
+def _get_archive_args(d,backup_to_archive_table=True):
     """
-    Archive the logged point within the specified date
-    delete_after_archive: delete the archived data from table tracking_loggedpoint
-    check: check whether archiving is succeed or not
-    overwrite: if true, overwrite the existing archived file;if false, throw exception if already archived 
+    Return the tuple (archive_group,archive_id,start_date,end_date,backup_table) used to archive the loggedpoint within the specified date
     """
     now = timezone.now()
     today = now.date()
@@ -160,14 +359,168 @@ def archive_by_date(d,delete_after_archive=False,check=False,overwrite=False,bac
     start_date = timezone.datetime(d.year,d.month,d.day)
     end_date = start_date + timedelta(days=1)
     backup_table = get_backup_table(d) if backup_to_archive_table else None
+    return (archive_group,archive_id,start_date,end_date,backup_table)
+
+def _archive_in_single_scan(start_archive_date,end_archive_date,delete_after_archive=False,check=False,overwrite=False,backup_to_archive_table=True,archive_format=None):
+    """
+    Archive the loggedpoint between start_archive_date(inclusive) and end_archive_date(exclusive).
+    The loggedpoints are read from table tracking_loggedpoint in one query ordered by seen, and are written into daily geopackages on the fly,
+    then the daily geopackages are published one by one in date order.
+    """
+    db = settings.DATABASE
+    archive_format = get_archive_format(archive_format)
+    blob_resource = get_blob_resource()
+    if not overwrite:
+        #check whether achive exist or not
+        d = start_archive_date
+        while d < end_archive_date:
+            archive_group,archive_id,start_date,end_date,backup_table = _get_archive_args(d)
+            if _get_archived_resource_id(blob_resource,archive_group,archive_id):
+                raise ResourceAlreadyExist("The loggedpoint has already been archived. archive_id={0},start_archive_date={1},end_archive_date={2}".format(archive_id,start_date,end_date))
+            d += timedelta(days=1)
+
+    start_date = timezone.datetime(start_archive_date.year,start_archive_date.month,start_archive_date.day)
+    end_date = timezone.datetime(end_archive_date.year,end_archive_date.month,end_archive_date.day)
+    work_folder = tempfile.mkdtemp(prefix="archive_loggedpoint")
+    try:
+        logger.info("Begin to export loggedpoint in one query, start_date={},end_date={}".format(start_date,end_date))
+        start_archive = timezone.now()
+        if archive_format == ARCHIVE_FORMAT_GPKG:
+            sql = "{} ORDER BY a.seen".format(archive_sql.format(start_date.strftime(datetime_pattern),end_date.strftime(datetime_pattern)))
+        else:
+            #the rows must be ordered by day first to split them into daily files
+            sql = "{} ORDER BY (a.seen AT TIME ZONE '{}')::date,{}".format(
+                archive_sql.format(start_date.strftime(datetime_pattern),end_date.strftime(datetime_pattern)),
+                settings.TIME_ZONE,
+                archive_sort_columns[archive_format]
+            )
+        exported_files = db.split_export_spatial_data(
+            sql,
+            "seen",
+            lambda seen:timezone.fromtimestamp(seen).date(),
+            lambda d:os.path.join(work_folder,get_archive_resource_id(get_archive_id(d),archive_format)),
+            get_archive_id
+        )
+        logger.info("End to export loggedpoint in one query, start_date={},end_date={},exported days={}".format(start_date,end_date,len(exported_files)))
+
+        for d,layer_metadata,filename in exported_files:
+            archive_group,archive_id,start_date,end_date,backup_table = _get_archive_args(d,backup_to_archive_table=backup_to_archive_table)
+            metadata = {
+                "start_archive":start_archive,
+                "resource_id":get_archive_resource_id(archive_id,archive_format),
+                "resource_group":archive_group,
+                "start_archive_date":start_date,
+                "end_archive_date":end_date
+            }
+            export_result = _get_export_result(archive_group,archive_id,start_date,end_date,work_folder,metadata,layer_metadata,filename)
+            publish_archive(export_result,delete_after_archive=delete_after_archive,check=check,backup_table=backup_table)
+            utils.remove_file(export_result["filename"])
+    finally:
+        utils.remove_folder(work_folder)
+
+def archive_by_date(d,delete_after_archive=False,check=False,overwrite=False,backup_to_archive_table=True):
+    """
+    Archive the logged point within the specified date
+    delete_after_archive: delete the archived data from table tracking_loggedpoint
+    check: check whether archiving is succeed or not
+    overwrite: if true, overwrite the existing archived file;if false, throw exception if already archived 
+    """
+    archive_group,archive_id,start_date,end_date,backup_table = _get_archive_args(d,backup_to_archive_table=backup_to_archive_table)
     return archive(archive_group,archive_id,start_date,end_date,delete_after_archive=delete_after_archive,check=check,overwrite=overwrite,backup_table=backup_table)
 
+def _export_date(d,work_folder,overwrite=False,archive_journal=None):
+    """
+    Export the loggedpoint within the specified date in a worker thread.
+    """
+    archive_group,archive_id,start_date,end_date,backup_table = _get_archive_args(d)
+    return export_archive(archive_group,archive_id,start_date,end_date,work_folder,overwrite=overwrite,archive_journal=archive_journal)
+
+def _archive_dates_in_order(dates,workers=None,f_stop=None,delete_after_archive=False,check=False,overwrite=False,backup_to_archive_table=True):
+    """
+    Archive the loggedpoint for each date in dates.
+    workers: if workers is greater than 1, the days are exported concurrently by workers in a thread pool,
+             and the exported days are pushed to blob storage, merged into the group vrt and deleted from table tracking_loggedpoint one by one in date order by the current thread.
+             so exporting the following days overlaps with uploading and verifying the current day, and an failed day never leaves a gap.
+    f_stop: a function to check whether archiving should be stopped before archiving the next day.
+    Return the number of archived days
+    """
+    archived_days = 0
+    if not workers or workers <= 1:
+        for d in dates:
+            if f_stop and f_stop():
+                break
+            archive_by_date(d,delete_after_archive=delete_after_archive,check=check,overwrite=overwrite,backup_to_archive_table=backup_to_archive_table)
+            archived_days += 1
+        return archived_days
+
+    #a queue of (date,work_folder,archive journal,future); at most 'workers' days are exported ahead of the day being published 
+    pending = collections.deque()
+    dates = iter(dates)
+    executor = ThreadPoolExecutor(max_workers=workers,thread_name_prefix="archive_loggedpoint")
+
+    def _submit():
+        while len(pending) < workers:
+            if f_stop and f_stop():
+                return
+            try:
+                d = next(dates)
+            except StopIteration:
+                return
+            archive_journal = journal.get_journal(get_archive_id(d))
+            work_folder = archive_journal.work_folder if archive_journal else tempfile.mkdtemp(prefix="archive_loggedpoint")
+            pending.append((d,work_folder,archive_journal,executor.submit(_export_date,d,work_folder,overwrite=overwrite,archive_journal=archive_journal)))
+
+    try:
+        _submit()
+        while pending:
+            if f_stop and f_stop():
+                break
+            d,work_folder,archive_journal,future = pending.popleft()
+            try:
+                export_result = future.result()
+                if export_result:
+                    _,_,_,_,backup_table = _get_archive_args(d,backup_to_archive_table=backup_to_archive_table)
+                    publish_archive(export_result,delete_after_archive=delete_after_archive,check=check,backup_table=backup_table,archive_journal=archive_journal)
+                archived_days += 1
+                if archive_journal:
+                    archive_journal.clear()
+            finally:
+                #the work folder of a journaled day is kept if archiving failed, and is reused by the next run
+                if not archive_journal:
+                    utils.remove_folder(work_folder)
+            _submit()
+    finally:
+        #discard the days which were exported but not published; the exported files of the journaled days are kept for the next run
+        for d,work_folder,archive_journal,future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+        for d,work_folder,archive_journal,future in pending:
+            if not archive_journal:
+                utils.remove_folder(work_folder)
+
+    return archived_days
+
+def _get_resource_metadata(resourcemetadata,archive_group,resource_id):
+    """
+    Return the metadata of the resource from the metadata returned by 'push_file'
+    """
+    return next(m for m in resourcemetadata[archive_group].values() if m["resource_id"] == resource_id)
 
 def _set_end_datetime(key):
     def _func(metadata):
         metadata[key] = timezone.now()
     return _func
 
+def _post_push_archive(archive_metrics,starttime):
+    """
+    Return the function called after the archive file is pushed, the upload stage is recorded into the metadata before the metadata is saved
+    """
+    def _func(metadata):
+        metadata["end_archive"] = timezone.now()
+        archive_metrics.add("upload",time.time() - starttime,bytes=metadata.get("file_size"))
+        metadata[metrics.METADATA_KEY] = archive_metrics.stages
+    return _func
+
 def archive(archive_group,archive_id,start_date,end_date,delete_after_archive=False,check=False,overwrite=False,backup_table=None):
     """
     Archive the resouce tracking history by start_date(inclusive), end_date(exclusive)
@@ -175,9 +528,33 @@ def archive(archive_group,archive_id,start_date,end_date,delete_after_archive=Fa
     overwrite: False: raise exception if archive_id already exists; True: overwrite the existing archive file
     delete_after_archive: delete the archived data from table tracking_loggedpoint
     check: check whether archiving is succeed or not
+    If the archive journal is enabled, the completed stages are journaled, and a failed archiving resumes at the first incomplete stage in the next run
     """
-    db = settings.DATABASE
-    resource_id = "{}.gpkg".format(archive_id)
+    archive_journal = journal.get_journal(archive_id)
+    work_folder = archive_journal.work_folder if archive_journal else tempfile.mkdtemp(prefix="archive_loggedpoint")
+    try:
+        export_result = export_archive(archive_group,archive_id,start_date,end_date,work_folder,overwrite=overwrite,archive_journal=archive_journal)
+        if export_result:
+            publish_archive(export_result,delete_after_archive=delete_after_archive,check=check,backup_table=backup_table,archive_journal=archive_journal)
+        if archive_journal:
+            archive_journal.clear()
+    finally:
+        if not archive_journal:
+            utils.remove_folder(work_folder)
+
+def export_archive(archive_group,archive_id,start_date,end_date,work_folder,overwrite=False,db=None,archive_format=None,archive_journal=None):
+    """
+    The first stage of archiving: export the loggedpoints between start_date(inclusive) and end_date(exclusive) into a geopackage(or a geoparquet file) in work_folder
+    This stage doesn't change anything in blob storage and table tracking_loggedpoint, so it can run concurrently for different days.
+    A heavy day is exported chunk by chunk(see '_get_export_chunks') into the same file to bound the size of each query.
+    db: the database used to export the data, default is settings.DATABASE
+    archive_format: the format of the archive file; if None, use settings.LOGGEDPOINT_ARCHIVE_FORMAT
+    archive_journal: the journal of the day; if the day was exported by an interrupted run, the journaled export result is returned without exporting again
+    Return the export result which is required by 'publish_archive'; return None if no loggedpoints to archive
+    """
+    db = db or settings.DATABASE
+    archive_format = get_archive_format(archive_format)
+    resource_id = get_archive_resource_id(archive_id,archive_format)
     metadata = {
         "start_archive":timezone.now(),
         "resource_id":resource_id,
@@ -186,116 +563,408 @@ def archive(archive_group,archive_id,start_date,end_date,delete_after_archive=Fa
         "end_archive_date":end_date
     }
 
-    filename = None
-    vrt_filename = None
-    work_folder = tempfile.mkdtemp(prefix="archive_loggedpoint")
-    resourcemetadata = None
-    try:
-        logger.info("Begin to archive loggedpoint, archive_group={},archive_id={},start_date={},end_date={}".format(archive_group,archive_id,start_date,end_date))
-        blob_resource = get_blob_resource()
-        if not overwrite:
-            #check whether achive exist or not
-            if blob_resource.is_exist(archive_group,resource_id):
-                raise ResourceAlreadyExist("The loggedpoint has already been archived. archive_id={0},start_archive_date={1},end_archive_date={2}".format(archive_id,start_date,end_date))
+    if archive_journal:
+        export_result = archive_journal.get_export_result(resource_id)
+        if export_result:
+            return export_result
 
-        #export the archived data as geopackage
+    logger.info("Begin to archive loggedpoint, archive_group={},archive_id={},start_date={},end_date={}".format(archive_group,archive_id,start_date,end_date))
+    blob_resource = get_blob_resource()
+    if not overwrite:
+        #check whether achive exist or not
+        if _get_archived_resource_id(blob_resource,archive_group,archive_id):
+            raise ResourceAlreadyExist("The loggedpoint has already been archived. archive_id={0},start_archive_date={1},end_archive_date={2}".format(archive_id,start_date,end_date))
+
+    #export the archived data
+    filename = os.path.join(work_folder,"loggedpoint{}".format(archive_file_exts[archive_format]))
+    export_starttime = time.time()
+    chunks = _get_export_chunks(start_date,end_date,db)
+    if chunks:
+        #a heavy day, export the day chunk by chunk into the same file by the native engine
+        sqls = []
+        for chunk_start,chunk_end in chunks:
+            sql = archive_sql.format(chunk_start.strftime(datetime_pattern),chunk_end.strftime(datetime_pattern))
+            sqls.append("{} ORDER BY {}".format(sql,archive_sort_columns[archive_format]) if archive_sort_columns[archive_format] else sql)
+        export_result = db.export_spatial_data_in_chunks(
+            sqls,
+            filename,
+            layer=archive_id,
+            definition_sql=archive_sql.format(start_date.strftime(datetime_pattern),end_date.strftime(datetime_pattern))
+        )
+    else:
         sql = archive_sql.format(start_date.strftime(datetime_pattern),end_date.strftime(datetime_pattern))
-        export_result = db.export_spatial_data(sql,filename=os.path.join(work_folder,"loggedpoint.gpkg"),layer=archive_id)
-        if not export_result:
-            logger.info("No loggedpoints to archive, archive_group={},archive_id={},start_date={},end_date={}".format(archive_group,archive_id,start_date,end_date))
-            return
-
-        layer_metadata,filename = export_result
-        metadata["file_md5"] = utils.file_md5(filename)
-        metadata["layer"] = layer_metadata["layer"]
-        metadata["features"] = layer_metadata["features"]
+        if archive_sort_columns[archive_format]:
+            sql = "{} ORDER BY {}".format(sql,archive_sort_columns[archive_format])
+        #geoparquet can only be exported by the native engine
+        engine = settings.LOGGEDPOINT_EXPORT_ENGINE if archive_format == ARCHIVE_FORMAT_GPKG else EXPORT_ENGINE_NATIVE
+        export_result = db.export_spatial_data(
+            sql,
+            filename=filename,
+            layer=archive_id,
+            engine=engine,
+            snapshot=settings.LOGGEDPOINT_EXPORT_SNAPSHOT and engine == EXPORT_ENGINE_NATIVE
+        )
+    if not export_result:
+        logger.info("No loggedpoints to archive, archive_group={},archive_id={},start_date={},end_date={}".format(archive_group,archive_id,start_date,end_date))
+        return None
+
+    layer_metadata,filename = export_result
+    metrics.ArchiveMetrics(metadata).add("export",time.time() - export_starttime,rows=layer_metadata["features"],bytes=utils.file_size(filename))
+    export_result = _get_export_result(archive_group,archive_id,start_date,end_date,work_folder,metadata,layer_metadata,filename)
+    if archive_journal:
+        archive_journal.exported(export_result)
+    return export_result
+
+def _get_export_chunks(start_date,end_date,db):
+    """
+    Split a heavy day into chunks to export if the number of the loggedpoints estimated by the query planner is greater than settings.LOGGEDPOINT_ARCHIVE_CHUNK_THRESHOLD
+    Return a list of (chunk start(inclusive),chunk end(exclusive)) in time order; return None if the day is not split
+    """
+    if not settings.LOGGEDPOINT_ARCHIVE_CHUNK_THRESHOLD:
+        return None
+    estimated_rows = db.estimate(estimate_rows_sql.format(start_date.strftime(datetime_pattern),end_date.strftime(datetime_pattern)))
+    if estimated_rows <= settings.LOGGEDPOINT_ARCHIVE_CHUNK_THRESHOLD:
+        return None
+
+    if settings.LOGGEDPOINT_ARCHIVE_CHUNK_BY == "hour":
+        chunks = []
+        chunk_start = start_date
+        while chunk_start < end_date:
+            chunk_end = min(chunk_start + timedelta(hours=settings.LOGGEDPOINT_ARCHIVE_CHUNK_HOURS),end_date)
+            chunks.append((chunk_start,chunk_end))
+            chunk_start = chunk_end
+    elif settings.LOGGEDPOINT_ARCHIVE_CHUNK_BY == "rows":
+        def _split(chunk_start,chunk_end,rows):
+            #a chunk is not split any more if it is not longer than one minute
+            if rows <= settings.LOGGEDPOINT_ARCHIVE_CHUNK_ROWS or chunk_end - chunk_start <= timedelta(minutes=1):
+                return [(chunk_start,chunk_end)]
+            chunk_middle = chunk_start + timedelta(seconds=int((chunk_end - chunk_start).total_seconds() / 2))
+            return _split(
+                chunk_start,chunk_middle,db.estimate(estimate_rows_sql.format(chunk_start.strftime(datetime_pattern),chunk_middle.strftime(datetime_pattern)))
+            ) + _split(
+                chunk_middle,chunk_end,db.estimate(estimate_rows_sql.format(chunk_middle.strftime(datetime_pattern),chunk_end.strftime(datetime_pattern)))
+            )
+        chunks = _split(start_date,end_date,estimated_rows)
+    else:
+        raise Exception("Archive chunk type({}) Not Support".format(settings.LOGGEDPOINT_ARCHIVE_CHUNK_BY))
+
+    logger.info("Split the loggedpoints between {} and {} into {} chunks to export, estimated rows={}".format(start_date,end_date,len(chunks),estimated_rows))
+    return chunks
+
+def _get_export_result(archive_group,archive_id,start_date,end_date,work_folder,metadata,layer_metadata,filename):
+    """
+    Populate the archive metadata from the exported file and return the export result required by 'publish_archive'
+    """
+    archive_metrics = metrics.ArchiveMetrics(metadata)
+    if settings.LOGGEDPOINT_ARCHIVE_COMPRESSION and filename.endswith(archive_file_exts[ARCHIVE_FORMAT_GPKG]):
+        #compress the geopackage, the md5 of the geopackage and the compressed file are computed during compressing.
+        #the compressed file is uploaded with the same resource id, and is decompressed during downloading
+        codec = settings.LOGGEDPOINT_ARCHIVE_COMPRESSION
+        compressed_file = "{}{}".format(filename,compression.file_exts[codec])
+        with archive_metrics.measure("compress",rows=layer_metadata["features"]) as stage:
+            uncompressed_md5,uncompressed_size,file_md5,file_size = compression.compress_file(filename,compressed_file,codec=codec,level=settings.LOGGEDPOINT_ARCHIVE_COMPRESSION_LEVEL)
+            stage["bytes"] = uncompressed_size
+        logger.debug("Compressed {} from {} bytes to {} bytes with {}".format(filename,uncompressed_size,file_size,codec))
+        utils.remove_file(filename)
+        filename = compressed_file
+        metadata["compression"] = codec
+        metadata["uncompressed_md5"] = uncompressed_md5
+        metadata["uncompressed_size"] = uncompressed_size
+        metadata["compressed_size"] = file_size
+        metadata["file_md5"] = file_md5
+        metadata["file_size"] = file_size
+    else:
+        with archive_metrics.measure("md5") as stage:
+            metadata["file_md5"] = utils.file_md5(filename)
+            metadata["file_size"] = utils.file_size(filename)
+            stage["bytes"] = metadata["file_size"]
+    metadata["layer"] = layer_metadata["layer"]
+    metadata["features"] = layer_metadata["features"]
+    if layer_metadata.get("extent"):
+        #[minx,miny,maxx,maxy], used to skip the files outside of the bbox when restoring
+        metadata["extent"] = layer_metadata["extent"]
+
+    return {
+        "archive_group":archive_group,
+        "archive_id":archive_id,
+        "start_date":start_date,
+        "end_date":end_date,
+        "work_folder":work_folder,
+        "metadata":metadata,
+        "layer_metadata":layer_metadata,
+        "filename":filename
+    }
+
+def publish_archive(export_result,delete_after_archive=False,check=False,backup_table=None,archive_journal=None):
+    """
+    The second stage of archiving: push the exported archive file to blob storage, update the group index file and delete the archived data if required.
+    This stage changes the group metadata and table tracking_loggedpoint, so it must be executed one by one in date order.
+    export_result: the result returned by 'export_archive'
+    archive_journal: the journal of the day; the stages which were completed by an interrupted run are skipped, and each completed stage is journaled
+    """
+    db = settings.DATABASE
+    archive_group = export_result["archive_group"]
+    archive_id = export_result["archive_id"]
+    start_date = export_result["start_date"]
+    end_date = export_result["end_date"]
+    work_folder = export_result["work_folder"]
+    metadata = export_result["metadata"]
+    layer_metadata = export_result["layer_metadata"]
+    filename = export_result["filename"]
+    resource_id = metadata["resource_id"]
+
+    blob_resource = get_blob_resource()
+    archive_metrics = metrics.ArchiveMetrics(metadata)
+    groupmetadatas = None
+    uploaded = archive_journal.get(journal.STAGE_UPLOADED) if archive_journal else None
+    if uploaded:
+        #the archive file was pushed by an interrupted run, check whether the pushed file is still the same file
+        groupmetadatas = list(blob_resource.metadata_client.resource_metadatas(resource_group=archive_group,throw_exception=True))
+        resource_metadata = next((m for m in groupmetadatas if m["resource_id"] == resource_id),None)
+        if resource_metadata and resource_metadata.get("file_md5") == uploaded["file_md5"]:
+            logger.debug("The loggedpoint archive file was already pushed to blob storage, archive_group={},archive_id={}".format(archive_group,archive_id))
+        else:
+            if not os.path.exists(filename):
+                raise Exception("The pushed archive file({}/{}) was changed or removed, and the exported file({}) doesn't exist, please archive it again".format(archive_group,resource_id,filename))
+            archive_journal.reset(journal.STAGE_UPLOADED)
+            groupmetadatas = None
+
+    if groupmetadatas is None:
         #upload archive file
         logger.debug("Begin to push loggedpoint archive file to blob storage, archive_group={},archive_id={},start_date={},end_date={}".format(archive_group,archive_id,start_date,end_date))
-        resourcemetadata = blob_resource.push_file(filename,metadata,f_post_push=_set_end_datetime("end_archive"))
-        if check:
-            #check whether uploaded succeed or not
-            logger.debug("Begin to check whether loggedpoint archive file was pushed to blob storage successfully, archive_group={},archive_id={},start_date={},end_date={}".format(
-                archive_group,archive_id,start_date,end_date
-            ))
-            d_metadata,d_filename = blob_resource.download_resource(archive_group,resource_id,filename=os.path.join(work_folder,"loggedpoint_download.gpkg"))
-            d_file_md5 = utils.file_md5(d_filename)
-            if metadata["file_md5"] != d_file_md5:
-                raise Exception("Upload loggedpoint archive file failed.source file's md5={}, uploaded file's md5={}".format(metadata["file_md5"],d_file_md5))
-
-            d_layer_metadata = gdal.get_layers(d_filename)[0]
-            if d_layer_metadata["features"] != layer_metadata["features"]:
-                raise Exception("Upload loggedpoint archive file failed.source file's features={}, uploaded file's features={}".format(layer_metadata["features"],d_layer_metadata["features"]))
-        
-
-        #update vrt file
-        logger.debug("Begin to update vrt file to union all spatial files in the same group, archive_group={},archive_id={},start_date={},end_date={}".format(
+        resourcemetadata = blob_resource.push_file(filename,metadata,f_post_push=_post_push_archive(archive_metrics,time.time()))
+        groupmetadatas = list(resourcemetadata[archive_group].values())
+        resource_metadata = _get_resource_metadata(resourcemetadata,archive_group,resource_id)
+        if archive_journal:
+            archive_journal.done(journal.STAGE_UPLOADED,file_md5=resource_metadata["file_md5"])
+
+    check_mode = get_check_mode(check)
+    if check_mode and not (archive_journal and archive_journal.is_done(journal.STAGE_VERIFIED)):
+        #check whether uploaded succeed or not
+        logger.debug("Begin to check whether loggedpoint archive file was pushed to blob storage successfully, archive_group={},archive_id={},start_date={},end_date={},check_mode={}".format(
+            archive_group,archive_id,start_date,end_date,check_mode
+        ))
+        #the exported file of a resumed day may be missing, download the pushed file to check it
+        file_check_mode = check_mode if os.path.exists(filename) else verify.CHECK_FULL
+        with archive_metrics.measure("verify",bytes=resource_metadata.get("file_size")):
+            verify.check(file_check_mode,blob_resource,filename,resource_metadata,work_folder,layer_metadata=layer_metadata,stream=is_azure_storage())
+        if archive_journal:
+            archive_journal.done(journal.STAGE_VERIFIED,check_mode=file_check_mode)
+
+    if not (archive_journal and archive_journal.is_done(journal.STAGE_INDEX_UPDATED)):
+        #remove the archive file of the same day in other format, which can only happen when overwriting the archive in a different format
+        for m in list(groupmetadatas):
+            if m["resource_id"] != resource_id and is_archive_file(m["resource_id"]) and os.path.splitext(m["resource_id"])[0] == archive_id:
+                logger.info("Delete the archive file({}) which is replaced by {}".format(m["resource_id"],resource_id))
+                blob_resource.delete_resource(archive_group,m["resource_id"])
+                groupmetadatas.remove(m)
+                archive_catalog = catalog.get_catalog()
+                if archive_catalog:
+                    archive_catalog.remove(archive_group,m["resource_id"])
+                _update_group_index(blob_resource,archive_group,m["resource_id"],work_folder)
+
+        #update the group index file
+        with archive_metrics.measure("vrt"):
+            _update_group_index(blob_resource,archive_group,resource_id,work_folder,groupmetadatas=groupmetadatas,check_mode=check_mode)
+
+        archive_catalog = catalog.get_catalog()
+        if archive_catalog:
+            archive_catalog.add(resource_metadata)
+        if archive_journal:
+            archive_journal.done(journal.STAGE_INDEX_UPDATED)
+
+    if delete_after_archive and not (archive_journal and archive_journal.is_done(journal.STAGE_DELETED)):
+        logger.debug("Begin to delete archived data, archive_group={},archive_id={},start_date={},end_date={}".format(
             archive_group,archive_id,start_date,end_date
         ))
-        groupmetadata = resourcemetadata[archive_group]
-        vrt_id = get_vrt_id(archive_group)
-        try:
-            vrt_metadata = next(m for m in groupmetadata.values() if m["resource_id"] == vrt_id)
-        except StopIteration as ex:
-            vrt_metadata = {"resource_id":vrt_id,"resource_file":vrt_id,"resource_group":archive_group}
+        deleted_rows = 0
+        if archive_journal:
+            if archive_journal.get_value("deleting"):
+                #the interrupted run already deleted(and backed up) some chunks, each chunk was committed in its own transaction
+                deleted_rows = layer_metadata["features"] - db.get(remaining_rows_sql,params=(start_date,end_date))[0]
+                logger.info("{} archived rows were deleted by the interrupted run, archive_group={},archive_id={}".format(deleted_rows,archive_group,archive_id))
+            else:
+                archive_journal.set("deleting",True)
+        with archive_metrics.measure("backup_delete" if backup_table else "delete") as stage:
+            deleted_rows = delete_archived_data(start_date,end_date,layer_metadata["features"],backup_table=backup_table,deleted_rows=deleted_rows)
+            stage["rows"] = deleted_rows
+        if archive_journal:
+            if backup_table:
+                archive_journal.done(journal.STAGE_BACKED_UP,backup_table=backup_table)
+            archive_journal.done(journal.STAGE_DELETED,deleted_rows=deleted_rows)
+        logger.debug("Delete {} rows from table tracking_loggedpoint, archive_group={},archive_id={},start_date={},end_date={}".format(
+            deleted_rows,archive_group,archive_id,start_date,end_date
+        ))
 
-        vrt_metadata["features"] = 0
-        for m in groupmetadata.values():
-            if m["resource_id"] == vrt_id:
-                continue
-            vrt_metadata["features"] += m["features"]
-
-        layers =  [(m["layer"],m["resource_file"]) for m in groupmetadata.values() if m["resource_id"] != vrt_id]
-        layers.sort(key=lambda o:o[0])
-        layers = os.linesep.join(individual_layer.format(m[0],m[1]) for m in layers )
-        vrt_data = vrt.format(get_vrt_layername(archive_group),layers)
-        vrt_filename = os.path.join(work_folder,"loggedpoint.vrt")
-        with open(vrt_filename,"w") as f:
-            f.write(vrt_data)
-
-        vrt_metadata["file_md5"] = utils.file_md5(vrt_filename)
-
-        resourcemetadata = blob_resource.push_file(vrt_filename,vrt_metadata,f_post_push=_set_end_datetime("updated"))
-        if check:
-            #check whether uploaded succeed or not
-            logger.debug("Begin to check whether the group vrt file was pused to blob storage successfully, archive_group={},archive_id={},start_date={},end_date={}".format(
-                archive_group,archive_id,start_date,end_date
-            ))
-            d_vrt_metadata,d_vrt_filename = blob_resource.download_resource(archive_group,vrt_id,filename=os.path.join(work_folder,"loggedpoint_download.vrt"))
-            d_vrt_file_md5 = utils.file_md5(d_vrt_filename)
-            if vrt_metadata["file_md5"] != d_vrt_file_md5:
-                raise Exception("Upload vrt file failed.source file's md5={}, uploaded file's md5={}".format(vrt_metadata["file_md5"],d_vrt_file_md5))
+    totals = archive_metrics.finish()
+    #the stages after uploading are not in the pushed resource metadata, save the metrics of all stages and the totals into the catalog
+    archive_catalog = catalog.get_catalog()
+    if archive_catalog:
+        archive_catalog.set_metrics(archive_group,resource_id,totals["seconds"],totals["stages"])
+    logger.info("End to archive loggedpoint, archive_group={},archive_id={},start_date={},end_date={},archived features={}".format(archive_group,archive_id,start_date,end_date,layer_metadata["features"]))
+
+def _json_default(o):
+    if hasattr(o,"isoformat"):
+        return o.isoformat()
+    raise TypeError("Object of type {} is not JSON serializable".format(o.__class__.__name__))
+
+def _update_group_index(blob_resource,archive_group,resource_id,work_folder,groupmetadatas=None,check_mode=None):
+    """
+    Update the group index file after an archive file is added into or removed from the group.
+    The index file of geopackages is a vrt file which unions all geopackages in the group;
+    the index file of geoparquet files is a json manifest which lists all geoparquet files in the group.
+    The index file is removed if no archive files of the same format are left in the group.
+    resource_id: the added or removed archive file
+    groupmetadatas: the metadatas of all resources in the group; if None, read them from blob storage
+    Return the metadata of the pushed index file; return None if the index file was removed
+    """
+    if groupmetadatas is None:
+        groupmetadatas = blob_resource.metadata_client.resource_metadatas(resource_group=archive_group,throw_exception=True)
+    groupmetadatas = list(groupmetadatas)
+    ext = os.path.splitext(resource_id)[1]
+    if ext == archive_file_exts[ARCHIVE_FORMAT_PARQUET]:
+        index_id = get_manifest_id(archive_group)
+    else:
+        index_id = get_vrt_id(archive_group)
+    files = [m for m in groupmetadatas if m["resource_id"].endswith(ext)]
+    files.sort(key=lambda m:m["resource_id"])
+    archive_catalog = catalog.get_catalog()
+
+    if not files:
+        #all archives in the group were deleted
+        if any(m["resource_id"] == index_id for m in groupmetadatas):
+            blob_resource.delete_resource(archive_group,index_id)
+            if archive_catalog:
+                archive_catalog.remove(archive_group,index_id)
+        return None
 
-        if delete_after_archive:
+    logger.debug("Begin to update the index file({}) to union all archive files in the same group, archive_group={}".format(index_id,archive_group))
+    try:
+        index_metadata = next(m for m in groupmetadatas if m["resource_id"] == index_id)
+    except StopIteration as ex:
+        index_metadata = {"resource_id":index_id,"resource_file":index_id,"resource_group":archive_group}
+
+    index_metadata["features"] = sum(m["features"] for m in files)
+    index_filename = os.path.join(work_folder,index_id)
+    if index_id.endswith(".vrt"):
+        layers = os.linesep.join(individual_layer.format(m["layer"],m["resource_file"]) for m in files)
+        with open(index_filename,"w") as f:
+            f.write(vrt.format(get_vrt_layername(archive_group),layers))
+    else:
+        manifest = {
+            "layer":get_vrt_layername(archive_group),
+            "format":ARCHIVE_FORMAT_PARQUET,
+            "features":index_metadata["features"],
+            "files":[dict((k,m.get(k)) for k in ("resource_id","resource_file","layer","features","start_archive_date","end_archive_date","extent","file_md5","file_size")) for m in files]
+        }
+        with open(index_filename,"w") as f:
+            json.dump(manifest,f,indent=4,default=_json_default)
+
+    index_metadata["file_md5"] = utils.file_md5(index_filename)
+    index_metadata["file_size"] = utils.file_size(index_filename)
+
+    resourcemetadata = blob_resource.push_file(index_filename,index_metadata,f_post_push=_set_end_datetime("updated"))
+    index_metadata = _get_resource_metadata(resourcemetadata,archive_group,index_id)
+    if check_mode:
+        #check whether uploaded succeed or not
+        logger.debug("Begin to check whether the index file({}) was pushed to blob storage successfully, archive_group={},check_mode={}".format(index_id,archive_group,check_mode))
+        verify.check(check_mode,blob_resource,index_filename,index_metadata,work_folder,stream=is_azure_storage())
+    if archive_catalog:
+        archive_catalog.add(index_metadata)
+    utils.remove_file(index_filename)
+    return index_metadata
+
+def read_manifest(filename):
+    """
+    Read the group manifest of geoparquet files
+    Return the manifest dict
+    """
+    with open(filename) as f:
+        return json.load(f)
+
+def _get_chunks(start_date,end_date,db):
+    """
+    Return a list of (chunk column,chunk start(inclusive),chunk end(exclusive)); each chunk selects a chunk of the loggedpoints between start_date and end_date
+    """
+    if settings.LOGGEDPOINT_DELETE_CHUNK_BY == "time":
+        chunks = []
+        chunk_start = start_date
+        while chunk_start < end_date:
+            chunk_end = min(chunk_start + timedelta(minutes=settings.LOGGEDPOINT_DELETE_CHUNK_MINUTES),end_date)
+            chunks.append(("seen",chunk_start,chunk_end))
+            chunk_start = chunk_end
+        return chunks
+    elif settings.LOGGEDPOINT_DELETE_CHUNK_BY == "id":
+        min_id,max_id = db.get(id_range_sql,params=(start_date,end_date))
+        if min_id is None:
+            return []
+        return [("id",chunk_start,chunk_start + settings.LOGGEDPOINT_DELETE_CHUNK_SIZE) for chunk_start in range(min_id,max_id + 1,settings.LOGGEDPOINT_DELETE_CHUNK_SIZE)]
+    else:
+        raise Exception("Delete chunk type({}) Not Support".format(settings.LOGGEDPOINT_DELETE_CHUNK_BY))
+
+def delete_archived_data(start_date,end_date,features,backup_table=None,deleted_rows=0):
+    """
+    Delete the archived loggedpoints between start_date(inclusive) and end_date(exclusive) from table tracking_loggedpoint chunk by chunk.
+    Each chunk is deleted(and moved into the backup table with one statement if backup_table is not None) and committed in its own transaction,
+    the chunk statement is prepared once and executed with the bounds of each chunk,
+    and the deleting is throttled by settings.LOGGEDPOINT_DELETE_CHUNK_SLEEP and settings.LOGGEDPOINT_DELETE_MAX_ROWS_PER_SECOND to keep the write latency of production flat.
+    features: the number of archived features, used to validate the number of deleted rows
+    deleted_rows: the number of archived rows which were already deleted by an interrupted run
+    Return the number of deleted rows
+    """
+    db = settings.DATABASE
+    if deleted_rows < 0:
+        raise Exception("The number of remaining rows is greater than the number of archived features({}), start_date={}, end_date={}".format(features,start_date,end_date))
+    resumed_rows = deleted_rows
+    starttime = time.time()
+    with db:
+        if backup_table:
+            backup.prepare(db,backup_table,start_date)
+
+        chunks = _get_chunks(start_date,end_date,db)
+        for i,(chunk_column,chunk_start,chunk_end) in enumerate(chunks):
+            params = (start_date,end_date,chunk_start,chunk_end)
             if backup_table:
-                if db.is_table_exist(backup_table):
-                    #table already exist
-                    sql = backup_sql.format(start_date.strftime(datetime_pattern),end_date.strftime(datetime_pattern),backup_table)
-                else:
-                    #table doesn't exist
-                    sql = backup_sql_with_create_table.format(start_date.strftime(datetime_pattern),end_date.strftime(datetime_pattern),backup_table)
-                count = db.update(sql)
-                if count == layer_metadata["features"]:
-                    logger.debug("Backup {1} features to backup table {0}".format(backup_table,count))
-                else:
-                    raise Exception("Only backup {1}/{2} features to backup table {0}".format(backup_table,count,layer_metadata["features"]))
-
-            logger.debug("Begin to delete archived data, archive_group={},archive_id={},start_date={},end_date={}".format(
-                archive_group,archive_id,start_date,end_date
+                try:
+                    moved_rows,backuped_rows = db.get(chunk_move_sql.format(chunk_column,backup_table),params=params,prepared=True)
+                    if moved_rows != backuped_rows:
+                        raise Exception("Only backup {1}/{2} features to backup table {0}".format(backup_table,backuped_rows,moved_rows))
+                    if deleted_rows + moved_rows > features:
+                        raise Exception("The number of deleted rows({}) is greater than the number of archived features({})".format(deleted_rows + moved_rows,features))
+                    db.commit()
+                except:
+                    db.rollback()
+                    raise
+                chunk_rows = moved_rows
+            else:
+                chunk_rows = db.update(chunk_del_sql.format(chunk_column),commit=False,params=params,prepared=True)
+                if deleted_rows + chunk_rows > features:
+                    db.rollback()
+                    raise Exception("The number of deleted rows({}) is greater than the number of archived features({})".format(deleted_rows + chunk_rows,features))
+                db.commit()
+            deleted_rows += chunk_rows
+            logger.debug("Deleted {}/{} rows from table tracking_loggedpoint{}, chunk {}/{}, start_date={}, end_date={}".format(
+                deleted_rows,features," and moved into backup table {}".format(backup_table) if backup_table else "",i + 1,len(chunks),start_date,end_date
             ))
 
-            delete_sql = del_sql.format(start_date.strftime(datetime_pattern),end_date.strftime(datetime_pattern))
-            deleted_rows = db.update(delete_sql)
-            logger.debug("Delete {} rows from table tracking_loggedpoint, archive_group={},archive_id={},start_date={},end_date={}".format(
-                deleted_rows,archive_group,archive_id,start_date,end_date
-            ))
+            #throttle
+            sleep_time = settings.LOGGEDPOINT_DELETE_CHUNK_SLEEP or 0
+            if settings.LOGGEDPOINT_DELETE_MAX_ROWS_PER_SECOND:
+                sleep_time = max(sleep_time,(deleted_rows - resumed_rows) / settings.LOGGEDPOINT_DELETE_MAX_ROWS_PER_SECOND - (time.time() - starttime))
+            if sleep_time > 0 and i < len(chunks) - 1:
+                time.sleep(sleep_time)
 
-        logger.info("End to archive loggedpoint, archive_group={},archive_id={},start_date={},end_date={},archived features={}".format(archive_group,archive_id,start_date,end_date,layer_metadata["features"]))
+        if backup_table and backup.is_partitioned(backup_table):
+            backup.expire_partitions(db,backup_table)
 
+    if deleted_rows != features:
+        raise Exception("Only delete {}/{} archived features from table tracking_loggedpoint, start_date={}, end_date={}".format(deleted_rows,features,start_date,end_date))
+
+    if backup_table and backup.is_partitioned(backup_table):
+        #the months before the month of the archived day are complete, build their indexes concurrently after the chunks are deleted
+        backup.index_partitions(db,backup_table,before=date(start_date.year,start_date.month,1))
+    return deleted_rows
 
-    finally:
-        utils.remove_folder(work_folder)
-        pass
-            
 def restore_by_month(year,month,restore_to_origin_table=False,preserve_id=True):
     """
     Restore the loggedpoint from archived files for the month
@@ -308,9 +977,32 @@ def restore_by_month(year,month,restore_to_origin_table=False,preserve_id=True):
     blob_resource = get_blob_resource()
     work_folder = tempfile.mkdtemp(prefix="restore_loggedpoint")
     try:
-        metadata,filename = blob_resource.download_resources(resource_group=archive_group,folder=work_folder,overwrite=True)
-        if metadata:
-            imported_table = _restore_data(os.path.join(work_folder,get_vrt_id(archive_group)),restore_to_origin_table=restore_to_origin_table,preserve_id=preserve_id)
+        imported_table = None
+        if settings.LOGGEDPOINT_RESTORE_ENGINE == "copy":
+            #load each daily file as soon as it is downloaded
+            group_downloader = downloader.GroupDownloader(blob_resource,archive_group,work_folder,overwrite=True,f_filter=lambda m:is_archive_file(m["resource_id"]),stream=is_azure_storage())
+            imported_table,rows = loader.load_files(
+                (filename for metadata,filename in group_downloader.download()),
+                table=PostgreSQL.get_table_name(get_vrt_layername(archive_group)),
+                restore_to_origin_table=restore_to_origin_table,
+                preserve_id=preserve_id
+            )
+        else:
+            #the compressed files are decompressed during downloading
+            metadata = list(downloader.GroupDownloader(blob_resource,archive_group,work_folder,overwrite=True,stream=is_azure_storage()).download())
+            manifest_file = os.path.join(work_folder,get_manifest_id(archive_group))
+            if metadata and os.path.exists(manifest_file):
+                #ogr2ogr can't import geoparquet, the geoparquet files listed in the manifest are loaded with binary copy
+                if os.path.exists(os.path.join(work_folder,get_vrt_id(archive_group))):
+                    raise Exception("The archive group({}) contains both geopackages and geoparquet files, please restore it with the copy restore engine".format(archive_group))
+                imported_table,rows = loader.load_files(
+                    [os.path.join(work_folder,m["resource_file"]) for m in read_manifest(manifest_file)["files"]],
+                    table=PostgreSQL.get_table_name(get_vrt_layername(archive_group)),
+                    restore_to_origin_table=restore_to_origin_table,
+                    preserve_id=preserve_id
+                )
+            elif metadata:
+                imported_table = _restore_data(os.path.join(work_folder,get_vrt_id(archive_group)),restore_to_origin_table=restore_to_origin_table,preserve_id=preserve_id)
         logger.info("End to import archived loggedpoint, archive_group={},imported_table = {}".format(archive_group,imported_table))
     finally:
         utils.remove_folder(work_folder)
@@ -325,18 +1017,105 @@ def restore_by_date(d,restore_to_origin_table=False,preserve_id=True):
     """
     archive_group = get_archive_group(d)
     archive_id= get_archive_id(d)
-    resource_id = "{}.gpkg".format(archive_id)
     logger.info("Begin to import archived loggedpoint, archive_group={},archive_id={}".format(archive_group,archive_id))
     blob_resource = get_blob_resource()
+    resource_id = _get_archived_resource_id(blob_resource,archive_group,archive_id) or get_archive_resource_id(archive_id,ARCHIVE_FORMAT_GPKG)
     work_folder = tempfile.mkdtemp(prefix="restore_loggedpoint")
     try:
-        metadata,filename = blob_resource.download_resource(archive_group,resource_id,filename=os.path.join(work_folder,resource_id))
-        imported_table =_restore_data(filename,restore_to_origin_table=restore_to_origin_table,preserve_id=preserve_id)
+        metadata,filename = downloader.download_resource(blob_resource,archive_group,resource_id,work_folder,overwrite=True,stream=is_azure_storage())
+        #ogr2ogr can't import geoparquet
+        if settings.LOGGEDPOINT_RESTORE_ENGINE == "copy" or not resource_id.endswith(archive_file_exts[ARCHIVE_FORMAT_GPKG]):
+            imported_table,rows = loader.load_files([filename],table=PostgreSQL.get_table_name(archive_id),restore_to_origin_table=restore_to_origin_table,preserve_id=preserve_id)
+        else:
+            imported_table =_restore_data(filename,restore_to_origin_table=restore_to_origin_table,preserve_id=preserve_id)
         logger.info("End to import archived loggedpoint, archive_group={},archive_id={},imported_table={}".format(archive_group,archive_id,imported_table))
     finally:
         utils.remove_folder(work_folder)
         pass
 
+def _is_restore_required(metadata,start_time,end_time,bbox=None):
+    """
+    Return True if the archived file may contain the loggedpoints seen between start_time and end_time and within the bbox
+    """
+    if not is_archive_file(metadata["resource_id"]) or metadata.get("features") == 0:
+        return False
+    if metadata.get("start_archive_date") and timezone.parse(metadata["start_archive_date"]) >= end_time:
+        return False
+    if metadata.get("end_archive_date") and timezone.parse(metadata["end_archive_date"]) <= start_time:
+        return False
+    if bbox and metadata.get("extent"):
+        minx,miny,maxx,maxy = metadata["extent"]
+        if minx > bbox[2] or maxx < bbox[0] or miny > bbox[3] or maxy < bbox[1]:
+            return False
+    return True
+
+def restore(start_time,end_time,deviceids=None,bbox=None,restore_to_origin_table=False,preserve_id=True,table=None):
+    """
+    Restore the loggedpoints seen between start_time(inclusive) and end_time(exclusive) from archived files.
+    Only the archived files overlapping the time window and the bbox are downloaded,
+    and only the matching loggedpoints are read from the files and loaded into the database.
+    deviceids: only restore the loggedpoints of these devices; if None, restore all devices
+    bbox: [minx,miny,maxx,maxy]; only restore the loggedpoints within the bbox
+    restore_to_origin_table: if true, restore the data to table tracking_loggedpoint; otherwise restore the data into table 'table'
+    preserve_id: meaningful if restore_to_origin_table is True.
+    table: the table to restore the data into; if None, the table name is derived from the time window
+    Return (restored table,restored rows)
+    """
+    start_time = timezone.nativetime(start_time)
+    end_time = timezone.nativetime(end_time)
+    if start_time >= end_time:
+        raise Exception("The start time({}) should be earlier than the end time({})".format(start_time,end_time))
+    if not table:
+        table = PostgreSQL.get_table_name("loggedpoint_{}_{}".format(start_time.strftime("%Y%m%d%H%M%S"),end_time.strftime("%Y%m%d%H%M%S")))
+
+    #the filter of the features in the archived files, the column 'seen' is archived as epoch seconds
+    filters = [("seen",">=",int(start_time.timestamp())),("seen","<",int(end_time.timestamp()))]
+    if deviceids:
+        filters.append(("deviceid","in",list(deviceids)))
+
+    logger.info("Begin to restore archived loggedpoint, start_time={},end_time={},deviceids={},bbox={}".format(start_time,end_time,deviceids,bbox))
+    blob_resource = get_blob_resource()
+    work_folder = tempfile.mkdtemp(prefix="restore_loggedpoint")
+
+    def _is_required(metadata):
+        return _is_restore_required(metadata,start_time,end_time,bbox=bbox)
+
+    archive_catalog = catalog.get_catalog()
+    def _get_files():
+        #the archive groups are monthly
+        d = date(start_time.year,start_time.month,1)
+        last_month = (end_time - timedelta(microseconds=1)).date().replace(day=1)
+        while d <= last_month:
+            if archive_catalog and not any(_is_required(m) for m in archive_catalog.resource_metadatas(get_archive_group(d))):
+                #no archived file in the group is relevant
+                d = (d + timedelta(days=32)).replace(day=1)
+                continue
+            group_downloader = downloader.GroupDownloader(
+                blob_resource,
+                get_archive_group(d),
+                work_folder,
+                overwrite=True,
+                f_filter=_is_required,
+                stream=is_azure_storage()
+            )
+            for metadata,filename in group_downloader.download():
+                yield filename
+            d = (d + timedelta(days=32)).replace(day=1)
+
+    try:
+        imported_table,rows = loader.load_files(
+            _get_files(),
+            table=table,
+            restore_to_origin_table=restore_to_origin_table,
+            preserve_id=preserve_id,
+            bbox=bbox,
+            filters=filters
+        )
+        logger.info("End to restore archived loggedpoint, start_time={},end_time={},imported_table={},rows={}".format(start_time,end_time,imported_table,rows))
+        return (imported_table,rows)
+    finally:
+        utils.remove_folder(work_folder)
+
 def _restore_data(filename,restore_to_origin_table=False,preserve_id=True):
     """
     Restore the loggedpoint from the archived files
@@ -386,7 +1165,9 @@ def download_by_month(year,month,folder=None,overwrite=False):
     logger.info("Begin to download archived loggedpoint, archive_group={}".format(archive_group))
     blob_resource = get_blob_resource()
     folder = folder or tempfile.mkdtemp(prefix="loggedpoint{}".format(d.strftime("%Y-%m")))
-    metadata,folder = blob_resource.download_resources(resource_group=archive_group,folder=folder,overwrite=overwrite)
+    group_downloader = downloader.GroupDownloader(blob_resource,archive_group,folder,overwrite=overwrite,stream=is_azure_storage())
+    for metadata,filename in group_downloader.download():
+        logger.debug("Downloaded archived loggedpoint file {}".format(filename))
     logger.info("End to download archived loggedpoint, archive_group={},downloaded_folder={}".format(archive_group,folder))
 
 def download_by_date(d,folder=None,overwrite=False):
@@ -395,13 +1176,39 @@ def download_by_date(d,folder=None,overwrite=False):
     """
     archive_group = get_archive_group(d)
     archive_id= get_archive_id(d)
-    resource_id = "{}.gpkg".format(archive_id)
     logger.info("Begin to download archived loggedpoint, archive_group={},archive_id={}".format(archive_group,archive_id))
     blob_resource = get_blob_resource()
+    resource_id = _get_archived_resource_id(blob_resource,archive_group,archive_id) or get_archive_resource_id(archive_id,ARCHIVE_FORMAT_GPKG)
     folder = folder or tempfile.mkdtemp(prefix="loggedpoint{}".format(d.strftime("%Y-%m-%d")))
-    metadata,filename = blob_resource.download_resource(archive_group,resource_id,filename=os.path.join(folder,resource_id),overwrite=overwrite)
+    metadata,filename = downloader.download_resource(blob_resource,archive_group,resource_id,folder,overwrite=overwrite,stream=is_azure_storage())
     logger.info("End to download archived loggedpoint, archive_group={},archive_id={},dowloaded_file={}".format(archive_group,archive_id,filename))
 
+def export_tabular(start_date,end_date,dest,file_format="csv",codec=None,from_backup_table=False):
+    """
+    Export the loggedpoints between start_date(inclusive) and end_date(exclusive) into a csv,text or ndjson file with 'COPY', no gdal is required
+    dest: a file name or a writable file-like object
+    codec: compress the exported data with the codec if not None
+    from_backup_table: export the archived loggedpoints from the backup table instead of table tracking_loggedpoint
+    Return the result of 'PostgreSQL.copy_out'
+    """
+    if from_backup_table:
+        backup_table = get_backup_table(start_date)
+        if not settings.DATABASE.is_table_exist(backup_table):
+            raise Exception("The backup table({}) doesn't exist".format(backup_table))
+        sql = backup_tabular_sql.format(backup_table)
+    else:
+        sql = tabular_sql
+    logger.info("Begin to export loggedpoint into tabular file, start_date={},end_date={},format={},codec={}".format(start_date,end_date,file_format,codec))
+    result = settings.DATABASE.copy_out(
+        sql,
+        dest,
+        format=file_format,
+        codec=codec,
+        params=(timezone.datetime(start_date.year,start_date.month,start_date.day),timezone.datetime(end_date.year,end_date.month,end_date.day))
+    )
+    logger.info("End to export loggedpoint into tabular file, start_date={},end_date={},rows={},bytes={}".format(start_date,end_date,result["rows"],result["file_size"]))
+    return result
+
 def user_confirm(message,possible_answers,case_sensitive=False):
     """
     Ask the user's confirmation
@@ -431,6 +1238,9 @@ def delete_all():
 
     blob_resource = get_blob_resource()
     blob_resource.delete_resources(throw_exception=False)
+    archive_catalog = catalog.get_catalog()
+    if archive_catalog:
+        archive_catalog.remove()
 
 def delete_archive_by_month(year,month):
     """
@@ -446,6 +1256,9 @@ def delete_archive_by_month(year,month):
     archive_group = get_archive_group(d)
     blob_resource = get_blob_resource()
     blob_resource.delete_resources(resource_group=archive_group,throw_exception=False)
+    archive_catalog = catalog.get_catalog()
+    if archive_catalog:
+        archive_catalog.remove(archive_group)
 
 def delete_archive_by_date(d):
     """
@@ -459,40 +1272,17 @@ def delete_archive_by_date(d):
         return
     archive_group = get_archive_group(d)
     archive_id= get_archive_id(d)
-    resource_id = "{}.gpkg".format(archive_id)
-    vrt_id = get_vrt_id(archive_group)
 
     work_folder = None
     blob_resource = get_blob_resource()
     try:
+        resource_id = _get_archived_resource_id(blob_resource,archive_group,archive_id) or get_archive_resource_id(archive_id,ARCHIVE_FORMAT_GPKG)
         del_metadata = blob_resource.delete_resource(archive_group,resource_id)
-        groupmetadatas = [m for m in blob_resource.metadata_client.resource_metadatas(resource_group=archive_group,throw_exception=True)]
-
-        vrt_metadata = next(m for m in groupmetadatas if m["resource_id"] == vrt_id)
-
-        vrt_metadata["features"] = 0
-        for m in groupmetadatas:
-            if m["resource_id"] == vrt_id:
-                continue
-            vrt_metadata["features"] += m["features"]
-
-        layers =  [(m["resource_id"],m["resource_file"]) for m in groupmetadatas if m["resource_id"] != vrt_id]
-        if layers:
-            work_folder = tempfile.mkdtemp(prefix="delete_archive")
-            layers.sort(key=lambda o:o[0])
-            layers = os.linesep.join(individual_layer.format(m[0],m[1]) for m in layers )
-            vrt_data = vrt.format(archive_group,layers)
-            vrt_filename = os.path.join(work_folder,"loggedpoint.vrt")
-            with open(vrt_filename,"w") as f:
-                f.write(vrt_data)
-
-            vrt_metadata["file_md5"] = utils.file_md5(vrt_filename)
-            resourcemetadata = blob_resource.push_file(vrt_filename,vrt_metadata,f_post_push=_set_end_datetime("updated"))
-        else:
-            #all archives in the group were deleted
-            blob_resource.delete_resource(archive_group,vrt_id)
+        archive_catalog = catalog.get_catalog()
+        if archive_catalog:
+            archive_catalog.remove(archive_group,resource_id)
+        work_folder = tempfile.mkdtemp(prefix="delete_archive")
+        _update_group_index(blob_resource,archive_group,resource_id,work_folder)
     finally:
         utils.remove_folder(work_folder)
         pass
-
-
@@ -0,0 +1,178 @@
+import re
+import logging
+import threading
+from datetime import date
+
+from utils import timezone
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+#a flat backup table per year
+LAYOUT_YEARLY = "yearly"
+#a backup parent table partitioned by month
+LAYOUT_PARTITIONED = "partitioned"
+
+#the columns of the backup table
+backup_columns_sql = "SELECT a.id,a.point,a.heading,a.velocity,a.altitude,a.message,a.source_device_type,a.raw,a.seen,b.deviceid,b.registration FROM tracking_loggedpoint a JOIN tracking_device b ON a.device_id = b.id"
+#the sql to create an empty yearly backup table
+create_backup_table_sql = "CREATE TABLE \"{0}\" AS " + backup_columns_sql + " WITH NO DATA"
+#the sqls to create the partitioned parent table, the column types are copied from an empty template table
+create_parent_table_sqls = [
+    "DROP TABLE IF EXISTS \"{0}_template\"",
+    "CREATE TABLE \"{0}_template\" AS " + backup_columns_sql + " WITH NO DATA",
+    "CREATE TABLE IF NOT EXISTS \"{0}\" (LIKE \"{0}_template\") PARTITION BY RANGE (seen)",
+    "DROP TABLE \"{0}_template\""
+]
+#the sql to create the partition of a month
+create_partition_sql = "CREATE TABLE IF NOT EXISTS \"{1}\" PARTITION OF \"{0}\" FOR VALUES FROM ('{2}') TO ('{3}')"
+#the sql to list the partitions of the parent table
+partitions_sql = "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON i.inhrelid = c.oid JOIN pg_class p ON i.inhparent = p.oid WHERE p.relname = '{0}' ORDER BY c.relname"
+#the sqls to create the indexes of a completed month, the indexes are built concurrently out of a transaction, so the writes to the partition are not blocked
+create_partition_index_sqls = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS \"{0}_seen\" ON \"{0}\" (seen)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS \"{0}_deviceid\" ON \"{0}\" (deviceid)"
+]
+#the sql to count the valid indexes of a partition
+partition_indexes_sql = "SELECT count(1) FROM pg_index i JOIN pg_class t ON i.indrelid = t.oid WHERE t.relname = '{0}' AND i.indisvalid"
+#the sql to list the invalid indexes of a partition, which are left by a failed concurrent index build
+invalid_indexes_sql = "SELECT c.relname FROM pg_index i JOIN pg_class c ON i.indexrelid = c.oid JOIN pg_class t ON i.indrelid = t.oid WHERE t.relname = '{0}' AND NOT i.indisvalid"
+#the sql to drop an invalid index
+drop_index_sql = "DROP INDEX CONCURRENTLY IF EXISTS \"{0}\""
+#the sql to detach a partition from the parent table
+detach_partition_sql = "ALTER TABLE \"{0}\" DETACH PARTITION \"{1}\""
+#the sql to drop a table
+drop_table_sql = "DROP TABLE \"{0}\""
+
+datetime_pattern = "%Y-%m-%d %H:%M:%S %Z"
+
+get_partition_name = lambda parent,d:"{}_y{}".format(parent,d.strftime("%Ym%m"))
+_partition_month_re = re.compile("_y(?P<year>[0-9]{4})m(?P<month>[0-9]{2})$")
+
+def _next_month(d):
+    return date(d.year + 1,1,1) if d.month == 12 else date(d.year,d.month + 1,1)
+
+def _to_datetime(d):
+    return timezone.datetime(d.year,d.month,d.day)
+
+def get_backup_table(d):
+    """
+    Return the backup table of the archived loggedpoints of the day
+    """
+    if settings.LOGGEDPOINT_BACKUP_TABLE_LAYOUT == LAYOUT_PARTITIONED:
+        return settings.LOGGEDPOINT_BACKUP_TABLE
+    elif settings.LOGGEDPOINT_BACKUP_TABLE_LAYOUT == LAYOUT_YEARLY:
+        return "tracking_loggedpoint_{}".format(d.strftime('%Y'))
+    else:
+        raise Exception("Backup table layout({}) Not Support".format(settings.LOGGEDPOINT_BACKUP_TABLE_LAYOUT))
+
+def is_partitioned(backup_table):
+    return settings.LOGGEDPOINT_BACKUP_TABLE_LAYOUT == LAYOUT_PARTITIONED and backup_table == settings.LOGGEDPOINT_BACKUP_TABLE
+
+#the partitions which are known to exist
+_partitions = set()
+_partitions_lock = threading.Lock()
+
+def prepare(db,backup_table,d):
+    """
+    Make sure the backup table of the day exists before the archived loggedpoints of the day are moved into it.
+    For a partitioned backup table, the partition of the month is created and attached if it doesn't exist.
+    The indexes of the completed months are not built here, see 'index_partitions'
+    d: the archived day
+    """
+    if not is_partitioned(backup_table):
+        if not db.is_table_exist(backup_table):
+            db.executeDDL(create_backup_table_sql.format(backup_table))
+            logger.info("Created the backup table({})".format(backup_table))
+        return
+
+    month = date(d.year,d.month,1)
+    partition = get_partition_name(backup_table,month)
+    with _partitions_lock:
+        if partition in _partitions:
+            return
+        if not db.is_table_exist(backup_table):
+            for sql in create_parent_table_sqls:
+                db.executeDDL(sql.format(backup_table))
+            logger.info("Created the partitioned backup table({})".format(backup_table))
+        if not db.is_table_exist(partition):
+            db.executeDDL(create_partition_sql.format(
+                backup_table,
+                partition,
+                _to_datetime(month).strftime(datetime_pattern),
+                _to_datetime(_next_month(month)).strftime(datetime_pattern)
+            ))
+            logger.info("Created the partition({}) of the backup table({})".format(partition,backup_table))
+        _partitions.add(partition)
+
+def get_partitions(db,backup_table):
+    """
+    Return a list of (month,partition) of the partitioned backup table in month order
+    """
+    result = []
+    for row in db.query(partitions_sql.format(backup_table)):
+        m = _partition_month_re.search(row[0])
+        if m:
+            result.append((date(int(m.group("year")),int(m.group("month")),1),row[0]))
+    result.sort()
+    return result
+
+def index_partitions(db,backup_table,before=None):
+    """
+    Build the indexes on seen and deviceid of the partitions of the completed months.
+    The indexes are built after a month is complete, so the backup of the current month is not slowed down by index maintenance,
+    and are built concurrently in autocommit mode, so the writes to the partitions are not blocked. It can't be called in a 'with' block.
+    The invalid indexes left by a failed build are dropped and built again.
+    before: the partitions of the months before it are indexed; if None, use the current month
+    Return the list of indexed partitions
+    """
+    before = before or timezone.now().date().replace(day=1)
+    indexed = []
+    for month,partition in get_partitions(db,backup_table):
+        if month >= before:
+            continue
+        if db.get(partition_indexes_sql.format(partition))[0] >= len(create_partition_index_sqls):
+            continue
+        logger.info("Begin to build the indexes of the partition({})".format(partition))
+        for row in db.query(invalid_indexes_sql.format(partition)):
+            db.update(drop_index_sql.format(row[0]),autocommit=True)
+        for sql in create_partition_index_sqls:
+            db.update(sql.format(partition),autocommit=True)
+        indexed.append(partition)
+    return indexed
+
+def detach_partition(db,backup_table,month,drop=False):
+    """
+    Detach the partition of the month from the backup table, and drop it if drop is True
+    Return the detached partition; return None if the partition doesn't exist
+    """
+    partition = get_partition_name(backup_table,month)
+    if not db.is_table_exist(partition):
+        return None
+    db.executeDDL(detach_partition_sql.format(backup_table,partition))
+    if drop:
+        db.executeDDL(drop_table_sql.format(partition))
+    with _partitions_lock:
+        _partitions.discard(partition)
+    logger.info("{} the partition({}) of the backup table({})".format("Dropped" if drop else "Detached",partition,backup_table))
+    return partition
+
+def expire_partitions(db,backup_table,retention_months=None,drop=True):
+    """
+    Detach(and drop) the partitions which are older than the retention months
+    retention_months: the months to keep; if None, use settings.LOGGEDPOINT_BACKUP_RETENTION_MONTHS. 0 means keep forever
+    Return the list of expired partitions
+    """
+    retention_months = settings.LOGGEDPOINT_BACKUP_RETENTION_MONTHS if retention_months is None else retention_months
+    if not retention_months:
+        return []
+    today = timezone.now().date()
+    months = today.year * 12 + today.month - 1 - retention_months
+    expire_before = date(months // 12,months % 12 + 1,1)
+    expired = []
+    for month,partition in get_partitions(db,backup_table):
+        if month < expire_before:
+            detach_partition(db,backup_table,month,drop=drop)
+            expired.append(partition)
+    return expired
@@ -0,0 +1,274 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from datetime import date,timedelta
+
+from utils import timezone
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+create_tables_sql = [
+    """CREATE TABLE IF NOT EXISTS archive (
+        resource_group TEXT NOT NULL,
+        resource_id TEXT NOT NULL,
+        archive_date TEXT,
+        start_archive_date TEXT,
+        end_archive_date TEXT,
+        features INTEGER,
+        file_md5 TEXT,
+        file_size INTEGER,
+        layer TEXT,
+        extent TEXT,
+        start_archive TEXT,
+        end_archive TEXT,
+        PRIMARY KEY (resource_group,resource_id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS archive_date_idx ON archive (archive_date)",
+    "CREATE TABLE IF NOT EXISTS catalog_state (name TEXT PRIMARY KEY,value TEXT)",
+    """CREATE TABLE IF NOT EXISTS archive_metrics (
+        resource_group TEXT NOT NULL,
+        resource_id TEXT NOT NULL,
+        seconds REAL,
+        stages TEXT,
+        archived TEXT,
+        PRIMARY KEY (resource_group,resource_id)
+    )"""
+]
+
+upsert_sql = """INSERT OR REPLACE INTO archive (resource_group,resource_id,archive_date,start_archive_date,end_archive_date,features,file_md5,file_size,layer,extent,start_archive,end_archive)
+    VALUES (?,?,?,?,?,?,?,?,?,?,?,?)"""
+
+#save the stage metrics of the archived day, the stages after uploading are not in the pushed resource metadata
+upsert_metrics_sql = "INSERT OR REPLACE INTO archive_metrics (resource_group,resource_id,seconds,stages,archived) VALUES (?,?,?,?,?)"
+
+#the condition to select the archived loggedpoint files
+archive_file_condition = "(resource_id LIKE '%.gpkg' OR resource_id LIKE '%.parquet')"
+
+def _to_str(v):
+    v = timezone.parse(v)
+    return v.isoformat() if v else None
+
+class ArchiveCatalog(object):
+    """
+    A local sqlite catalog of the archived loggedpoint resources.
+    It is populated from the resource metadata in blob storage by 'sync', and kept up to date by archiving and deleting,
+    so existence checks, month listings, gap detection and feature totals don't need a storage round trip.
+    filename: the sqlite file; if None, use settings.LOGGEDPOINT_CATALOG_FILE
+    """
+    def __init__(self,filename=None):
+        self.filename = filename or settings.LOGGEDPOINT_CATALOG_FILE
+        folder = os.path.dirname(os.path.abspath(self.filename))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.filename,check_same_thread=False)
+        with self._conn:
+            for sql in create_tables_sql:
+                self._conn.execute(sql)
+
+    def close(self):
+        if self._conn:
+            try:
+                self._conn.close()
+            finally:
+                self._conn = None
+
+    def _query(self,sql,params=()):
+        with self._lock:
+            return self._conn.execute(sql,params).fetchall()
+
+    def _get_row(self,metadata):
+        start_archive_date = timezone.parse(metadata.get("start_archive_date"))
+        return (
+            metadata["resource_group"],
+            metadata["resource_id"],
+            start_archive_date.date().isoformat() if start_archive_date else None,
+            start_archive_date.isoformat() if start_archive_date else None,
+            _to_str(metadata.get("end_archive_date")),
+            metadata.get("features"),
+            metadata.get("file_md5"),
+            metadata.get("file_size"),
+            metadata.get("layer"),
+            json.dumps(metadata["extent"]) if metadata.get("extent") else None,
+            _to_str(metadata.get("start_archive")),
+            _to_str(metadata.get("end_archive") or metadata.get("updated"))
+        )
+
+    def add(self,metadata):
+        """
+        Add or update the resource in the catalog
+        metadata: the resource metadata
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute(upsert_sql,self._get_row(metadata))
+
+    def remove(self,resource_group=None,resource_id=None):
+        """
+        Remove the resource from the catalog
+        resource_id: if None, remove all resources in the group
+        resource_group: if None, remove all resources
+        """
+        with self._lock:
+            with self._conn:
+                for table in ("archive","archive_metrics"):
+                    if resource_group and resource_id:
+                        self._conn.execute("DELETE FROM {} WHERE resource_group = ? AND resource_id = ?".format(table),(resource_group,resource_id))
+                    elif resource_group:
+                        self._conn.execute("DELETE FROM {} WHERE resource_group = ?".format(table),(resource_group,))
+                    else:
+                        self._conn.execute("DELETE FROM {}".format(table))
+
+    def set_metrics(self,resource_group,resource_id,seconds,stages):
+        """
+        Save the stage metrics and the total seconds of the archived day
+        stages: the metrics of each stage, returned by 'ArchiveMetrics.finish'
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute(upsert_metrics_sql,(resource_group,resource_id,seconds,json.dumps(stages),timezone.now().isoformat()))
+
+    def get_metrics(self,resource_group,resource_id):
+        """
+        Return the saved metrics {"seconds":total seconds,"stages":the metrics of each stage,"archived":the time when the day was archived}; return None if not saved
+        """
+        rows = self._query("SELECT seconds,stages,archived FROM archive_metrics WHERE resource_group = ? AND resource_id = ?",(resource_group,resource_id))
+        if not rows:
+            return None
+        return {"seconds":rows[0][0],"stages":json.loads(rows[0][1]) if rows[0][1] else {},"archived":timezone.parse(rows[0][2])}
+
+    def sync(self,blob_resource,resource_group=None):
+        """
+        Synchronize the catalog with the resource metadata in blob storage.
+        Only the changed resources are written into the catalog, and the resources which don't exist in blob storage any more are removed.
+        resource_group: only synchronize the resource group; if None, synchronize all resource groups
+        Return (the number of added or updated resources,the number of removed resources)
+        """
+        logger.info("Begin to synchronize the archive catalog({}) with blob storage, resource_group={}".format(self.filename,resource_group))
+        if resource_group:
+            local_rows = self._query("SELECT resource_group,resource_id,file_md5,end_archive FROM archive WHERE resource_group = ?",(resource_group,))
+        else:
+            local_rows = self._query("SELECT resource_group,resource_id,file_md5,end_archive FROM archive")
+        local_resources = dict(((g,i),(md5,end_archive)) for g,i,md5,end_archive in local_rows)
+
+        changed_rows = []
+        remote_resources = set()
+        for metadata in blob_resource.metadata_client.resource_metadatas(resource_group=resource_group,throw_exception=False):
+            row = self._get_row(metadata)
+            key = (row[0],row[1])
+            remote_resources.add(key)
+            if local_resources.get(key) != (row[6],row[11]):
+                changed_rows.append(row)
+        removed_resources = [key for key in local_resources if key not in remote_resources]
+
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(upsert_sql,changed_rows)
+                self._conn.executemany("DELETE FROM archive WHERE resource_group = ? AND resource_id = ?",removed_resources)
+                self._conn.executemany("DELETE FROM archive_metrics WHERE resource_group = ? AND resource_id = ?",removed_resources)
+                self._conn.execute("INSERT OR REPLACE INTO catalog_state (name,value) VALUES ('last_sync',?)",(timezone.now().isoformat(),))
+
+        logger.info("End to synchronize the archive catalog({}), resource_group={}, added or updated resources={}, removed resources={}".format(
+            self.filename,resource_group,len(changed_rows),len(removed_resources)
+        ))
+        return (len(changed_rows),len(removed_resources))
+
+    @property
+    def last_sync(self):
+        rows = self._query("SELECT value FROM catalog_state WHERE name = 'last_sync'")
+        return timezone.parse(rows[0][0]) if rows else None
+
+    def is_exist(self,resource_group,resource_id):
+        return len(self._query("SELECT 1 FROM archive WHERE resource_group = ? AND resource_id = ?",(resource_group,resource_id))) > 0
+
+    def resource_metadatas(self,resource_group=None):
+        """
+        Return the list of archived loggedpoint files' metadata ordered by archive date
+        resource_group: only return the files in the group; if None, return all files
+        """
+        sql = "SELECT resource_group,resource_id,start_archive_date,end_archive_date,features,file_md5,file_size,layer,extent,start_archive,end_archive FROM archive WHERE {}".format(archive_file_condition)
+        params = ()
+        if resource_group:
+            sql = "{} AND resource_group = ?".format(sql)
+            params = (resource_group,)
+        result = []
+        for row in self._query("{} ORDER BY archive_date,resource_id".format(sql),params):
+            metadata = dict(zip(("resource_group","resource_id","start_archive_date","end_archive_date","features","file_md5","file_size","layer","extent","start_archive","end_archive"),row))
+            for key in ("start_archive_date","end_archive_date","start_archive","end_archive"):
+                metadata[key] = timezone.parse(metadata[key])
+            metadata["extent"] = json.loads(metadata["extent"]) if metadata["extent"] else None
+            result.append(metadata)
+        return result
+
+    def archived_dates(self,start_date=None,end_date=None):
+        """
+        Return the set of archived dates between start_date(inclusive) and end_date(exclusive)
+        """
+        sql = "SELECT DISTINCT archive_date FROM archive WHERE {} AND archive_date IS NOT NULL".format(archive_file_condition)
+        params = []
+        if start_date:
+            sql = "{} AND archive_date >= ?".format(sql)
+            params.append(start_date.isoformat())
+        if end_date:
+            sql = "{} AND archive_date < ?".format(sql)
+            params.append(end_date.isoformat())
+        return set(date.fromisoformat(row[0]) for row in self._query(sql,params))
+
+    def gaps(self,start_date=None,end_date=None):
+        """
+        Return the list of (start date,end date) of the date ranges which are not archived between start_date(inclusive) and end_date(exclusive)
+        start_date: if None, use the earliest archived date
+        end_date: if None, use the day after the latest archived date
+        """
+        if not start_date or not end_date:
+            earliest_date,latest_date = self._query("SELECT min(archive_date),max(archive_date) FROM archive WHERE {}".format(archive_file_condition))[0]
+            if not earliest_date:
+                return [(start_date,end_date)] if start_date and end_date and start_date < end_date else []
+            start_date = start_date or date.fromisoformat(earliest_date)
+            end_date = end_date or (date.fromisoformat(latest_date) + timedelta(days=1))
+
+        archived_dates = self.archived_dates(start_date,end_date)
+        gaps = []
+        gap_start = None
+        d = start_date
+        while d < end_date:
+            if d in archived_dates:
+                if gap_start:
+                    gaps.append((gap_start,d))
+                    gap_start = None
+            elif not gap_start:
+                gap_start = d
+            d += timedelta(days=1)
+        if gap_start:
+            gaps.append((gap_start,end_date))
+        return gaps
+
+    def features(self,resource_group=None):
+        """
+        Return the list of (resource_group,archived files,archived features,archived bytes) ordered by resource group
+        resource_group: only return the totals of the group; if None, return the totals of all groups
+        """
+        sql = "SELECT resource_group,count(*),coalesce(sum(features),0),coalesce(sum(file_size),0) FROM archive WHERE {}".format(archive_file_condition)
+        params = ()
+        if resource_group:
+            sql = "{} AND resource_group = ?".format(sql)
+            params = (resource_group,)
+        return self._query("{} GROUP BY resource_group ORDER BY resource_group".format(sql),params)
+
+_catalog = None
+_catalog_lock = threading.Lock()
+def get_catalog():
+    """
+    Return the archive catalog if the catalog is enabled; otherwise return None
+    """
+    global _catalog
+    if not settings.LOGGEDPOINT_CATALOG_ENABLED:
+        return None
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = ArchiveCatalog()
+    return _catalog
@@ -12,10 +12,13 @@ parser = argparse.ArgumentParser(prog="archive",description='Archive the logged
 parser.add_argument('year', type=int, action='store',choices=[y for y in range(year - 30,year + 1,1)],help='The year of the logged points')
 parser.add_argument('month', type=int, action='store',choices=[m for m in range(1,13)],help='The month of the logged points')
 parser.add_argument('day', type=int, action='store',choices=[d for d in range(1,32)],nargs="?",help='The day of the logged points')
-parser.add_argument('--check',  action='store_true',help='Download the archived files to check whether it was archived successfully or not')
+parser.add_argument('--check',  action='store_true',help='Check whether the archived files were archived successfully or not')
+parser.add_argument('--check-mode',dest="check_mode", action='store',choices=["quick","full"],help='quick: check the archived files against the blob properties and some sampled ranged reads; full: download the archived files to check. default is the configured check mode')
 parser.add_argument('--delete', action='store_true',help='Delete the archived logged points from table after archiving')
 parser.add_argument('--overwrite', action='store_true',help='Overwrite the existing archive file')
 parser.add_argument('--backup-to-archive-table',dest="backup_to_archive_table", action='store_true',help='Backup the archived data into a yearly based table')
+parser.add_argument('--single-scan',dest="single_scan", action='store_true',default=None,help='Read the month\'s logged points in one query and split them into daily files, only useful when archiving by month')
+parser.add_argument('--workers',dest="workers", type=int,action='store',help='The number of days exported concurrently, the exported days are still published and deleted in date order')
 
 
 def run():
@@ -28,7 +31,7 @@ def run():
         archive.archive_by_date(
             d,
             delete_after_archive=args.delete,
-            check=args.check,
+            check=(args.check_mode or True) if args.check else False,
             overwrite=args.overwrite,
             backup_to_archive_table=args.backup_to_archive_table)
     else:
@@ -37,9 +40,11 @@ def run():
             d.year,
             d.month,
             delete_after_archive=args.delete,
-            check=args.check,
+            check=(args.check_mode or True) if args.check else False,
             overwrite=args.overwrite,
-            backup_to_archive_table=args.backup_to_archive_table)
+            backup_to_archive_table=args.backup_to_archive_table,
+            workers=args.workers,
+            single_scan=args.single_scan)
 
 
 
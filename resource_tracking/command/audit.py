@@ -0,0 +1,32 @@
+import argparse
+from datetime import date,datetime
+import sys
+
+from resource_tracking import archive,verify
+
+now = datetime.now()
+today = now.date()
+year = now.year
+
+parser = argparse.ArgumentParser(prog="audit",description='Download the logged points archive files one by one to check whether they are intact')
+parser.add_argument('year', type=int, action='store',choices=[y for y in range(year - 30,year + 1,1)],nargs="?",help='The year of the logged points')
+parser.add_argument('month', type=int, action='store',choices=[m for m in range(1,13)],nargs="?",help='The month of the logged points')
+parser.add_argument('--max-files',dest='max_files', type=int,action='store',help='The maximum number of files to audit')
+parser.add_argument('--interval',dest='interval', type=float,action='store',help='The seconds to sleep after auditing a file')
+parser.add_argument('--max-bytes-per-second',dest='max_bytes_per_second', type=int,action='store',help='Limit the download speed')
+
+
+def run():
+    args = parser.parse_args(sys.argv[2:])
+    if args.year and not args.month:
+        raise Exception("Please specify the month to audit.")
+    resource_group = archive.get_archive_group(date(args.year,args.month,1)) if args.year else None
+    audited_files,failed_files = verify.audit(
+        archive.get_blob_resource(),
+        resource_group=resource_group,
+        max_files=args.max_files,
+        interval=args.interval,
+        max_bytes_per_second=args.max_bytes_per_second,
+        stream=archive.is_azure_storage())
+    for resource_group,resource_id,error in failed_files:
+        print("{}/{} is corrupted".format(resource_group,resource_id))
@@ -0,0 +1,49 @@
+import argparse
+from datetime import date,datetime
+import sys
+
+from resource_tracking import backup,settings
+
+now = datetime.now()
+year = now.year
+
+parser = argparse.ArgumentParser(prog="backup_partition",description='Maintain the monthly partitions of the backup table of the archived logged points')
+subparsers = parser.add_subparsers(dest='action',help='The partition action')
+
+list_parser = subparsers.add_parser('list',help='List the partitions of the backup table')
+
+index_parser = subparsers.add_parser('index',help='Build the indexes of the partitions of the completed months concurrently')
+
+expire_parser = subparsers.add_parser('expire',help='Detach and drop the partitions which are older than the retention months')
+expire_parser.add_argument('--retention-months',dest='retention_months', type=int, action='store',help='The months to keep; if missing, use the configured retention months')
+expire_parser.add_argument('--keep', action='store_true',help='Only detach the expired partitions, and keep them as standalone tables')
+
+detach_parser = subparsers.add_parser('detach',help='Detach the partition of a month from the backup table')
+detach_parser.add_argument('year', type=int, action='store',choices=[y for y in range(year - 30,year + 1,1)],help='The year of the logged points')
+detach_parser.add_argument('month', type=int, action='store',choices=[m for m in range(1,13)],help='The month of the logged points')
+detach_parser.add_argument('--drop', action='store_true',help='Drop the detached partition')
+
+def run():
+    args = parser.parse_args(sys.argv[2:])
+    if not args.action:
+        parser.print_help()
+        return
+    if settings.LOGGEDPOINT_BACKUP_TABLE_LAYOUT != backup.LAYOUT_PARTITIONED:
+        raise Exception("The backup table layout({}) is not partitioned".format(settings.LOGGEDPOINT_BACKUP_TABLE_LAYOUT))
+    db = settings.DATABASE
+    backup_table = settings.LOGGEDPOINT_BACKUP_TABLE
+    if args.action == "list":
+        for month,partition in backup.get_partitions(db,backup_table):
+            print("{}\t{}\trows={}".format(month.strftime("%Y-%m"),partition,db.count(partition)))
+    elif args.action == "index":
+        indexed = backup.index_partitions(db,backup_table)
+        print("Built the indexes of {} partitions{}".format(len(indexed),": {}".format(", ".join(indexed)) if indexed else ""))
+    elif args.action == "expire":
+        expired = backup.expire_partitions(db,backup_table,retention_months=args.retention_months,drop=not args.keep)
+        print("{} {} partitions{}".format("Detached" if args.keep else "Dropped",len(expired),": {}".format(", ".join(expired)) if expired else ""))
+    elif args.action == "detach":
+        partition = backup.detach_partition(db,backup_table,date(args.year,args.month,1),drop=args.drop)
+        if partition:
+            print("{} the partition({})".format("Dropped" if args.drop else "Detached",partition))
+        else:
+            print("The partition of {}-{:02d} doesn't exist".format(args.year,args.month))
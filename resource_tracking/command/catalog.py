@@ -0,0 +1,61 @@
+import argparse
+from datetime import date,datetime,timedelta
+import sys
+
+from resource_tracking import archive,catalog
+
+now = datetime.now()
+today = now.date()
+year = now.year
+
+parser = argparse.ArgumentParser(prog="catalog",description='Maintain and query the local catalog of the logged points archive files')
+parser.add_argument('--file',dest='file', action='store',help='The sqlite file of the catalog; if missing, use the configured catalog file')
+subparsers = parser.add_subparsers(dest='action',help='The catalog action')
+
+sync_parser = subparsers.add_parser('sync',help='Synchronize the catalog with the resource metadata in blob storage')
+sync_parser.add_argument('year', type=int, action='store',choices=[y for y in range(year - 30,year + 1,1)],nargs="?",help='The year of the logged points')
+sync_parser.add_argument('month', type=int, action='store',choices=[m for m in range(1,13)],nargs="?",help='The month of the logged points')
+
+gaps_parser = subparsers.add_parser('gaps',help='List the days which were not archived')
+gaps_parser.add_argument('--start-date',dest='start_date', type=date.fromisoformat, action='store',help='The start date(inclusive); if missing, use the earliest archived date')
+gaps_parser.add_argument('--end-date',dest='end_date', type=date.fromisoformat, action='store',help='The end date(exclusive); if missing, use the day after the latest archived date')
+
+list_parser = subparsers.add_parser('list',help='List the archived files of a month')
+list_parser.add_argument('year', type=int, action='store',choices=[y for y in range(year - 30,year + 1,1)],help='The year of the logged points')
+list_parser.add_argument('month', type=int, action='store',choices=[m for m in range(1,13)],help='The month of the logged points')
+
+features_parser = subparsers.add_parser('features',help='Show the archived files, features and bytes of each month')
+features_parser.add_argument('year', type=int, action='store',choices=[y for y in range(year - 30,year + 1,1)],nargs="?",help='The year of the logged points')
+features_parser.add_argument('month', type=int, action='store',choices=[m for m in range(1,13)],nargs="?",help='The month of the logged points')
+
+
+def _get_resource_group(args):
+    if args.year and not args.month:
+        raise Exception("Please specify the month.")
+    return archive.get_archive_group(date(args.year,args.month,1)) if args.year else None
+
+def run():
+    args = parser.parse_args(sys.argv[2:])
+    if not args.action:
+        parser.print_help()
+        return
+    archive_catalog = catalog.ArchiveCatalog(args.file)
+    try:
+        if args.action == "sync":
+            updated,removed = archive_catalog.sync(archive.get_blob_resource(),resource_group=_get_resource_group(args))
+            print("Added or updated {} resources, removed {} resources".format(updated,removed))
+        elif args.action == "gaps":
+            for start_date,end_date in archive_catalog.gaps(start_date=args.start_date,end_date=args.end_date):
+                if end_date - start_date == timedelta(days=1):
+                    print("{} is not archived".format(start_date))
+                else:
+                    print("{} - {} are not archived".format(start_date,end_date - timedelta(days=1)))
+        elif args.action == "list":
+            for m in archive_catalog.resource_metadatas(_get_resource_group(args)):
+                archive_metrics = archive_catalog.get_metrics(m["resource_group"],m["resource_id"])
+                print("{}\tfeatures={}\tsize={}\tmd5={}\tseconds={}".format(m["resource_id"],m["features"],m["file_size"],m["file_md5"],archive_metrics["seconds"] if archive_metrics else None))
+        elif args.action == "features":
+            for resource_group,files,features,size in archive_catalog.features(_get_resource_group(args)):
+                print("{}\tfiles={}\tfeatures={}\tsize={}".format(resource_group,files,features,size))
+    finally:
+        archive_catalog.close()
@@ -9,11 +9,16 @@ from resource_tracking import archive
 logger = logging.getLogger(__name__)
 
 parser = argparse.ArgumentParser(prog="continuous_archive",description='Continuous archiving the logged points and push it to blob storage')
-parser.add_argument('--check',  action='store_true',help='Download the archived files to check whether it was archived successfully or not')
+parser.add_argument('--check',  action='store_true',help='Check whether the archived files were archived successfully or not')
+parser.add_argument('--check-mode',dest="check_mode", action='store',choices=["quick","full"],help='quick: check the archived files against the blob properties and some sampled ranged reads; full: download the archived files to check. default is the configured check mode')
 parser.add_argument('--delete', action='store_true',help='Delete the archived logged points from table after archiving')
 parser.add_argument('--max-archive-days',dest="max_archive_days", type=int,action='store',help='Maximum days to archive')
+parser.add_argument('--max-archive-rows',dest="max_archive_rows", type=int,action='store',help='Maximum logged points to archive')
+parser.add_argument('--max-archive-bytes',dest="max_archive_bytes", type=int,action='store',help='Maximum estimated bytes to archive')
+parser.add_argument('--planner',dest="planner", action='store',choices=["exact","cheap"],help='exact: count the logged points of each day in one query and skip the empty days; cheap: estimate the logged points of each day from the planner statistics. default is the configured planner')
 parser.add_argument('--overwrite', action='store_true',help='Overwrite the existing archive file')
-parser.add_argument('--backup-to-archive-table',dest="backup_to_archive_table", action='store_true',help='Backup the archived data into a yearly based table, only useful if --delete is enabled')
+parser.add_argument('--backup-to-archive-table',dest="backup_to_archive_table", action='store_true',help='Backup the archived data into the backup table(or move the detached partitions into the backup schema if tracking_loggedpoint is partitioned), only useful if --delete is enabled')
+parser.add_argument('--workers',dest="workers", type=int,action='store',help='The number of days exported concurrently, the exported days are still published and deleted in date order')
 
 def run():
     args = parser.parse_args(sys.argv[2:])
@@ -21,10 +26,14 @@ def run():
     try:
         archive.continuous_archive(
                 delete_after_archive=args.delete,
-                check=args.check,
+                check=(args.check_mode or True) if args.check else False,
                 max_archive_days=args.max_archive_days if args.max_archive_days and args.max_archive_days > 0 else None,
                 overwrite=args.overwrite,
-                backup_to_archive_table=args.backup_to_archive_table)
+                backup_to_archive_table=args.backup_to_archive_table,
+                workers=args.workers,
+                max_archive_rows=args.max_archive_rows,
+                max_archive_bytes=args.max_archive_bytes,
+                planner_mode=args.planner)
     except:
         logger.error(traceback.format_exc())
 
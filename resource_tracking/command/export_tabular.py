@@ -0,0 +1,53 @@
+import argparse
+from datetime import date,datetime
+import sys
+import os
+
+from utils import compression
+from db.database import COPY_CSV,COPY_TEXT,COPY_NDJSON
+
+from resource_tracking import archive
+
+now = datetime.now()
+today = now.date()
+year = now.year
+
+#the file extension of the tabular formats
+file_exts = {
+    COPY_CSV:".csv",
+    COPY_TEXT:".txt",
+    COPY_NDJSON:".ndjson"
+}
+
+parser = argparse.ArgumentParser(prog="export_tabular",description='Export the logged points into a csv, text or newline-delimited json file without gdal')
+parser.add_argument('year', type=int, action='store',choices=[y for y in range(year - 30,year + 1,1)],help='The year of the logged points')
+parser.add_argument('month', type=int, action='store',choices=[m for m in range(1,13)],help='The month of the logged points')
+parser.add_argument('day', type=int, action='store',choices=[d for d in range(1,32)],nargs="?",help='The day of the logged points')
+parser.add_argument('--format',dest='file_format', action='store',choices=list(file_exts.keys()),default=COPY_CSV,help='The format of the exported file, default is csv')
+parser.add_argument('--compression',dest='codec', action='store',choices=[compression.GZIP,compression.ZSTD],help='Compress the exported file on the fly')
+parser.add_argument('--file',dest='file', action='store',help="The exported file; '-' means the standard output. default is a file named by the date in the current folder")
+parser.add_argument('--from-backup-table',dest='from_backup_table', action='store_true',help='Export the archived logged points from the backup table')
+parser.add_argument('--overwrite', action='store_true',help='Overwrite the existing file if file already exists')
+
+
+def run():
+    args = parser.parse_args(sys.argv[2:])
+    start_date = date(args.year,args.month, args.day if args.day else 1)
+    if args.day:
+        end_date = date.fromordinal(start_date.toordinal() + 1)
+    else:
+        end_date = date(args.year + 1,1,1) if args.month == 12 else date(args.year,args.month + 1,1)
+
+    if args.file == "-":
+        archive.export_tabular(start_date,end_date,sys.stdout.buffer,file_format=args.file_format,codec=args.codec,from_backup_table=args.from_backup_table)
+        return
+
+    filename = args.file or "loggedpoint{}{}{}".format(
+        start_date.strftime("%Y-%m-%d") if args.day else start_date.strftime("%Y-%m"),
+        file_exts[args.file_format],
+        compression.file_exts[args.codec] if args.codec else ""
+    )
+    if os.path.exists(filename) and not args.overwrite:
+        raise Exception("The file({}) already exists".format(filename))
+    result = archive.export_tabular(start_date,end_date,filename,file_format=args.file_format,codec=args.codec,from_backup_table=args.from_backup_table)
+    print("Exported {} logged points into {}, size={}, md5={}".format(result["rows"],filename,result["file_size"],result["file_md5"]))
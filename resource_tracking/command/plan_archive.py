@@ -0,0 +1,37 @@
+import argparse
+from datetime import timedelta
+import sys
+
+from utils import timezone
+
+from resource_tracking import archive,planner,settings
+
+parser = argparse.ArgumentParser(prog="plan_archive",description='Show the backlog of the logged points to archive and the estimated time to archive them')
+parser.add_argument('--planner',dest="planner", action='store',choices=["exact","cheap"],help='exact: count the logged points of each day in one query; cheap: estimate the logged points of each day from the planner statistics. default is the configured planner')
+parser.add_argument('--max-archive-days',dest="max_archive_days", type=int,action='store',help='Maximum days to archive')
+parser.add_argument('--max-archive-rows',dest="max_archive_rows", type=int,action='store',help='Maximum logged points to archive')
+parser.add_argument('--max-archive-bytes',dest="max_archive_bytes", type=int,action='store',help='Maximum estimated bytes to archive')
+parser.add_argument('--summary', action='store_true',help='Only show the summary of the backlog')
+
+def _format_eta(seconds):
+    return str(timedelta(seconds=int(seconds))) if seconds is not None else "unknown"
+
+def run():
+    args = parser.parse_args(sys.argv[2:])
+    last_archive_date = timezone.now().date() - timedelta(days=settings.LOGGEDPOINT_ACTIVE_DAYS)
+    archive_plan = planner.get_plan(last_archive_date,mode=args.planner,blob_resource=archive.get_blob_resource())
+    archive_days = archive_plan.budget(max_days=args.max_archive_days,max_rows=args.max_archive_rows,max_bytes=args.max_archive_bytes)
+    if not args.summary:
+        for d,rows in archive_days:
+            print("{}\trows={}\tbytes={}\teta={}".format(d,rows,int(rows * archive_plan.bytes_per_row),_format_eta(archive_plan.eta(rows))))
+    archive_rows = sum(rows for d,rows in archive_days)
+    print("Planner={}, planned days={}/{}, planned rows={}/{}, estimated bytes={}, throughput={}, eta={}".format(
+        archive_plan.mode,
+        len(archive_days),
+        len(archive_plan.days),
+        archive_rows,
+        archive_plan.rows,
+        int(archive_rows * archive_plan.bytes_per_row),
+        "{:.0f} rows/s".format(archive_plan.rows_per_second) if archive_plan.rows_per_second else "unknown",
+        _format_eta(archive_plan.eta(archive_rows))
+    ))
@@ -0,0 +1,30 @@
+import argparse
+from datetime import datetime
+import sys
+
+from resource_tracking import archive
+
+parser = argparse.ArgumentParser(prog="restore_partial",description='Restore the logged points in a time window, optionally only for some devices and within a bbox, from blob storage')
+parser.add_argument('start_time', type=datetime.fromisoformat, action='store',help='The start time(inclusive) of the logged points, for example "2021-03-01 08:00"')
+parser.add_argument('end_time', type=datetime.fromisoformat, action='store',help='The end time(exclusive) of the logged points, for example "2021-03-01 10:00"')
+parser.add_argument('--deviceid',dest='deviceids', action='append',help='Only restore the logged points of the device, can be specified multiple times')
+parser.add_argument('--bbox',dest='bbox', type=float,nargs=4,metavar=('MINX','MINY','MAXX','MAXY'),help='Only restore the logged points within the bbox')
+parser.add_argument('--table',dest='table', action='store',help='The table to restore the data into if not restoring to table \'tracking_loggedpoint\'')
+parser.add_argument('--preserve-id',dest='preserve_id', action='store_true',help='Preserve loggedpoint\' id during restoring the data into table \'tracking_loggedpoint\'')
+parser.add_argument('--restore-to-origin-table',dest='restore_to_origin_table', action='store_true',help='Restore the archived data to table \'tracking_loggedpoint\'')
+
+
+def run():
+    args = parser.parse_args(sys.argv[2:])
+    if args.start_time.date() >= datetime.now().date():
+        raise Exception("Can only restore logged points happened before today.")
+    table,rows = archive.restore(
+        args.start_time,
+        args.end_time,
+        deviceids=args.deviceids,
+        bbox=args.bbox,
+        restore_to_origin_table=args.restore_to_origin_table,
+        preserve_id=args.preserve_id,
+        table=args.table
+    )
+    print("Restored {} logged points into table({})".format(rows,table))
@@ -0,0 +1,103 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor,as_completed
+
+import utils
+
+from . import settings
+from . import verify
+
+logger = logging.getLogger(__name__)
+
+class GroupDownloader(object):
+    """
+    Download the files of a resource group with bounded concurrency.
+    The compressed files are decompressed during downloading.
+    The local file which already matches the 'file_md5'(or 'uncompressed_md5' for compressed file) in the resource metadata is not downloaded again.
+    resource_group: the resource group to download
+    folder: the folder to place the downloaded files
+    workers: the number of concurrent downloads; if None, use settings.LOGGEDPOINT_DOWNLOAD_WORKERS
+    overwrite: if false, raise exception if a different local file already exists
+    f_filter: a function which takes the resource metadata and returns True if the file should be downloaded
+    stream: decompress the compressed files from the downloaded stream(see 'verify.download_decompressed')
+    """
+    def __init__(self,blob_resource,resource_group,folder,workers=None,overwrite=False,f_filter=None,stream=False):
+        self.blob_resource = blob_resource
+        self.resource_group = resource_group
+        self.folder = folder
+        self.workers = workers or settings.LOGGEDPOINT_DOWNLOAD_WORKERS
+        self.overwrite = overwrite
+        self.f_filter = f_filter
+        self.stream = stream
+        self._lock = threading.Lock()
+        self.downloaded_files = 0
+        self.downloaded_bytes = 0
+        self.skipped_files = 0
+
+    def _download(self,metadata):
+        filename = os.path.join(self.folder,os.path.basename(metadata.get("resource_file") or metadata["resource_id"]))
+        file_md5 = metadata.get("uncompressed_md5") if metadata.get("compression") else metadata.get("file_md5")
+        if os.path.exists(filename):
+            if file_md5 and utils.file_md5(filename) == file_md5:
+                logger.debug("The file({}) was already downloaded".format(filename))
+                with self._lock:
+                    self.skipped_files += 1
+                return (metadata,filename)
+            elif not self.overwrite:
+                raise Exception("The file({}) already exists".format(filename))
+
+        if metadata.get("compression"):
+            compressed_md5,compressed_size,uncompressed_md5,uncompressed_size = verify.download_decompressed(self.blob_resource,metadata,filename,stream=self.stream)
+            if compressed_md5 != metadata["file_md5"] or (file_md5 and uncompressed_md5 != file_md5):
+                raise Exception("The downloaded file({}/{}) is corrupted".format(self.resource_group,metadata["resource_id"]))
+        else:
+            metadata,filename = self.blob_resource.download_resource(self.resource_group,metadata["resource_id"],filename=filename,overwrite=True)
+            compressed_size = utils.file_size(filename)
+        with self._lock:
+            self.downloaded_files += 1
+            self.downloaded_bytes += compressed_size
+        return (metadata,filename)
+
+    def download(self):
+        """
+        A generator which yields (resource metadata,downloaded file) as soon as each file is downloaded
+        """
+        metadatas = [m for m in self.blob_resource.metadata_client.resource_metadatas(resource_group=self.resource_group,throw_exception=False)]
+        if self.f_filter:
+            metadatas = [m for m in metadatas if self.f_filter(m)]
+
+        logger.info("Begin to download {} files of resource group({}) with {} workers".format(len(metadatas),self.resource_group,self.workers))
+        starttime = time.time()
+        executor = ThreadPoolExecutor(max_workers=self.workers,thread_name_prefix="download_loggedpoint")
+        futures = []
+        try:
+            futures = [executor.submit(self._download,m) for m in metadatas]
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+            elapsed = max(time.time() - starttime,0.001)
+            logger.info("End to download the files of resource group({}), downloaded files={}, downloaded bytes={}, skipped files={}, elapsed={:.1f}s, {:.0f} bytes/s, {:.2f} files/s".format(
+                self.resource_group,
+                self.downloaded_files,
+                self.downloaded_bytes,
+                self.skipped_files,
+                elapsed,
+                self.downloaded_bytes / elapsed,
+                self.downloaded_files / elapsed
+            ))
+
+def download_resource(blob_resource,resource_group,resource_id,folder,overwrite=False,stream=False):
+    """
+    Download a resource into the folder, the compressed file is decompressed during downloading
+    stream: decompress the compressed file from the downloaded stream(see 'verify.download_decompressed')
+    Return (resource metadata,downloaded file)
+    """
+    result = list(GroupDownloader(blob_resource,resource_group,folder,workers=1,overwrite=overwrite,f_filter=lambda m:m["resource_id"] == resource_id,stream=stream).download())
+    if not result:
+        raise Exception("The resource({}/{}) doesn't exist".format(resource_group,resource_id))
+    return result[0]
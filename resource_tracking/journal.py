@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import logging
+import threading
+
+from utils import timezone
+import utils
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+#the archive file of the day was exported into the work folder
+STAGE_EXPORTED = "exported"
+#the archive file was pushed to blob storage
+STAGE_UPLOADED = "uploaded"
+#the pushed archive file was checked
+STAGE_VERIFIED = "verified"
+#the group index file(vrt or manifest) was updated
+STAGE_INDEX_UPDATED = "vrt-updated"
+#the archived loggedpoints were moved into the backup table
+STAGE_BACKED_UP = "backed-up"
+#the archived loggedpoints were deleted from table tracking_loggedpoint
+STAGE_DELETED = "deleted"
+
+stages = (STAGE_EXPORTED,STAGE_UPLOADED,STAGE_VERIFIED,STAGE_INDEX_UPDATED,STAGE_BACKED_UP,STAGE_DELETED)
+
+#the datetime values in the export result, which are saved as iso strings in the journal file
+_export_result_datetimes = ("start_date","end_date")
+_metadata_datetimes = ("start_archive","start_archive_date","end_archive_date")
+
+def _json_default(o):
+    if hasattr(o,"isoformat"):
+        return o.isoformat()
+    raise TypeError("Object of type {} is not JSON serializable".format(o.__class__.__name__))
+
+class ArchiveJournal(object):
+    """
+    A persistent journal of the completed stages of archiving a day.
+    The journal is a json file '<archive_id>.json' in the journal folder, and the day's work folder '<archive_id>' is kept next to it,
+    so a run which died halfway can resume at the first incomplete stage and reuse the exported archive file if its md5 still matches.
+    The journal and the work folder are removed after the day is archived; the stale files of an interrupted run are removed from the work folder when the day is resumed,
+    and the journals and work folders of the failed days which were not resumed in settings.LOGGEDPOINT_JOURNAL_MAX_AGE days are removed by 'cleanup'.
+    archive_id: the archive id of the day
+    folder: the journal folder; if None, use settings.LOGGEDPOINT_JOURNAL_DIR
+    """
+    def __init__(self,archive_id,folder=None):
+        self.archive_id = archive_id
+        self.folder = folder or settings.LOGGEDPOINT_JOURNAL_DIR
+        self.filename = os.path.join(self.folder,"{}.json".format(archive_id))
+        self.work_folder = os.path.join(self.folder,archive_id)
+        if not os.path.exists(self.work_folder):
+            os.makedirs(self.work_folder)
+        self.data = None
+        if os.path.exists(self.filename):
+            try:
+                with open(self.filename) as f:
+                    self.data = json.load(f)
+            except Exception as ex:
+                logger.warning("The archive journal({}) is corrupted, ignore it.{}: {}".format(self.filename,ex.__class__.__name__,str(ex)))
+        if not self.data or self.data.get("archive_id") != archive_id:
+            self.data = {"archive_id":archive_id,"stages":{}}
+        elif self.data["stages"]:
+            logger.info("Resume archiving {} from the journal({}), completed stages={}".format(archive_id,self.filename,[s for s in stages if s in self.data["stages"]]))
+
+    def save(self):
+        """
+        Write the journal file; the journal file is replaced atomically, so a crash never leaves a half written journal
+        """
+        tmp_filename = "{}.tmp".format(self.filename)
+        with open(tmp_filename,"w") as f:
+            json.dump(self.data,f,indent=4,default=_json_default)
+        os.replace(tmp_filename,self.filename)
+
+    def is_done(self,stage):
+        return stage in self.data["stages"]
+
+    def get(self,stage):
+        """
+        Return the data recorded with the completed stage; return None if the stage is not completed
+        """
+        return self.data["stages"].get(stage)
+
+    def done(self,stage,**kwargs):
+        """
+        Record the completed stage with some data
+        """
+        kwargs["time"] = timezone.now()
+        self.data["stages"][stage] = kwargs
+        self.save()
+
+    def set(self,key,value):
+        """
+        Record a progress value which is not a stage
+        """
+        self.data[key] = value
+        self.save()
+
+    def get_value(self,key,default=None):
+        return self.data.get(key,default)
+
+    def exported(self,export_result):
+        """
+        Record the export result returned by 'export_archive'
+        """
+        self.done(STAGE_EXPORTED,export_result=export_result,filename=export_result["filename"],file_md5=export_result["metadata"]["file_md5"])
+
+    def get_export_result(self,resource_id):
+        """
+        Return the recorded export result if it can be reused; otherwise return None.
+        The export result can be reused if the archive file was already uploaded, or the exported file still exists and its md5 still matches.
+        resource_id: the expected resource id of the archive file, the export result of a different archive format is not reused
+        """
+        data = self.get(STAGE_EXPORTED)
+        if not data:
+            #remove the partially exported files of the interrupted run
+            self.clean_work_folder()
+            return None
+        export_result = data["export_result"]
+        if export_result["metadata"]["resource_id"] != resource_id:
+            logger.info("The archive format was changed, discard the journal({})".format(self.filename))
+            self.reset()
+            return None
+        if not self.is_done(STAGE_UPLOADED):
+            if not os.path.exists(data["filename"]) or utils.file_md5(data["filename"]) != data["file_md5"]:
+                logger.info("The exported file({}) is missing or changed, export it again".format(data["filename"]))
+                self.reset()
+                self.clean_work_folder()
+                return None
+
+        for key in _export_result_datetimes:
+            export_result[key] = timezone.parse(export_result[key])
+        for key in _metadata_datetimes:
+            if export_result["metadata"].get(key):
+                export_result["metadata"][key] = timezone.parse(export_result["metadata"][key])
+        export_result["work_folder"] = self.work_folder
+        #only the exported file is reused, remove the other files(for example the downloaded files of an interrupted check)
+        self.clean_work_folder(keep=data["filename"])
+        logger.info("Reuse the exported file({}) recorded in the journal({})".format(data["filename"],self.filename))
+        return export_result
+
+    def reset(self,from_stage=None):
+        """
+        Discard the recorded stages
+        from_stage: discard the stage and all the following stages; if None, discard all stages
+        """
+        if from_stage:
+            for stage in stages[stages.index(from_stage):]:
+                self.data["stages"].pop(stage,None)
+        else:
+            self.data = {"archive_id":self.archive_id,"stages":{}}
+        self.save()
+
+    def clean_work_folder(self,keep=None):
+        """
+        Remove the files and folders in the work folder
+        keep: the file which is kept
+        """
+        keep = os.path.abspath(keep) if keep else None
+        for name in os.listdir(self.work_folder):
+            path = os.path.join(self.work_folder,name)
+            if keep and os.path.abspath(path) == keep:
+                continue
+            logger.debug("Remove the stale file({}) from the work folder of {}".format(path,self.archive_id))
+            if os.path.isdir(path):
+                utils.remove_folder(path)
+            else:
+                utils.remove_file(path)
+
+    def clear(self):
+        """
+        Remove the journal file and the work folder after the day is archived
+        """
+        if os.path.exists(self.filename):
+            utils.remove_file(self.filename)
+        if os.path.exists(self.work_folder):
+            utils.remove_folder(self.work_folder)
+
+def _get_modified(path):
+    """
+    Return the latest modified time of the file, or of the folder and the files in the folder
+    """
+    modified = os.path.getmtime(path)
+    if os.path.isdir(path):
+        for root,dirs,files in os.walk(path):
+            for name in dirs + files:
+                modified = max(modified,os.path.getmtime(os.path.join(root,name)))
+    return modified
+
+def cleanup(folder=None,max_age=None):
+    """
+    Remove the journals and the work folders of the failed days which were not changed in max_age days.
+    The work folders without a journal file(the days which failed before the first stage was completed) are removed too.
+    folder: the journal folder; if None, use settings.LOGGEDPOINT_JOURNAL_DIR
+    max_age: the maximum age in days; if None, use settings.LOGGEDPOINT_JOURNAL_MAX_AGE; 0 means never remove
+    Return the list of the removed archive ids
+    """
+    folder = folder or settings.LOGGEDPOINT_JOURNAL_DIR
+    max_age = settings.LOGGEDPOINT_JOURNAL_MAX_AGE if max_age is None else max_age
+    if not max_age or not os.path.exists(folder):
+        return []
+    expired_time = time.time() - max_age * 86400
+    archive_ids = set()
+    for name in os.listdir(folder):
+        if name.endswith(".json"):
+            archive_ids.add(name[:-5])
+        elif name.endswith(".json.tmp"):
+            archive_ids.add(name[:-9])
+        elif os.path.isdir(os.path.join(folder,name)):
+            archive_ids.add(name)
+
+    removed = []
+    for archive_id in sorted(archive_ids):
+        paths = [p for p in (os.path.join(folder,"{}.json".format(archive_id)),os.path.join(folder,"{}.json.tmp".format(archive_id)),os.path.join(folder,archive_id)) if os.path.exists(p)]
+        if max(_get_modified(p) for p in paths) >= expired_time:
+            continue
+        logger.warning("Remove the archive journal and the work folder of {} which were not changed in {} days".format(archive_id,max_age))
+        for p in paths:
+            if os.path.isdir(p):
+                utils.remove_folder(p)
+            else:
+                utils.remove_file(p)
+        removed.append(archive_id)
+    return removed
+
+_cleaned = False
+_cleanup_lock = threading.Lock()
+def get_journal(archive_id):
+    """
+    Return the journal of the archive day if the journal is enabled; otherwise return None
+    The expired journals are removed when the first journal is opened by a run
+    """
+    global _cleaned
+    if not settings.LOGGEDPOINT_JOURNAL_ENABLED:
+        return None
+    with _cleanup_lock:
+        if not _cleaned:
+            _cleaned = True
+            try:
+                cleanup()
+            except Exception as ex:
+                #the cleanup should never break archiving
+                logger.error("Failed to clean up the archive journals in {}.{}: {}".format(settings.LOGGEDPOINT_JOURNAL_DIR,ex.__class__.__name__,str(ex)))
+    return ArchiveJournal(archive_id)
@@ -0,0 +1,188 @@
+import uuid
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from db import pgcopy
+from utils import gpkg,geoparquet
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+#the postgresql type of the restored column for the geopackage field type
+column_types = {
+    "INTEGER":"int8",
+    "INT":"int8",
+    "MEDIUMINT":"int8",
+    "SMALLINT":"int8",
+    "TINYINT":"int8",
+    "BOOLEAN":"int8",
+    "REAL":"float8",
+    "DOUBLE":"float8",
+    "FLOAT":"float8",
+    "BLOB":"bytea"
+}
+get_column_type = lambda field_type:column_types.get(field_type.split("(")[0].strip(),"text")
+
+#the sql to load all devices
+devices_sql = "SELECT deviceid,id FROM tracking_device"
+#the sql to create the missing devices
+create_devices_sql = "INSERT INTO tracking_device (deviceid) VALUES %s RETURNING deviceid,id"
+#restore the loggedpoint from the staging table to tracking_loggedpoint table with orignal id
+restore_with_id_sql = """INSERT INTO tracking_loggedpoint (id,device_id,point,heading,velocity,altitude,seen,message,source_device_type,raw)
+    SELECT id,device_id,point,heading,velocity,altitude,to_timestamp(seen),message,source_device_type,raw
+    FROM "{0}" WHERE device_id IS NOT NULL"""
+#restore the loggedpoint from the staging table to tracking_loggedpoint table with new id
+restore_sql = """INSERT INTO tracking_loggedpoint (device_id,point,heading,velocity,altitude,seen,message,source_device_type,raw)
+    SELECT device_id,point,heading,velocity,altitude,to_timestamp(seen),message,source_device_type,raw
+    FROM "{0}" WHERE device_id IS NOT NULL"""
+
+class DeviceMap(object):
+    """
+    A thread safe in-memory map from deviceid to the id of table tracking_device
+    """
+    def __init__(self,db):
+        self._lock = threading.Lock()
+        self._devices = dict(db.query(devices_sql))
+
+    def get(self,deviceid):
+        return self._devices.get(deviceid)
+
+    def add_missing_devices(self,deviceids,db):
+        """
+        Create the missing devices in table tracking_device
+        """
+        with self._lock:
+            missing_deviceids = [d for d in deviceids if d is not None and d not in self._devices]
+            if not missing_deviceids:
+                return 0
+            rows = db.execute_values(create_devices_sql,[(str(d),) for d in missing_deviceids],fetch=True)
+            self._devices.update(rows)
+            logger.info("Created {} missing devices".format(len(rows)))
+            return len(rows)
+
+def _open_reader(filename):
+    """
+    Return the feature reader of the archive file, geopackage or geoparquet
+    """
+    if filename.lower().endswith(".parquet"):
+        return geoparquet.GeoParquetReader(filename)
+    else:
+        return gpkg.GeoPackageReader(filename)
+
+def _get_columns(reader):
+    """
+    Return the list of (column,postgresql type) of the geopackage layer
+    """
+    return [(reader.geometry_column,"geometry")] + [(name,get_column_type(field_type)) for name,field_type in reader.fields]
+
+def _ewkb_rows(reader,f_row=None,where=None,params=(),bbox=None,filters=None):
+    """
+    Return a generator to read the features from the geopackage, and convert the geometry to ewkb
+    f_row: a function to populate more column values from the row
+    where,params,bbox,filters: the filter passed to 'GeoPackageReader.features'
+    """
+    srs_id = reader.srs_id if reader.srs_id and reader.srs_id > 0 else None
+    for row in reader.features(where=where,params=params,bbox=bbox,filters=filters):
+        if row[0] is not None:
+            row = (pgcopy.to_ewkb(row[0],srs_id),) + row[1:]
+        if f_row:
+            row = row + f_row(row)
+        yield row
+
+def _create_table(db,table,columns,unlogged=False):
+    db.executeDDL("CREATE {}TABLE \"{}\" ({})".format(
+        "UNLOGGED " if unlogged else "",
+        table,
+        ",".join("\"{}\" {}".format(name,column_type) for name,column_type in columns)
+    ))
+
+def _load_file(filename,table=None,device_map=None,preserve_id=True,where=None,params=(),bbox=None,filters=None):
+    """
+    Load the features of the geopackage into the table; or into table tracking_loggedpoint if device_map is not None.
+    The features are streamed into the database with binary copy.
+    where,params,bbox,filters: only load the features matching the filter, see 'GeoPackageReader.features'
+    Return the number of loaded features
+    """
+    db = settings.DATABASE
+    with _open_reader(filename) as reader:
+        columns = _get_columns(reader)
+        if device_map is None:
+            stream = pgcopy.BinaryCopyStream(_ewkb_rows(reader,where=where,params=params,bbox=bbox,filters=filters),[t for c,t in columns])
+            db.copy_from(table,stream,columns=[c for c,t in columns])
+            logger.debug("Loaded {} features from {} to table({})".format(stream.rows,filename,table))
+            return stream.rows
+
+        device_map.add_missing_devices(reader.distinct("deviceid",where=where,params=params,bbox=bbox,filters=filters),db)
+        deviceid_index = next(i for i,c in enumerate(columns) if c[0] == "deviceid")
+        staging_table = "tmp_restore_{}".format(uuid.uuid4().hex)
+        columns.append(("device_id","int4"))
+        stream = pgcopy.BinaryCopyStream(
+            _ewkb_rows(reader,lambda row:(device_map.get(row[deviceid_index]),),where=where,params=params,bbox=bbox,filters=filters),
+            [t for c,t in columns]
+        )
+        with db:
+            _create_table(db,staging_table,columns,unlogged=True)
+            try:
+                db.copy_from(staging_table,stream,columns=[c for c,t in columns])
+                rows = db.update((restore_with_id_sql if preserve_id else restore_sql).format(staging_table),commit=False)
+                db.commit()
+            except:
+                db.rollback()
+                raise
+            finally:
+                try:
+                    db.executeDDL("DROP TABLE IF EXISTS \"{}\"".format(staging_table))
+                except:
+                    logger.error("Failed to drop the staging table({0}). {1}".format(staging_table,traceback.format_exc()))
+
+        if rows != stream.rows:
+            logger.warning("Only {1}/{2} features in {0} have a device and were restored to table(tracking_loggedpoint)".format(filename,rows,stream.rows))
+        logger.debug("Restored {} features from {} to table(tracking_loggedpoint)".format(rows,filename))
+        return rows
+
+def load_files(files,table=None,restore_to_origin_table=False,preserve_id=True,workers=None,where=None,params=(),bbox=None,filters=None):
+    """
+    Restore the loggedpoints from daily geopackages or geoparquet files with binary copy, several files are loaded in parallel connections.
+    files: an iterable of geopackage or geoparquet files, can be a generator which yields each file as soon as it is available
+    table: the table to restore the data into, only used if restore_to_origin_table is False; the table is recreated
+    restore_to_origin_table: if true, restore the data to table tracking_loggedpoint through unlogged staging tables
+    preserve_id: meaningful if restore_to_origin_table is True.
+    workers: the number of geopackages loaded in parallel; if None, use settings.LOGGEDPOINT_RESTORE_WORKERS
+    where,params,bbox,filters: only load the features matching the filter, see 'GeoPackageReader.features'; the sql condition 'where' is not supported by geoparquet, use filters instead
+    Return (restored table,restored rows)
+    """
+    db = settings.DATABASE
+    workers = workers or settings.LOGGEDPOINT_RESTORE_WORKERS
+    files = iter(files)
+    try:
+        first_file = next(files)
+    except StopIteration:
+        return (None,0)
+
+    if restore_to_origin_table:
+        device_map = DeviceMap(db)
+        table = "tracking_loggedpoint"
+    else:
+        device_map = None
+        with _open_reader(first_file) as reader:
+            columns = _get_columns(reader)
+        db.executeDDL("DROP TABLE IF EXISTS \"{}\"".format(table))
+        _create_table(db,table,columns)
+
+    logger.info("Begin to restore the logged points to table({}) with {} workers".format(table,workers))
+    restored_rows = 0
+    executor = ThreadPoolExecutor(max_workers=workers,thread_name_prefix="restore_loggedpoint")
+    try:
+        futures = [executor.submit(_load_file,first_file,table=table,device_map=device_map,preserve_id=preserve_id,where=where,params=params,bbox=bbox,filters=filters)]
+        for f in files:
+            futures.append(executor.submit(_load_file,f,table=table,device_map=device_map,preserve_id=preserve_id,where=where,params=params,bbox=bbox,filters=filters))
+        for future in futures:
+            restored_rows += future.result()
+    finally:
+        executor.shutdown(wait=True)
+
+    logger.info("End to restore {} logged points to table({})".format(restored_rows,table))
+    return (table,restored_rows)
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import logging
+from contextlib import contextmanager
+
+from utils import timezone
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+#the metadata key of the stage metrics in the archive metadata
+METADATA_KEY = "archive_metrics"
+
+class ArchiveMetrics(object):
+    """
+    Record the duration, rows and bytes of each stage of archiving a day.
+    The stage metrics are kept in the archive metadata, so the metrics of the stages before uploading(and the upload stage if recorded by 'f_post_push')
+    are pushed with the archive file and survive a resumed run.
+    The metrics of all stages and the totals of the day are saved into the archive catalog by 'publish_archive' after the last stage if the catalog is enabled.
+    Each recorded stage is logged as a json record, and the metrics of the day are written into a prometheus textfile if settings.LOGGEDPOINT_METRICS_TEXTFILE is configured.
+    metadata: the archive metadata
+    """
+    def __init__(self,metadata):
+        self.archive_group = metadata.get("resource_group")
+        self.resource_id = metadata.get("resource_id")
+        if not isinstance(metadata.get(METADATA_KEY),dict):
+            metadata[METADATA_KEY] = {}
+        self.stages = metadata[METADATA_KEY]
+
+    def add(self,stage,seconds,rows=None,bytes=None):
+        """
+        Record a stage
+        """
+        record = {"seconds":round(seconds,3)}
+        if rows is not None:
+            record["rows"] = rows
+            record["rows_per_second"] = round(rows / seconds,1) if seconds > 0 else None
+        if bytes is not None:
+            record["bytes"] = bytes
+            record["bytes_per_second"] = round(bytes / seconds,1) if seconds > 0 else None
+        self.stages[stage] = record
+        log_record = {"event":"loggedpoint_archive_stage","resource_group":self.archive_group,"resource_id":self.resource_id,"stage":stage}
+        log_record.update(record)
+        logger.info(json.dumps(log_record))
+
+    @contextmanager
+    def measure(self,stage,rows=None,bytes=None):
+        """
+        Measure the duration of the stage in a 'with' block.
+        The yielded dict can be used to set the 'rows' and 'bytes' which are only known at the end of the stage
+        The stage is not recorded if the block raises exception
+        """
+        data = {"rows":rows,"bytes":bytes}
+        starttime = time.time()
+        yield data
+        self.add(stage,time.time() - starttime,rows=data["rows"],bytes=data["bytes"])
+
+    @property
+    def seconds(self):
+        """
+        The total seconds of the recorded stages
+        """
+        return round(sum(record["seconds"] for record in self.stages.values()),3)
+
+    def finish(self):
+        """
+        Log the totals of the archived day and write the prometheus textfile if configured
+        Return the totals of the archived day
+        """
+        log_record = {
+            "event":"loggedpoint_archive",
+            "resource_group":self.archive_group,
+            "resource_id":self.resource_id,
+            "seconds":self.seconds,
+            "stages":self.stages
+        }
+        logger.info(json.dumps(log_record))
+        if settings.LOGGEDPOINT_METRICS_TEXTFILE:
+            try:
+                self.write_textfile(settings.LOGGEDPOINT_METRICS_TEXTFILE)
+            except Exception as ex:
+                #the metrics should never break archiving
+                logger.error("Failed to write the metrics textfile({}).{}: {}".format(settings.LOGGEDPOINT_METRICS_TEXTFILE,ex.__class__.__name__,str(ex)))
+        return log_record
+
+    def write_textfile(self,filename):
+        """
+        Write the metrics of the archived day into a prometheus textfile collector file, the file is replaced atomically
+        """
+        lines = []
+        for metric,key,description in (
+            ("loggedpoint_archive_stage_seconds","seconds","The seconds of each stage of the last archived day"),
+            ("loggedpoint_archive_stage_rows","rows","The rows processed by each stage of the last archived day"),
+            ("loggedpoint_archive_stage_bytes","bytes","The bytes processed by each stage of the last archived day")
+        ):
+            samples = ['{}{{stage="{}"}} {}'.format(metric,stage,record[key]) for stage,record in self.stages.items() if record.get(key) is not None]
+            if samples:
+                lines.append("# HELP {} {}".format(metric,description))
+                lines.append("# TYPE {} gauge".format(metric))
+                lines.extend(samples)
+        lines.append("# HELP loggedpoint_archive_last_success_timestamp_seconds The time when the last day was archived")
+        lines.append("# TYPE loggedpoint_archive_last_success_timestamp_seconds gauge")
+        lines.append('loggedpoint_archive_last_success_timestamp_seconds{{resource_id="{}"}} {}'.format(self.resource_id,timezone.now().timestamp()))
+
+        folder = os.path.dirname(os.path.abspath(filename))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        tmp_filename = "{}.tmp".format(filename)
+        with open(tmp_filename,"w") as f:
+            f.write("\n".join(lines))
+            f.write("\n")
+        os.replace(tmp_filename,filename)
@@ -0,0 +1,93 @@
+import logging
+import collections
+from datetime import timedelta
+
+from utils import timezone
+
+logger = logging.getLogger(__name__)
+
+#the sql to return the partition key of table tracking_loggedpoint; return no rows if the table is not partitioned
+partition_key_sql = "SELECT pg_get_partkeydef(oid) FROM pg_class WHERE relname = 'tracking_loggedpoint' AND relkind = 'p'"
+#the sql to list the range partitions of table tracking_loggedpoint with their bounds in bound order, the default partition and the partitions with MINVALUE/MAXVALUE are excluded
+partitions_sql = """SELECT c.relname,b.bounds[1]::timestamptz,b.bounds[2]::timestamptz
+FROM pg_inherits i JOIN pg_class c ON i.inhrelid = c.oid JOIN pg_class p ON i.inhparent = p.oid
+CROSS JOIN LATERAL regexp_match(pg_get_expr(c.relpartbound,c.oid),'FROM \\(''([^'']+)''\\) TO \\(''([^'']+)''\\)') AS b(bounds)
+WHERE p.relname = 'tracking_loggedpoint' AND b.bounds IS NOT NULL
+ORDER BY 2"""
+#the sql to count the rows of a partition
+partition_rows_sql = "SELECT count(1) FROM \"{0}\""
+#the sql to detach a partition from table tracking_loggedpoint
+detach_partition_sql = "ALTER TABLE tracking_loggedpoint DETACH PARTITION \"{0}\""
+#the sqls to move a detached partition into the backup schema
+move_partition_sqls = [
+    "CREATE SCHEMA IF NOT EXISTS \"{1}\"",
+    "ALTER TABLE \"{0}\" SET SCHEMA \"{1}\""
+]
+#the sql to drop a detached partition
+drop_partition_sql = "DROP TABLE \"{0}\""
+
+#the partition key supported by the partition-detach archiving
+PARTITION_KEY = "RANGE (seen)"
+
+#a range partition of table tracking_loggedpoint, start(inclusive) and end(exclusive) are the bounds with configured timezone
+Partition = collections.namedtuple("Partition",["name","start","end"])
+
+def is_partitioned(db):
+    """
+    Return True if table tracking_loggedpoint is range-partitioned by column seen
+    """
+    rows = db.query(partition_key_sql)
+    if not rows:
+        return False
+    if rows[0][0] != PARTITION_KEY:
+        logger.warning("Table tracking_loggedpoint is partitioned by '{}', only '{}' is supported by partition-detach archiving".format(rows[0][0],PARTITION_KEY))
+        return False
+    return True
+
+def get_partitions(db):
+    """
+    Return the list of the range partitions of table tracking_loggedpoint in bound order
+    """
+    return [Partition(name,timezone.nativetime(start),timezone.nativetime(end)) for name,start,end in db.query(partitions_sql)]
+
+def is_day_aligned(p):
+    """
+    Return True if both bounds of the partition are at midnight, so the partition contains whole archived days
+    """
+    return all(d == timezone.datetime(d.year,d.month,d.day) for d in (p.start,p.end))
+
+def get_days(p):
+    """
+    Return the list of the days in a day-aligned partition
+    """
+    days = []
+    d = p.start.date()
+    while d < p.end.date():
+        days.append(d)
+        d += timedelta(days=1)
+    return days
+
+def detach(db,p,features,backup_schema=None):
+    """
+    Detach the archived partition from table tracking_loggedpoint, then move it into the backup schema or drop it.
+    The rows of the partition are validated against the archived features before detaching,
+    and the detached table is validated again before it is dropped, so the loggedpoints inserted during detaching are never lost.
+    features: the number of the archived features of the days in the partition
+    backup_schema: move the detached partition into the schema if not None; otherwise drop it
+    """
+    rows = db.get(partition_rows_sql.format(p.name))[0]
+    if rows != features:
+        raise Exception("The partition({}) has {} rows, but {} features were archived, start={}, end={}".format(p.name,rows,features,p.start,p.end))
+    db.executeDDL(detach_partition_sql.format(p.name))
+    logger.info("Detached the partition({}) from table tracking_loggedpoint, start={}, end={}".format(p.name,p.start,p.end))
+
+    rows = db.get(partition_rows_sql.format(p.name))[0]
+    if rows != features:
+        raise Exception("The detached table({}) has {} rows, but {} features were archived, the table is kept, please archive it manually".format(p.name,rows,features))
+    if backup_schema:
+        for sql in move_partition_sqls:
+            db.executeDDL(sql.format(p.name,backup_schema))
+        logger.info("Moved the detached partition({}) into the schema({})".format(p.name,backup_schema))
+    else:
+        db.executeDDL(drop_partition_sql.format(p.name))
+        logger.info("Dropped the detached partition({})".format(p.name))
@@ -0,0 +1,178 @@
+import logging
+from datetime import timedelta
+
+from utils import timezone
+
+from . import settings
+from . import catalog
+
+logger = logging.getLogger(__name__)
+
+#count the loggedpoints of each day with one query
+PLANNER_EXACT = "exact"
+#estimate the loggedpoints of each day from the planner statistics of column seen, no table scan
+PLANNER_CHEAP = "cheap"
+
+#the sql to count the loggedpoints of each day before the end date in one pass
+day_rows_sql = "SELECT date_trunc('day',seen AT TIME ZONE '{0}')::date,count(1) FROM tracking_loggedpoint WHERE seen < '{1}' GROUP BY 1 ORDER BY 1"
+#the sql to find the earliest loggedpoint
+earliest_seen_sql = "SELECT min(seen) FROM tracking_loggedpoint"
+#the sql to read the histogram of column seen collected by 'analyze'
+seen_histogram_sql = "SELECT null_frac,histogram_bounds::text::timestamptz[] FROM pg_stats WHERE schemaname = current_schema() AND tablename = 'tracking_loggedpoint' AND attname = 'seen'"
+#the sql to read the estimated rows of table tracking_loggedpoint
+reltuples_sql = "SELECT reltuples FROM pg_class WHERE oid = 'tracking_loggedpoint'::regclass"
+
+datetime_pattern = "%Y-%m-%d %H:%M:%S %Z"
+
+#the number of the latest archived files used to compute the archiving throughput
+THROUGHPUT_SAMPLES = 30
+
+class ArchivePlan(object):
+    """
+    The backlog of the loggedpoints to archive
+    days: a list of (date,rows) in date order
+    mode: the planner mode which built the plan
+    rows_per_second: the archiving throughput of the latest archived files; None if no history
+    bytes_per_row: the archived bytes per loggedpoint of the latest archived files
+    """
+    def __init__(self,days,mode,rows_per_second=None,bytes_per_row=None):
+        self.days = days
+        self.mode = mode
+        self.rows_per_second = rows_per_second
+        self.bytes_per_row = bytes_per_row or settings.LOGGEDPOINT_ARCHIVE_BYTES_PER_ROW
+
+    @property
+    def rows(self):
+        return sum(rows for d,rows in self.days)
+
+    @property
+    def bytes(self):
+        return int(self.rows * self.bytes_per_row)
+
+    def eta(self,rows=None):
+        """
+        Return the estimated seconds to archive the rows; return None if no archiving history
+        rows: if None, use the rows of the whole backlog
+        """
+        if not self.rows_per_second:
+            return None
+        return (self.rows if rows is None else rows) / self.rows_per_second
+
+    def budget(self,max_days=None,max_rows=None,max_bytes=None):
+        """
+        Return the days in the backlog which can be archived within the budget; at least one day is returned if the backlog is not empty
+        Return a list of (date,rows)
+        """
+        result = []
+        total_rows = 0
+        for d,rows in self.days:
+            if result:
+                if max_days and len(result) >= max_days:
+                    break
+                if max_rows and total_rows + rows > max_rows:
+                    break
+                if max_bytes and (total_rows + rows) * self.bytes_per_row > max_bytes:
+                    break
+            result.append((d,rows))
+            total_rows += rows
+        return result
+
+def _get_exact_days(db,end_date):
+    return [(d,rows) for d,rows in db.query(day_rows_sql.format(settings.TIME_ZONE,end_date.strftime(datetime_pattern)))]
+
+def _get_estimated_days(db,end_date):
+    """
+    Estimate the loggedpoints of each day from the histogram of column seen.
+    Each bucket of the histogram has the same number of rows, the rows of a bucket are spread over the days which the bucket overlaps.
+    The statistics can't tell an empty day, so every day from the earliest loggedpoint to the end date is planned.
+    """
+    earliest_seen = db.get(earliest_seen_sql)[0]
+    if earliest_seen is None:
+        return []
+    rows = db.query(seen_histogram_sql)
+    if not rows or not rows[0][1]:
+        raise Exception("The statistics of column tracking_loggedpoint.seen is not available, please analyze the table or use the exact planner")
+    null_frac,bounds = rows[0]
+    reltuples = db.get(reltuples_sql)[0]
+    bucket_rows = reltuples * (1 - null_frac) / max(len(bounds) - 1,1)
+
+    day_rows = {}
+    for lower,upper in zip(bounds[:-1],bounds[1:]):
+        lower = timezone.nativetime(lower)
+        upper = timezone.nativetime(upper)
+        seconds = (upper - lower).total_seconds()
+        d = lower.date()
+        while d <= upper.date():
+            day_start = max(lower,timezone.datetime(d.year,d.month,d.day))
+            day_end = min(upper,timezone.datetime(d.year,d.month,d.day) + timedelta(days=1))
+            if seconds > 0:
+                day_rows[d] = day_rows.get(d,0) + bucket_rows * max((day_end - day_start).total_seconds(),0) / seconds
+            elif d == lower.date():
+                day_rows[d] = day_rows.get(d,0) + bucket_rows
+            d += timedelta(days=1)
+
+    result = []
+    d = timezone.nativetime(earliest_seen).date()
+    while d < end_date.date():
+        result.append((d,int(round(day_rows.get(d,0)))))
+        d += timedelta(days=1)
+    return result
+
+def get_throughput(metadatas,samples=THROUGHPUT_SAMPLES):
+    """
+    Compute the archiving throughput from the metadata of the latest archived files.
+    The elapsed time of a file is from 'start_archive' to 'end_archive', which includes the waiting time of a pipelined run, so the throughput is conservative.
+    Return (rows per second,bytes per row); the value is None if it can't be computed
+    """
+    metadatas = [m for m in metadatas if m.get("features") and m.get("start_archive") and m.get("end_archive")]
+    metadatas.sort(key=lambda m:timezone.parse(m["end_archive"]),reverse=True)
+    metadatas = metadatas[:samples]
+    features = sum(m["features"] for m in metadatas)
+    if not features:
+        return (None,None)
+    seconds = sum((timezone.parse(m["end_archive"]) - timezone.parse(m["start_archive"])).total_seconds() for m in metadatas)
+    size = sum(m.get("file_size") or 0 for m in metadatas)
+    return (features / seconds if seconds > 0 else None,size / features if size else None)
+
+def get_plan(end_date,mode=None,db=None,blob_resource=None):
+    """
+    Build the backlog of the loggedpoints happened before end_date.
+    The archiving history is read from the catalog if the catalog is enabled;
+    otherwise read from the resource metadata of the month which was archived last if blob_resource is not None.
+    end_date: the date(exclusive) to archive
+    mode: the planner mode; if None, use settings.LOGGEDPOINT_ARCHIVE_PLANNER
+    Return an ArchivePlan
+    """
+    db = db or settings.DATABASE
+    mode = mode or settings.LOGGEDPOINT_ARCHIVE_PLANNER
+    end_date = timezone.datetime(end_date.year,end_date.month,end_date.day)
+    starttime = timezone.now()
+    if mode == PLANNER_EXACT:
+        days = _get_exact_days(db,end_date)
+    elif mode == PLANNER_CHEAP:
+        days = _get_estimated_days(db,end_date)
+    else:
+        raise Exception("Archive planner({}) Not Support".format(mode))
+
+    archive_catalog = catalog.get_catalog()
+    if archive_catalog:
+        metadatas = archive_catalog.resource_metadatas()
+    elif blob_resource and days:
+        #the month which was archived last is the month of the day before the first day in the backlog
+        archive_group = (days[0][0] - timedelta(days=1)).strftime("%Y-%m")
+        metadatas = [m for m in blob_resource.metadata_client.resource_metadatas(resource_group=archive_group,throw_exception=False) if m.get("start_archive")]
+    else:
+        metadatas = []
+    rows_per_second,bytes_per_row = get_throughput(metadatas)
+
+    archive_plan = ArchivePlan(days,mode,rows_per_second=rows_per_second,bytes_per_row=bytes_per_row)
+    logger.info("Planned the archive backlog in {:.1f}s, mode={}, days={}, rows={}, estimated bytes={}, throughput={}, eta={}".format(
+        (timezone.now() - starttime).total_seconds(),
+        mode,
+        len(days),
+        archive_plan.rows,
+        archive_plan.bytes,
+        "{:.0f} rows/s".format(rows_per_second) if rows_per_second else None,
+        timedelta(seconds=int(archive_plan.eta())) if rows_per_second else None
+    ))
+    return archive_plan
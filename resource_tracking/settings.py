@@ -1,7 +1,24 @@
+import os
+
 from common_settings import *
 from db.database import PostgreSQL
 
-DATABASE = PostgreSQL(env("RESOURCE_TRACKING_DATABASE_URL",vtype=str,required=True))
+#the number of idle database connections which are kept open in the connection pool
+DATABASE_POOL_MINSIZE = env("DATABASE_POOL_MINSIZE",vtype=int,default=1)
+#the maximum number of open database connections, should not be less than the number of archive, restore or download workers
+DATABASE_POOL_MAXSIZE = env("DATABASE_POOL_MAXSIZE",vtype=int,default=10)
+#the seconds an idle database connection is kept open
+DATABASE_POOL_IDLE_TIMEOUT = env("DATABASE_POOL_IDLE_TIMEOUT",vtype=int,default=300)
+#check an idle database connection with 'SELECT 1' before using it if it has been idle for more than the seconds
+DATABASE_POOL_HEALTH_CHECK = env("DATABASE_POOL_HEALTH_CHECK",vtype=int,default=30)
+
+DATABASE = PostgreSQL(
+    env("RESOURCE_TRACKING_DATABASE_URL",vtype=str,required=True),
+    pool_minsize=DATABASE_POOL_MINSIZE,
+    pool_maxsize=DATABASE_POOL_MAXSIZE,
+    pool_idle_timeout=DATABASE_POOL_IDLE_TIMEOUT,
+    pool_health_check=DATABASE_POOL_HEALTH_CHECK
+)
 
 AZURE_CONNECTION_STRING = env("RESOURCE_TRACKING_STORAGE_CONNECTION_STRING",vtype=str,required=True)
 AZURE_CONTAINER = env("RESOURCE_TRACKING_CONTAINER",vtype=str,required=True)
@@ -10,3 +27,72 @@ LOGGEDPOINT_ARCHIVE_DELETE_DISABLED = env("LOGGEDPOINT_ARCHIVE_DELETE_DISABLED",
 
 LOGGEDPOINT_ACTIVE_DAYS = env("LOGGEDPOINT_ACTIVE_DAYS",vtype=int,default=30)
 
+#the number of days exported concurrently by continuous archive and monthly archive
+LOGGEDPOINT_ARCHIVE_WORKERS = env("LOGGEDPOINT_ARCHIVE_WORKERS",vtype=int,default=1)
+#read the month's loggedpoints in one query and split them into daily geopackages when archiving by month
+LOGGEDPOINT_ARCHIVE_MONTH_IN_SINGLE_SCAN = env("LOGGEDPOINT_ARCHIVE_MONTH_IN_SINGLE_SCAN",default=False)
+#the engine used to export loggedpoints, 'native': stream the loggedpoints into geopackage in process; 'ogr2ogr': export the loggedpoints with gdal command 'ogr2ogr'
+LOGGEDPOINT_EXPORT_ENGINE = env("LOGGEDPOINT_EXPORT_ENGINE",default="native")
+#export the loggedpoints of a day in a repeatable read snapshot, and count them in another connection with the exported snapshot to double check the export, only for the native engine
+LOGGEDPOINT_EXPORT_SNAPSHOT = env("LOGGEDPOINT_EXPORT_SNAPSHOT",default=False)
+#the default check mode, 'quick': check the uploaded file against the blob properties and some sampled ranged reads; 'full': download the uploaded file to check
+LOGGEDPOINT_CHECK_MODE = env("LOGGEDPOINT_CHECK_MODE",default="quick")
+#the number of sampled ranged reads besides the head and the tail in quick check mode
+LOGGEDPOINT_CHECK_SAMPLES = env("LOGGEDPOINT_CHECK_SAMPLES",vtype=int,default=4)
+#how to split the archived loggedpoints into chunks when deleting them, 'id': by id range; 'time': by time range
+LOGGEDPOINT_DELETE_CHUNK_BY = env("LOGGEDPOINT_DELETE_CHUNK_BY",default="id")
+#the size of the id range of each chunk
+LOGGEDPOINT_DELETE_CHUNK_SIZE = env("LOGGEDPOINT_DELETE_CHUNK_SIZE",vtype=int,default=50000)
+#the minutes of the time range of each chunk
+LOGGEDPOINT_DELETE_CHUNK_MINUTES = env("LOGGEDPOINT_DELETE_CHUNK_MINUTES",vtype=int,default=60)
+#the seconds to sleep after deleting a chunk
+LOGGEDPOINT_DELETE_CHUNK_SLEEP = env("LOGGEDPOINT_DELETE_CHUNK_SLEEP",vtype=float,default=0.0)
+#the maximum rows deleted per second, 0 means unlimited
+LOGGEDPOINT_DELETE_MAX_ROWS_PER_SECOND = env("LOGGEDPOINT_DELETE_MAX_ROWS_PER_SECOND",vtype=int,default=0)
+#the engine used to restore loggedpoints, 'copy': stream the daily geopackages into the database with binary copy in parallel; 'ogr2ogr': import the archive files with gdal command 'ogr2ogr'
+LOGGEDPOINT_RESTORE_ENGINE = env("LOGGEDPOINT_RESTORE_ENGINE",default="copy")
+#the number of daily geopackages loaded in parallel by the copy restore engine
+LOGGEDPOINT_RESTORE_WORKERS = env("LOGGEDPOINT_RESTORE_WORKERS",vtype=int,default=4)
+#the number of concurrent downloads when downloading the archive files of a month
+LOGGEDPOINT_DOWNLOAD_WORKERS = env("LOGGEDPOINT_DOWNLOAD_WORKERS",vtype=int,default=4)
+#maintain a local sqlite catalog of the archived resources, and use it instead of blob storage to check whether a day was archived. run 'catalog sync' before enabling it
+LOGGEDPOINT_CATALOG_ENABLED = env("LOGGEDPOINT_CATALOG_ENABLED",default=False)
+#the sqlite file of the local archive catalog
+LOGGEDPOINT_CATALOG_FILE = env("LOGGEDPOINT_CATALOG_FILE",default=os.path.join(HOME_DIR,"loggedpoint_catalog.sqlite"))
+#the format of the archive files, 'gpkg': geopackage; 'parquet': geoparquet sorted by deviceid and seen, requires package 'pyarrow'
+LOGGEDPOINT_ARCHIVE_FORMAT = env("LOGGEDPOINT_ARCHIVE_FORMAT",default="gpkg")
+#the codec to compress the archived geopackage before uploading, 'zstd' or 'gzip', 'zstd' requires package 'zstandard'; empty means no compression
+LOGGEDPOINT_ARCHIVE_COMPRESSION = env("LOGGEDPOINT_ARCHIVE_COMPRESSION",default=None)
+#the compression level
+LOGGEDPOINT_ARCHIVE_COMPRESSION_LEVEL = env("LOGGEDPOINT_ARCHIVE_COMPRESSION_LEVEL",vtype=int,default=3)
+#journal the completed stages of each archived day, so an interrupted archiving run resumes at the first incomplete stage and reuses the exported file
+LOGGEDPOINT_JOURNAL_ENABLED = env("LOGGEDPOINT_JOURNAL_ENABLED",default=True)
+#the folder of the archive journals and the work folders of the journaled days
+LOGGEDPOINT_JOURNAL_DIR = env("LOGGEDPOINT_JOURNAL_DIR",default=os.path.join(HOME_DIR,"loggedpoint_journal"))
+#the journal and the work folder(with the exported file) of a failed day are kept for the next run to resume; they are removed when the first journal is opened by a run if they were not changed in the days, 0 means never remove
+LOGGEDPOINT_JOURNAL_MAX_AGE = env("LOGGEDPOINT_JOURNAL_MAX_AGE",vtype=int,default=7)
+#split a day into chunks to export if the number of the day's loggedpoints estimated by the query planner is greater than the threshold, 0 means never split
+LOGGEDPOINT_ARCHIVE_CHUNK_THRESHOLD = env("LOGGEDPOINT_ARCHIVE_CHUNK_THRESHOLD",vtype=int,default=0)
+#how to split a heavy day into chunks, 'hour': by hours; 'rows': split the time range in half until the estimated rows of each chunk are not greater than LOGGEDPOINT_ARCHIVE_CHUNK_ROWS
+LOGGEDPOINT_ARCHIVE_CHUNK_BY = env("LOGGEDPOINT_ARCHIVE_CHUNK_BY",default="hour")
+#the hours of each chunk
+LOGGEDPOINT_ARCHIVE_CHUNK_HOURS = env("LOGGEDPOINT_ARCHIVE_CHUNK_HOURS",vtype=int,default=1)
+#the maximum estimated rows of each chunk
+LOGGEDPOINT_ARCHIVE_CHUNK_ROWS = env("LOGGEDPOINT_ARCHIVE_CHUNK_ROWS",vtype=int,default=1000000)
+#how to build the archive backlog of continuous archiving, 'exact': count the loggedpoints of each day in one query and skip the empty days; 'cheap': estimate the loggedpoints of each day from the planner statistics
+LOGGEDPOINT_ARCHIVE_PLANNER = env("LOGGEDPOINT_ARCHIVE_PLANNER",default="exact")
+#the archived bytes per loggedpoint used to estimate the archived bytes if no archiving history
+LOGGEDPOINT_ARCHIVE_BYTES_PER_ROW = env("LOGGEDPOINT_ARCHIVE_BYTES_PER_ROW",vtype=int,default=100)
+#the prometheus textfile collector file to write the stage metrics of the last archived day; empty means not write
+LOGGEDPOINT_METRICS_TEXTFILE = env("LOGGEDPOINT_METRICS_TEXTFILE",default=None)
+#the layout of the backup tables of the archived loggedpoints, 'yearly': a flat table per year(tracking_loggedpoint_<year>); 'partitioned': one parent table partitioned by month.
+#the partitioned layout is opt-in; switch to it at the start of a year, otherwise the backed up loggedpoints of the current year are split between the yearly table and the partitioned table
+LOGGEDPOINT_BACKUP_TABLE_LAYOUT = env("LOGGEDPOINT_BACKUP_TABLE_LAYOUT",default="yearly")
+#the partitioned parent backup table, each month is backed up into the partition '<table>_y<year>m<month>'
+LOGGEDPOINT_BACKUP_TABLE = env("LOGGEDPOINT_BACKUP_TABLE",default="tracking_loggedpoint_backup")
+#the months of the backup partitions to keep, the older partitions are detached and dropped after archiving; 0 means keep forever
+LOGGEDPOINT_BACKUP_RETENTION_MONTHS = env("LOGGEDPOINT_BACKUP_RETENTION_MONTHS",vtype=int,default=0)
+#archive a partitioned tracking_loggedpoint(range-partitioned by seen) partition by partition and detach the archived partitions instead of deleting the archived rows
+LOGGEDPOINT_PARTITION_DETACH = env("LOGGEDPOINT_PARTITION_DETACH",default=True)
+#the schema to move the detached partitions into if backing up the archived loggedpoints
+LOGGEDPOINT_PARTITION_BACKUP_SCHEMA = env("LOGGEDPOINT_PARTITION_BACKUP_SCHEMA",default="loggedpoint_backup")
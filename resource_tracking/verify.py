@@ -0,0 +1,213 @@
+import os
+import time
+import random
+import logging
+import binascii
+import tempfile
+import traceback
+
+from utils import gdal,compression
+import utils
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+#check the uploaded file against the blob properties and some sampled ranged reads
+CHECK_QUICK = "quick"
+#download the uploaded file to check
+CHECK_FULL = "full"
+
+#the size of each sampled range
+SAMPLE_SIZE = 64 * 1024
+
+_blob_service_client = None
+def get_blob_client(metadata):
+    """
+    Return the azure blob client of the resource, only used by the quick check which requires the blob properties and ranged reads of azure blob storage
+    metadata: the resource metadata returned by the resource repository
+    """
+    global _blob_service_client
+    if _blob_service_client is None:
+        from azure.storage.blob import BlobServiceClient
+        _blob_service_client = BlobServiceClient.from_connection_string(settings.AZURE_CONNECTION_STRING)
+    resource_path = metadata.get("resource_path")
+    if not resource_path:
+        raise Exception("The resource path is missing in resource metadata({})".format(metadata))
+    return _blob_service_client.get_blob_client(settings.AZURE_CONTAINER,resource_path)
+
+def read_chunks(metadata):
+    """
+    Return an iterator of the data chunks of the resource, which are read from azure blob storage as soon as they are downloaded
+    metadata: the resource metadata returned by the resource repository
+    """
+    return get_blob_client(metadata).download_blob().chunks()
+
+def download_decompressed(blob_resource,metadata,filename,stream=False):
+    """
+    Download the compressed resource and decompress it into the file, the md5s are computed during decompressing
+    metadata: the resource metadata which contains the compression codec
+    stream: if True, the chunks of the resource are read from azure blob storage directly and decompressed into the file as soon as they are downloaded, no compressed data is saved;
+            otherwise, the compressed file is downloaded through the resource repository next to the file and removed after it is decompressed
+    Return (compressed md5,compressed size,uncompressed md5,uncompressed size)
+    """
+    if stream:
+        try:
+            with open(filename,"wb") as f:
+                return compression.decompress_chunks(read_chunks(metadata),f,codec=metadata["compression"])
+        except:
+            if os.path.exists(filename):
+                utils.remove_file(filename)
+            raise
+
+    compressed_file = "{}{}".format(filename,compression.file_exts[metadata["compression"]])
+    try:
+        d_metadata,compressed_file = blob_resource.download_resource(metadata["resource_group"],metadata["resource_id"],filename=compressed_file,overwrite=True)
+        return compression.decompress_file(compressed_file,filename,codec=metadata["compression"])
+    finally:
+        if os.path.exists(compressed_file):
+            utils.remove_file(compressed_file)
+
+def get_check_mode(check):
+    """
+    Return the check mode from the check argument, which can be a boolean or a check mode
+    Return None if check is disabled
+    """
+    if not check:
+        return None
+    elif check in (CHECK_QUICK,CHECK_FULL):
+        return check
+    else:
+        return settings.LOGGEDPOINT_CHECK_MODE
+
+def _get_sample_ranges(size,samples):
+    """
+    Return a list of (offset,length) to read; the head and the tail of the file are always checked.
+    """
+    if size <= SAMPLE_SIZE * (samples + 2):
+        return [(0,size)] if size else []
+    ranges = [(0,SAMPLE_SIZE),(size - SAMPLE_SIZE,SAMPLE_SIZE)]
+    for i in range(samples):
+        ranges.append((random.randrange(SAMPLE_SIZE,size - 2 * SAMPLE_SIZE),SAMPLE_SIZE))
+    ranges.sort()
+    return ranges
+
+def quick_check(filename,metadata,samples=None):
+    """
+    Check whether the local file was uploaded successfully without downloading the whole file.
+    The blob is read from azure blob storage directly, so the quick check only works if the resources are stored in azure blob storage(see 'archive.get_check_mode')
+    The size and the content md5(if the storage has one) of the blob are compared with the local file,
+    and some ranges of the blob are read and compared with the same ranges of the local file.
+    filename: the local file which was uploaded
+    metadata: the resource metadata returned by the resource repository, must contain 'file_md5'
+    samples: the number of sampled ranges besides the head and the tail
+    Raise exception if check failed
+    """
+    samples = settings.LOGGEDPOINT_CHECK_SAMPLES if samples is None else samples
+    blob_client = get_blob_client(metadata)
+    properties = blob_client.get_blob_properties()
+    size = utils.file_size(filename)
+    if properties.size != size:
+        raise Exception("Upload file({}) failed.source file's size={}, uploaded file's size={}".format(metadata["resource_id"],size,properties.size))
+
+    content_md5 = properties.content_settings.content_md5 if properties.content_settings else None
+    if content_md5:
+        content_md5 = binascii.hexlify(bytes(content_md5)).decode()
+        if content_md5 != metadata["file_md5"]:
+            raise Exception("Upload file({}) failed.source file's md5={}, uploaded file's md5={}".format(metadata["resource_id"],metadata["file_md5"],content_md5))
+
+    with open(filename,'rb') as f:
+        for offset,length in _get_sample_ranges(size,samples):
+            f.seek(offset)
+            data = f.read(length)
+            if blob_client.download_blob(offset=offset,length=length).readall() != data:
+                raise Exception("Upload file({}) failed.the uploaded data between {} and {} is different from the source file".format(metadata["resource_id"],offset,offset + length))
+
+    logger.debug("The file({}) was uploaded successfully, size={}, content md5={}".format(metadata["resource_id"],size,content_md5))
+
+def full_check(blob_resource,metadata,work_folder,layer_metadata=None,stream=False):
+    """
+    Download the uploaded file to check whether the file was uploaded successfully or not, the compressed file is decompressed during downloading
+    layer_metadata: the layer metadata of the source spatial file; if not None, the feature count of the downloaded file is also checked
+    stream: decompress the compressed file from the downloaded stream(see 'download_decompressed')
+    Raise exception if check failed
+    """
+    d_filename = os.path.join(work_folder,"download_{}".format(metadata["resource_id"]))
+    try:
+        if metadata.get("compression"):
+            d_file_md5,d_file_size,d_uncompressed_md5,d_uncompressed_size = download_decompressed(blob_resource,metadata,d_filename,stream=stream)
+            if metadata.get("uncompressed_md5") and metadata["uncompressed_md5"] != d_uncompressed_md5:
+                raise Exception("Upload file({}) failed.source file's uncompressed md5={}, uploaded file's uncompressed md5={}".format(metadata["resource_id"],metadata["uncompressed_md5"],d_uncompressed_md5))
+        else:
+            d_metadata,d_filename = blob_resource.download_resource(metadata["resource_group"],metadata["resource_id"],filename=d_filename)
+            d_file_md5 = utils.file_md5(d_filename)
+        if metadata["file_md5"] != d_file_md5:
+            raise Exception("Upload file({}) failed.source file's md5={}, uploaded file's md5={}".format(metadata["resource_id"],metadata["file_md5"],d_file_md5))
+
+        if layer_metadata:
+            d_layer_metadata = gdal.get_layers(d_filename)[0]
+            if d_layer_metadata["features"] != layer_metadata["features"]:
+                raise Exception("Upload file({}) failed.source file's features={}, uploaded file's features={}".format(metadata["resource_id"],layer_metadata["features"],d_layer_metadata["features"]))
+    finally:
+        utils.remove_file(d_filename)
+
+def check(check_mode,blob_resource,filename,metadata,work_folder,layer_metadata=None,stream=False):
+    """
+    Check whether the file was uploaded successfully with the check mode
+    stream: used by the full check, see 'full_check'
+    """
+    if check_mode == CHECK_QUICK:
+        quick_check(filename,metadata)
+    elif check_mode == CHECK_FULL:
+        full_check(blob_resource,metadata,work_folder,layer_metadata=layer_metadata,stream=stream)
+    else:
+        raise Exception("Check mode({}) Not Support".format(check_mode))
+
+def audit(blob_resource,resource_group=None,max_files=None,interval=None,max_bytes_per_second=None,stream=False):
+    """
+    Download the archived files one by one to check whether the archived files are intact or not.
+    It is a throttled background sweep over the archived files.
+    resource_group: only audit the files in the resource group; if None, audit all archived files
+    max_files: the maximum number of files to audit
+    interval: the seconds to sleep after auditing a file
+    max_bytes_per_second: limit the download speed
+    stream: decompress the compressed files from the downloaded stream(see 'download_decompressed')
+    Return (the number of audited files, a list of (resource_group,resource_id,error) of the failed files)
+    """
+    audited_files = 0
+    failed_files = []
+    work_folder = tempfile.mkdtemp(prefix="audit_loggedpoint")
+    logger.info("Begin to audit the archived files, resource_group={},max_files={},interval={},max_bytes_per_second={}".format(resource_group,max_files,interval,max_bytes_per_second))
+    try:
+        for metadata in blob_resource.metadata_client.resource_metadatas(resource_group=resource_group,throw_exception=False):
+            if max_files and audited_files >= max_files:
+                break
+            if not metadata.get("file_md5"):
+                continue
+            starttime = time.time()
+            is_spatial_file = metadata.get("features") is not None and metadata["resource_id"].endswith((".gpkg",".parquet"))
+            try:
+                full_check(
+                    blob_resource,
+                    metadata,
+                    work_folder,
+                    layer_metadata={"features":metadata["features"]} if is_spatial_file else None,
+                    stream=stream
+                )
+                logger.debug("The archived file({}/{}) is intact".format(metadata["resource_group"],metadata["resource_id"]))
+            except:
+                logger.error("The archived file({}/{}) is corrupted.{}".format(metadata["resource_group"],metadata["resource_id"],traceback.format_exc()))
+                failed_files.append((metadata["resource_group"],metadata["resource_id"],traceback.format_exc()))
+            audited_files += 1
+
+            #throttle
+            sleep_time = interval or 0
+            if max_bytes_per_second and metadata.get("file_size"):
+                sleep_time = max(sleep_time,metadata["file_size"] / max_bytes_per_second - (time.time() - starttime))
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+
+        logger.info("End to audit the archived files, resource_group={},audited files={},failed files={}".format(resource_group,audited_files,len(failed_files)))
+        return (audited_files,failed_files)
+    finally:
+        utils.remove_folder(work_folder)
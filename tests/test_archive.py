@@ -0,0 +1,80 @@
+from datetime import datetime,timedelta
+
+import pytest
+
+pytest.importorskip("data_storage")
+
+from utils import timezone
+
+from resource_tracking import archive,settings
+
+#the time range is passed to the fake database as naive datetimes
+DATETIME_PATTERN = "%Y-%m-%dT%H:%M:%S"
+
+class FakeDatabase(object):
+    """
+    A database which estimates the loggedpoints of a time range from the loggedpoints per hour
+    hourly_rows: a function to return the loggedpoints per hour at the time
+    """
+    def __init__(self,hourly_rows):
+        self.hourly_rows = hourly_rows
+        self.estimates = 0
+
+    def estimate(self,sql):
+        self.estimates += 1
+        start,end = [datetime.strptime(v,DATETIME_PATTERN) for v in sql.split("|")]
+        return int(sum(self.hourly_rows(start + timedelta(seconds=s)) / 3600 for s in range(0,int((end - start).total_seconds()),10)) * 10)
+
+@pytest.fixture(autouse=True)
+def estimate_sql(monkeypatch):
+    monkeypatch.setattr(archive,"datetime_pattern",DATETIME_PATTERN)
+    monkeypatch.setattr(archive,"estimate_rows_sql","{0}|{1}")
+
+START = timezone.datetime(2021,3,1)
+END = timezone.datetime(2021,3,2)
+
+def test_no_threshold(monkeypatch):
+    monkeypatch.setattr(settings,"LOGGEDPOINT_ARCHIVE_CHUNK_THRESHOLD",0)
+    db = FakeDatabase(lambda t:1000)
+    assert archive._get_export_chunks(START,END,db) is None
+    assert db.estimates == 0
+
+def test_light_day(monkeypatch):
+    monkeypatch.setattr(settings,"LOGGEDPOINT_ARCHIVE_CHUNK_THRESHOLD",100000)
+    assert archive._get_export_chunks(START,END,FakeDatabase(lambda t:1000)) is None
+
+def test_chunk_by_hour(monkeypatch):
+    monkeypatch.setattr(settings,"LOGGEDPOINT_ARCHIVE_CHUNK_THRESHOLD",10000)
+    monkeypatch.setattr(settings,"LOGGEDPOINT_ARCHIVE_CHUNK_BY","hour")
+    monkeypatch.setattr(settings,"LOGGEDPOINT_ARCHIVE_CHUNK_HOURS",5)
+    chunks = archive._get_export_chunks(START,END,FakeDatabase(lambda t:1000))
+    assert chunks == [(START + timedelta(hours=h),min(START + timedelta(hours=h + 5),END)) for h in range(0,24,5)]
+
+def test_chunk_by_rows(monkeypatch):
+    monkeypatch.setattr(settings,"LOGGEDPOINT_ARCHIVE_CHUNK_THRESHOLD",10000)
+    monkeypatch.setattr(settings,"LOGGEDPOINT_ARCHIVE_CHUNK_BY","rows")
+    monkeypatch.setattr(settings,"LOGGEDPOINT_ARCHIVE_CHUNK_ROWS",6000)
+    #the loggedpoints of the day are in the working hours
+    db = FakeDatabase(lambda t:3000 if 8 <= t.hour < 16 else 100)
+    chunks = archive._get_export_chunks(START,END,db)
+    #the chunks cover the day without gaps
+    assert chunks[0][0] == START and chunks[-1][1] == END
+    assert all(chunks[i][1] == chunks[i + 1][0] for i in range(len(chunks) - 1))
+    assert all(db.estimate("{}|{}".format(s.strftime(DATETIME_PATTERN),e.strftime(DATETIME_PATTERN))) <= 6000 for s,e in chunks)
+    #the quiet hours are not split as finely as the busy hours
+    assert chunks[0][1] - chunks[0][0] > timedelta(hours=2)
+
+def test_chunk_by_rows_minimum_chunk(monkeypatch):
+    monkeypatch.setattr(settings,"LOGGEDPOINT_ARCHIVE_CHUNK_THRESHOLD",10000)
+    monkeypatch.setattr(settings,"LOGGEDPOINT_ARCHIVE_CHUNK_BY","rows")
+    monkeypatch.setattr(settings,"LOGGEDPOINT_ARCHIVE_CHUNK_ROWS",1)
+    chunks = archive._get_export_chunks(START,START + timedelta(minutes=4),FakeDatabase(lambda t:6000000))
+    #a chunk is not split any more if it is not longer than one minute
+    assert len(chunks) == 4
+    assert all(e - s == timedelta(minutes=1) for s,e in chunks)
+
+def test_unsupported_chunk_type(monkeypatch):
+    monkeypatch.setattr(settings,"LOGGEDPOINT_ARCHIVE_CHUNK_THRESHOLD",10)
+    monkeypatch.setattr(settings,"LOGGEDPOINT_ARCHIVE_CHUNK_BY","minute")
+    with pytest.raises(Exception):
+        archive._get_export_chunks(START,END,FakeDatabase(lambda t:1000))
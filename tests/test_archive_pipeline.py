@@ -0,0 +1,128 @@
+import os
+import time
+import threading
+from datetime import date,timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("data_storage")
+
+from resource_tracking import archive,settings
+
+DAYS = [date(2021,3,1) + timedelta(days=i) for i in range(4)]
+
+class FakeDatabase(object):
+    def clone(self):
+        return self
+
+class FakeArchive(object):
+    """
+    Fake export_archive and publish_archive which record the exported and published days
+    delays: the seconds to wait before each day is exported
+    failed_exports,failed_publishes: the days which fail to be exported or published
+    """
+    def __init__(self,delays=None,failed_exports=(),failed_publishes=()):
+        self.delays = delays or {}
+        self.failed_exports = failed_exports
+        self.failed_publishes = failed_publishes
+        self.exported = []
+        self.published = []
+        self.work_folders = {}
+        self._lock = threading.Lock()
+
+    def export_archive(self,archive_group,archive_id,start_date,end_date,work_folder,**kwargs):
+        d = start_date.date()
+        with self._lock:
+            self.work_folders[d] = work_folder
+        time.sleep(self.delays.get(d,0))
+        if d in self.failed_exports:
+            raise Exception("Failed to export {}".format(d))
+        with open(os.path.join(work_folder,"{}.gpkg".format(archive_id)),"w") as f:
+            f.write(archive_id)
+        with self._lock:
+            self.exported.append(d)
+        return {"date":d,"archive_id":archive_id,"work_folder":work_folder}
+
+    def publish_archive(self,export_result,**kwargs):
+        d = export_result["date"]
+        #the exported file is still in the work folder when the day is published
+        assert os.path.exists(os.path.join(export_result["work_folder"],"{}.gpkg".format(export_result["archive_id"])))
+        if d in self.failed_publishes:
+            raise Exception("Failed to publish {}".format(d))
+        self.published.append(d)
+
+@pytest.fixture
+def fake_archive(monkeypatch):
+    monkeypatch.setattr(settings,"DATABASE",FakeDatabase())
+    monkeypatch.setattr(settings,"LOGGEDPOINT_JOURNAL_ENABLED",False)
+    def _fake_archive(**kwargs):
+        fake = FakeArchive(**kwargs)
+        monkeypatch.setattr(archive,"export_archive",fake.export_archive)
+        monkeypatch.setattr(archive,"publish_archive",fake.publish_archive)
+        return fake
+    return _fake_archive
+
+def test_publish_in_date_order(fake_archive):
+    #the later days are exported earlier
+    fake = fake_archive(delays={d:0.1 * (len(DAYS) - i) for i,d in enumerate(DAYS)})
+    assert archive._archive_dates_in_order(DAYS,workers=len(DAYS)) == len(DAYS)
+    assert fake.exported == list(reversed(DAYS))
+    assert fake.published == DAYS
+    assert not any(os.path.exists(f) for f in fake.work_folders.values())
+
+def test_failed_day_stops_later_days(fake_archive):
+    fake = fake_archive(delays={DAYS[0]:0.2},failed_publishes=(DAYS[1],))
+    with pytest.raises(Exception):
+        archive._archive_dates_in_order(DAYS,workers=2)
+    assert fake.published == [DAYS[0]]
+    #the last day is not exported, because at most 'workers' days are exported ahead of the day being published
+    assert DAYS[3] not in fake.exported
+    assert not any(os.path.exists(f) for f in fake.work_folders.values())
+
+def test_pending_days_are_cancelled(fake_archive,monkeypatch):
+    futures = []
+    class Executor(ThreadPoolExecutor):
+        #one worker thread, so the pending days are queued
+        def __init__(self,max_workers=None,thread_name_prefix=""):
+            super().__init__(max_workers=1,thread_name_prefix=thread_name_prefix)
+
+        def submit(self,*args,**kwargs):
+            future = super().submit(*args,**kwargs)
+            futures.append(future)
+            return future
+
+    monkeypatch.setattr(archive,"ThreadPoolExecutor",Executor)
+    fake = fake_archive(delays={DAYS[1]:0.2},failed_exports=(DAYS[0],))
+    with pytest.raises(Exception):
+        archive._archive_dates_in_order(DAYS,workers=3)
+    assert fake.published == []
+    assert len(futures) == 3
+    assert futures[2].cancelled()
+    assert fake.exported == [DAYS[1]]
+    #the work folders of the failed day and the cancelled days are removed
+    assert len(fake.work_folders) == 2
+    assert not any(os.path.exists(f) for f in fake.work_folders.values())
+
+def test_stop(fake_archive):
+    fake = fake_archive()
+    submitted = []
+    def _dates():
+        for d in DAYS:
+            submitted.append(d)
+            yield d
+    assert archive._archive_dates_in_order(_dates(),workers=2,f_stop=lambda:len(fake.published) >= 1) == 1
+    assert fake.published == [DAYS[0]]
+    #no day is submitted after archiving is stopped
+    assert submitted == DAYS[:2]
+    assert not any(os.path.exists(f) for f in fake.work_folders.values())
+
+def test_journaled_work_folder_is_kept(fake_archive,monkeypatch,tmp_path):
+    fake = fake_archive(failed_publishes=(DAYS[1],))
+    monkeypatch.setattr(settings,"LOGGEDPOINT_JOURNAL_ENABLED",True)
+    monkeypatch.setattr(settings,"LOGGEDPOINT_JOURNAL_DIR",str(tmp_path))
+    with pytest.raises(Exception):
+        archive._archive_dates_in_order(DAYS,workers=2)
+    assert fake.published == [DAYS[0]]
+    #the journal of the archived day is cleared, the work folders of the failed day and the pending day are reused by the next run
+    assert [os.path.exists(os.path.join(str(tmp_path),archive.get_archive_id(d))) for d in DAYS] == [False,True,True,False]
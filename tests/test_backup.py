@@ -0,0 +1,98 @@
+from datetime import date
+
+import pytest
+
+from resource_tracking import backup,settings
+
+class FakeDatabase(object):
+    """
+    A database which keeps the tables and the indexes of the backup partitions in memory and records the executed statements
+    """
+    def __init__(self,tables=None,indexes=None,invalid_indexes=None):
+        self.tables = set(tables or [])
+        #partition -> the number of valid indexes
+        self.indexes = dict(indexes or {})
+        #partition -> the list of invalid indexes
+        self.invalid_indexes = dict(invalid_indexes or {})
+        self.ddls = []
+        self.updates = []
+
+    def is_table_exist(self,table):
+        return table in self.tables
+
+    def executeDDL(self,sql):
+        self.ddls.append(sql)
+
+    def update(self,sql,commit=True,autocommit=False,params=None,prepared=False):
+        self.updates.append((sql,autocommit))
+
+    def query(self,sql,**kwargs):
+        if sql == backup.partitions_sql.format(settings.LOGGEDPOINT_BACKUP_TABLE):
+            return [(table,) for table in sorted(self.tables) if table.startswith("{}_y".format(settings.LOGGEDPOINT_BACKUP_TABLE))]
+        for table in self.tables:
+            if sql == backup.invalid_indexes_sql.format(table):
+                return [(index,) for index in self.invalid_indexes.get(table,[])]
+        raise Exception("Unexpected sql: {}".format(sql))
+
+    def get(self,sql,**kwargs):
+        for table in self.tables:
+            if sql == backup.partition_indexes_sql.format(table):
+                return (self.indexes.get(table,0),)
+        raise Exception("Unexpected sql: {}".format(sql))
+
+@pytest.fixture
+def partitioned(monkeypatch):
+    monkeypatch.setattr(settings,"LOGGEDPOINT_BACKUP_TABLE_LAYOUT",backup.LAYOUT_PARTITIONED)
+    backup._partitions.clear()
+    yield settings.LOGGEDPOINT_BACKUP_TABLE
+    backup._partitions.clear()
+
+def test_get_backup_table(monkeypatch):
+    monkeypatch.setattr(settings,"LOGGEDPOINT_BACKUP_TABLE_LAYOUT",backup.LAYOUT_YEARLY)
+    assert backup.get_backup_table(date(2021,3,1)) == "tracking_loggedpoint_2021"
+    monkeypatch.setattr(settings,"LOGGEDPOINT_BACKUP_TABLE_LAYOUT",backup.LAYOUT_PARTITIONED)
+    assert backup.get_backup_table(date(2021,3,1)) == settings.LOGGEDPOINT_BACKUP_TABLE
+    monkeypatch.setattr(settings,"LOGGEDPOINT_BACKUP_TABLE_LAYOUT","daily")
+    with pytest.raises(Exception):
+        backup.get_backup_table(date(2021,3,1))
+
+def test_prepare_creates_partition_without_indexing(partitioned):
+    previous_partition = backup.get_partition_name(partitioned,date(2021,2,1))
+    db = FakeDatabase(tables=[partitioned,previous_partition])
+    backup.prepare(db,partitioned,date(2021,3,15))
+    partition = backup.get_partition_name(partitioned,date(2021,3,1))
+    assert len(db.ddls) == 1
+    assert db.ddls[0].startswith("CREATE TABLE IF NOT EXISTS \"{}\" PARTITION OF".format(partition))
+    #the indexes of the completed months are never built in the delete transaction
+    assert db.updates == []
+    #the partition is cached
+    backup.prepare(db,partitioned,date(2021,3,16))
+    assert len(db.ddls) == 1
+
+def test_prepare_creates_parent_table(partitioned):
+    db = FakeDatabase()
+    backup.prepare(db,partitioned,date(2021,3,15))
+    assert db.ddls[:len(backup.create_parent_table_sqls)] == [sql.format(partitioned) for sql in backup.create_parent_table_sqls]
+
+def test_index_partitions(partitioned):
+    february = backup.get_partition_name(partitioned,date(2021,2,1))
+    january = backup.get_partition_name(partitioned,date(2021,1,1))
+    december = backup.get_partition_name(partitioned,date(2020,12,1))
+    march = backup.get_partition_name(partitioned,date(2021,3,1))
+    db = FakeDatabase(
+        tables=[partitioned,december,january,february,march],
+        indexes={december:len(backup.create_partition_index_sqls)},
+        invalid_indexes={january:["{}_seen".format(january)]}
+    )
+    assert backup.index_partitions(db,partitioned,before=date(2021,3,1)) == [january,february]
+    #all statements run in autocommit mode, and the invalid index is dropped before building
+    assert all(autocommit for sql,autocommit in db.updates)
+    assert [sql for sql,autocommit in db.updates] == [backup.drop_index_sql.format("{}_seen".format(january))] + [sql.format(january) for sql in backup.create_partition_index_sqls] + [sql.format(february) for sql in backup.create_partition_index_sqls]
+    assert all("CONCURRENTLY" in sql for sql,autocommit in db.updates)
+
+def test_expire_partitions(partitioned):
+    old = backup.get_partition_name(partitioned,date(2000,1,1))
+    db = FakeDatabase(tables=[partitioned,old])
+    assert backup.expire_partitions(db,partitioned,retention_months=0) == []
+    assert backup.expire_partitions(db,partitioned,retention_months=12) == [old]
+    assert db.ddls == [backup.detach_partition_sql.format(partitioned,old),backup.drop_table_sql.format(old)]
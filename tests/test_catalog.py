@@ -0,0 +1,100 @@
+from datetime import date,timedelta
+
+from utils import timezone
+
+from resource_tracking import catalog
+
+class FakeMetadataClient(object):
+    def __init__(self,metadatas):
+        self.metadatas = metadatas
+
+    def resource_metadatas(self,resource_group=None,throw_exception=True):
+        return [m for m in self.metadatas if not resource_group or m["resource_group"] == resource_group]
+
+class FakeRepository(object):
+    def __init__(self,metadatas):
+        self.metadata_client = FakeMetadataClient(metadatas)
+
+def _metadata(d,features=10,file_md5=None,resource_id=None):
+    return {
+        "resource_group":d.strftime("%Y-%m"),
+        "resource_id":resource_id or "{}.gpkg".format(d.isoformat()),
+        "start_archive_date":timezone.datetime(d.year,d.month,d.day),
+        "end_archive_date":timezone.datetime(d.year,d.month,d.day) + timedelta(days=1),
+        "features":features,
+        "file_md5":file_md5 or "md5-{}".format(d.isoformat()),
+        "file_size":features * 100,
+        "layer":d.isoformat(),
+        "extent":[115,-32,116,-31],
+        "start_archive":timezone.now(),
+        "end_archive":timezone.now()
+    }
+
+def _catalog(tmp_path):
+    return catalog.ArchiveCatalog(str(tmp_path / "catalog.sqlite"))
+
+def test_sync(tmp_path):
+    archive_catalog = _catalog(tmp_path)
+    try:
+        metadatas = [_metadata(date(2021,3,1)),_metadata(date(2021,3,2)),_metadata(date(2021,4,1))]
+        #the group index file is synchronized but is not an archive file
+        metadatas.append({"resource_group":"2021-03","resource_id":"2021-03.vrt","file_md5":"vrt"})
+        assert archive_catalog.last_sync is None
+        assert archive_catalog.sync(FakeRepository(metadatas)) == (4,0)
+        assert archive_catalog.last_sync is not None
+        assert archive_catalog.is_exist("2021-03","2021-03.vrt")
+        assert [m["resource_id"] for m in archive_catalog.resource_metadatas("2021-03")] == ["2021-03-01.gpkg","2021-03-02.gpkg"]
+        assert archive_catalog.resource_metadatas("2021-04")[0]["extent"] == [115,-32,116,-31]
+
+        #nothing changed
+        assert archive_catalog.sync(FakeRepository(metadatas)) == (0,0)
+
+        #one resource is changed and one resource is removed
+        metadatas[0] = _metadata(date(2021,3,1),features=20,file_md5="changed")
+        del metadatas[1]
+        assert archive_catalog.sync(FakeRepository(metadatas)) == (1,1)
+        assert not archive_catalog.is_exist("2021-03","2021-03-02.gpkg")
+        assert archive_catalog.resource_metadatas("2021-03")[0]["features"] == 20
+
+        #only synchronize a group
+        assert archive_catalog.sync(FakeRepository([]),resource_group="2021-04") == (0,1)
+        assert archive_catalog.is_exist("2021-03","2021-03-01.gpkg")
+    finally:
+        archive_catalog.close()
+
+def test_add_and_remove(tmp_path):
+    archive_catalog = _catalog(tmp_path)
+    try:
+        archive_catalog.add(_metadata(date(2021,3,1)))
+        archive_catalog.add(_metadata(date(2021,3,1),features=5))
+        assert archive_catalog.features() == [("2021-03",1,5,500)]
+        archive_catalog.add(_metadata(date(2021,3,2)))
+        archive_catalog.remove("2021-03","2021-03-01.gpkg")
+        assert archive_catalog.archived_dates() == {date(2021,3,2)}
+        archive_catalog.add(_metadata(date(2021,4,2)))
+        archive_catalog.remove("2021-03")
+        assert archive_catalog.archived_dates() == {date(2021,4,2)}
+        archive_catalog.remove()
+        assert archive_catalog.archived_dates() == set()
+    finally:
+        archive_catalog.close()
+
+def test_gaps(tmp_path):
+    archive_catalog = _catalog(tmp_path)
+    try:
+        assert archive_catalog.gaps() == []
+        assert archive_catalog.gaps(date(2021,3,1),date(2021,3,3)) == [(date(2021,3,1),date(2021,3,3))]
+        for d in (date(2021,3,1),date(2021,3,2),date(2021,3,5),date(2021,3,7)):
+            archive_catalog.add(_metadata(d))
+        #a geoparquet file is an archive file too
+        archive_catalog.add(_metadata(date(2021,3,8),resource_id="2021-03-08.parquet"))
+        assert archive_catalog.gaps() == [(date(2021,3,3),date(2021,3,5)),(date(2021,3,6),date(2021,3,7))]
+        assert archive_catalog.gaps(date(2021,2,27),date(2021,3,11)) == [
+            (date(2021,2,27),date(2021,3,1)),
+            (date(2021,3,3),date(2021,3,5)),
+            (date(2021,3,6),date(2021,3,7)),
+            (date(2021,3,9),date(2021,3,11))
+        ]
+        assert archive_catalog.archived_dates(date(2021,3,2),date(2021,3,7)) == {date(2021,3,2),date(2021,3,5)}
+    finally:
+        archive_catalog.close()
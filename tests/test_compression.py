@@ -0,0 +1,56 @@
+import os
+import io
+import hashlib
+
+import pytest
+
+from utils import compression
+
+def _md5(data):
+    return hashlib.md5(data).hexdigest()
+
+@pytest.mark.parametrize("codec",[compression.ZSTD,compression.GZIP])
+def test_compress_and_decompress_file(tmp_path,codec):
+    data = os.urandom(1024) * 3000
+    filename = str(tmp_path / "a.gpkg")
+    compressed_file = filename + compression.file_exts[codec]
+    with open(filename,"wb") as f:
+        f.write(data)
+
+    uncompressed_md5,uncompressed_size,compressed_md5,compressed_size = compression.compress_file(filename,compressed_file,codec=codec)
+    assert (uncompressed_md5,uncompressed_size) == (_md5(data),len(data))
+    with open(compressed_file,"rb") as f:
+        compressed_data = f.read()
+    assert (compressed_md5,compressed_size) == (_md5(compressed_data),len(compressed_data))
+    assert compressed_size < uncompressed_size
+
+    decompressed_file = str(tmp_path / "b.gpkg")
+    assert compression.decompress_file(compressed_file,decompressed_file,codec=codec) == (compressed_md5,compressed_size,uncompressed_md5,uncompressed_size)
+    with open(decompressed_file,"rb") as f:
+        assert f.read() == data
+
+@pytest.mark.parametrize("codec",[compression.ZSTD,compression.GZIP])
+def test_decompress_chunks(codec):
+    data = b"loggedpoint" * 10000
+    buffer = io.BytesIO()
+    with compression.stream_writer(buffer,codec=codec) as writer:
+        writer.write(data)
+    compressed_data = buffer.getvalue()
+    chunks = [compressed_data[i:i + 100] for i in range(0,len(compressed_data),100)]
+    f = io.BytesIO()
+    assert compression.decompress_chunks(chunks,f,codec=codec) == (_md5(compressed_data),len(compressed_data),_md5(data),len(data))
+    assert f.getvalue() == data
+
+def test_hashing_writer():
+    f = io.BytesIO()
+    writer = compression.HashingWriter(f)
+    writer.write(b"abc")
+    writer.write(b"def")
+    assert (writer.hexdigest,writer.size,f.getvalue()) == (_md5(b"abcdef"),6,b"abcdef")
+    writer = compression.HashingWriter(io.BytesIO(),checksum=False)
+    writer.write(b"abc")
+    assert (writer.hexdigest,writer.size) == (None,3)
+
+def test_unsupported_codec():
+    with pytest.raises(Exception):
+        compression.stream_writer(io.BytesIO(),codec="lz4")
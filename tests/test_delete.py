@@ -0,0 +1,164 @@
+from datetime import timedelta
+
+import pytest
+
+pytest.importorskip("data_storage")
+
+from utils import timezone
+
+from resource_tracking import archive,settings
+
+START = timezone.datetime(2021,3,1)
+END = timezone.datetime(2021,3,2)
+
+BACKUP_TABLE = "tracking_loggedpoint_2021"
+
+class FakeDatabase(object):
+    """
+    A database which returns the scripted results of the chunk statements
+    id_range: the (min id,max id) of the loggedpoints to delete
+    moved: the (moved rows,backuped rows) of each chunk moved into the backup table
+    deleted: the deleted rows of each chunk
+    """
+    def __init__(self,id_range=(1,40),moved=None,deleted=None):
+        self.id_range = id_range
+        self.moved = list(moved or [])
+        self.deleted = list(deleted or [])
+        self.chunks = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        return False
+
+    def is_table_exist(self,table):
+        return True
+
+    def get(self,sql,params=None,prepared=False):
+        if sql.startswith("SELECT min(id),max(id)"):
+            return self.id_range
+        self.chunks.append(params)
+        return self.moved.pop(0)
+
+    def update(self,sql,commit=True,params=None,prepared=False):
+        self.chunks.append(params)
+        return self.deleted.pop(0)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+class FakeTime(object):
+    """
+    A frozen clock which records the throttle sleeps
+    """
+    def __init__(self):
+        self.sleeps = []
+
+    def time(self):
+        return 1000.0
+
+    def sleep(self,seconds):
+        self.sleeps.append(seconds)
+
+@pytest.fixture
+def fake_time(monkeypatch):
+    monkeypatch.setattr(settings,"LOGGEDPOINT_DELETE_CHUNK_BY","id")
+    monkeypatch.setattr(settings,"LOGGEDPOINT_DELETE_CHUNK_SIZE",10)
+    monkeypatch.setattr(settings,"LOGGEDPOINT_DELETE_CHUNK_SLEEP",0)
+    monkeypatch.setattr(settings,"LOGGEDPOINT_DELETE_MAX_ROWS_PER_SECOND",0)
+    fake = FakeTime()
+    monkeypatch.setattr(archive,"time",fake)
+    return fake
+
+def _delete(monkeypatch,db,features,backup_table=BACKUP_TABLE,**kwargs):
+    monkeypatch.setattr(settings,"DATABASE",db)
+    return archive.delete_archived_data(START,END,features,backup_table=backup_table,**kwargs)
+
+def test_move(monkeypatch,fake_time):
+    db = FakeDatabase(moved=[(10,10),(10,10),(10,10),(5,5)])
+    assert _delete(monkeypatch,db,35) == 35
+    assert db.chunks == [(START,END,1,11),(START,END,11,21),(START,END,21,31),(START,END,31,41)]
+    assert db.commits == 4
+    assert db.rollbacks == 0
+
+def test_move_rolled_back_if_backup_incomplete(monkeypatch,fake_time):
+    db = FakeDatabase(moved=[(10,10),(10,9),(10,10),(10,10)])
+    with pytest.raises(Exception,match="Only backup 9/10"):
+        _delete(monkeypatch,db,40)
+    assert db.commits == 1
+    assert db.rollbacks == 1
+    assert len(db.chunks) == 2
+
+def test_move_rolled_back_if_more_rows_deleted(monkeypatch,fake_time):
+    db = FakeDatabase(moved=[(10,10),(11,11),(10,10),(10,10)])
+    with pytest.raises(Exception,match="greater than the number of archived features"):
+        _delete(monkeypatch,db,20)
+    assert db.commits == 1
+    assert db.rollbacks == 1
+
+def test_delete_rolled_back_if_more_rows_deleted(monkeypatch,fake_time):
+    db = FakeDatabase(deleted=[10,11,10,10])
+    with pytest.raises(Exception,match="greater than the number of archived features"):
+        _delete(monkeypatch,db,20,backup_table=None)
+    assert db.commits == 1
+    assert db.rollbacks == 1
+
+def test_less_rows_deleted(monkeypatch,fake_time):
+    db = FakeDatabase(moved=[(10,10),(10,10),(10,10),(0,0)])
+    with pytest.raises(Exception,match="Only delete 30/40"):
+        _delete(monkeypatch,db,40)
+    #the deleted chunks are committed
+    assert db.commits == 4
+    assert db.rollbacks == 0
+
+def test_id_chunks(monkeypatch):
+    monkeypatch.setattr(settings,"LOGGEDPOINT_DELETE_CHUNK_BY","id")
+    monkeypatch.setattr(settings,"LOGGEDPOINT_DELETE_CHUNK_SIZE",10)
+    assert archive._get_chunks(START,END,FakeDatabase(id_range=(5,25))) == [("id",5,15),("id",15,25),("id",25,35)]
+    #the chunks cover the max id
+    chunks = archive._get_chunks(START,END,FakeDatabase(id_range=(5,24)))
+    assert chunks == [("id",5,15),("id",15,25)]
+    assert chunks[-1][2] > 24
+    assert archive._get_chunks(START,END,FakeDatabase(id_range=(7,7))) == [("id",7,17)]
+    #no loggedpoints
+    assert archive._get_chunks(START,END,FakeDatabase(id_range=(None,None))) == []
+
+def test_time_chunks(monkeypatch):
+    monkeypatch.setattr(settings,"LOGGEDPOINT_DELETE_CHUNK_BY","time")
+    monkeypatch.setattr(settings,"LOGGEDPOINT_DELETE_CHUNK_MINUTES",25)
+    end = START + timedelta(hours=1)
+    assert archive._get_chunks(START,end,FakeDatabase()) == [
+        ("seen",START,START + timedelta(minutes=25)),
+        ("seen",START + timedelta(minutes=25),START + timedelta(minutes=50)),
+        ("seen",START + timedelta(minutes=50),end)
+    ]
+
+def test_unsupported_chunk_type(monkeypatch):
+    monkeypatch.setattr(settings,"LOGGEDPOINT_DELETE_CHUNK_BY","month")
+    with pytest.raises(Exception):
+        archive._get_chunks(START,END,FakeDatabase())
+
+def test_throttle(monkeypatch,fake_time):
+    monkeypatch.setattr(settings,"LOGGEDPOINT_DELETE_CHUNK_SLEEP",1.5)
+    monkeypatch.setattr(settings,"LOGGEDPOINT_DELETE_MAX_ROWS_PER_SECOND",10)
+    db = FakeDatabase(moved=[(10,10),(10,10),(10,10),(10,10)])
+    assert _delete(monkeypatch,db,40) == 40
+    #no sleep after the last chunk
+    assert fake_time.sleeps == [1.5,2.0,3.0]
+
+def test_throttle_after_resume(monkeypatch,fake_time):
+    monkeypatch.setattr(settings,"LOGGEDPOINT_DELETE_MAX_ROWS_PER_SECOND",10)
+    db = FakeDatabase(moved=[(10,10),(10,10),(10,10),(10,10)])
+    #the rows deleted by the interrupted run are not throttled again
+    assert _delete(monkeypatch,db,1040,deleted_rows=1000) == 1040
+    assert fake_time.sleeps == [1.0,2.0,3.0]
+
+def test_resume_with_more_rows_remaining(monkeypatch,fake_time):
+    with pytest.raises(Exception):
+        _delete(monkeypatch,FakeDatabase(),40,deleted_rows=-1)
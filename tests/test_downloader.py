@@ -0,0 +1,164 @@
+import os
+import shutil
+import hashlib
+import threading
+
+import pytest
+
+from utils import compression
+
+from resource_tracking import downloader,verify
+
+def _md5(data):
+    return hashlib.md5(data).hexdigest()
+
+class FakeRepository(object):
+    """
+    A resource repository which stores the resources in a local folder
+    blocked: the resources which are downloaded after the event is set
+    """
+    def __init__(self,folder,metadatas,blocked=(),event=None):
+        self.folder = folder
+        self.metadatas = metadatas
+        self.blocked = blocked
+        self.event = event
+        self.metadata_client = self
+        self.downloaded = []
+        self._lock = threading.Lock()
+
+    def resource_metadatas(self,resource_group=None,throw_exception=True):
+        return [m for m in self.metadatas if m["resource_group"] == resource_group]
+
+    def download_resource(self,resource_group,resource_id,filename=None,overwrite=False):
+        if resource_id in self.blocked:
+            assert self.event.wait(5)
+        if os.path.exists(filename) and not overwrite:
+            raise Exception("The file({}) already exists".format(filename))
+        shutil.copyfile(os.path.join(self.folder,resource_id),filename)
+        with self._lock:
+            self.downloaded.append(resource_id)
+        return (next(m for m in self.metadatas if m["resource_id"] == resource_id),filename)
+
+DATA = {
+    "a.gpkg":b"loggedpoint a" * 100,
+    "b.gpkg":b"loggedpoint b" * 200,
+    "c.gpkg":b"loggedpoint c" * 300
+}
+
+def _repository(tmp_path,**kwargs):
+    folder = tmp_path / "storage"
+    folder.mkdir()
+    metadatas = []
+    for resource_id,data in DATA.items():
+        (folder / resource_id).write_bytes(data)
+        metadatas.append({"resource_group":"2021-03","resource_id":resource_id,"file_md5":_md5(data)})
+    work_folder = tmp_path / "work"
+    work_folder.mkdir()
+    return FakeRepository(str(folder),metadatas,**kwargs),work_folder
+
+def test_download(tmp_path):
+    repository,work_folder = _repository(tmp_path)
+    group_downloader = downloader.GroupDownloader(repository,"2021-03",str(work_folder),workers=2)
+    result = list(group_downloader.download())
+    assert sorted(os.path.basename(filename) for metadata,filename in result) == sorted(DATA.keys())
+    for metadata,filename in result:
+        with open(filename,"rb") as f:
+            assert _md5(f.read()) == metadata["file_md5"]
+    assert group_downloader.downloaded_files == 3
+    assert group_downloader.downloaded_bytes == sum(len(data) for data in DATA.values())
+    assert group_downloader.skipped_files == 0
+
+def test_yield_as_completed(tmp_path):
+    event = threading.Event()
+    repository,work_folder = _repository(tmp_path,blocked=("a.gpkg",),event=event)
+    results = downloader.GroupDownloader(repository,"2021-03",str(work_folder),workers=3).download()
+    #the first file is still downloading when the other files are yielded
+    yielded = [os.path.basename(next(results)[1]),os.path.basename(next(results)[1])]
+    assert sorted(yielded) == ["b.gpkg","c.gpkg"]
+    event.set()
+    assert [os.path.basename(filename) for metadata,filename in results] == ["a.gpkg"]
+
+def test_skip_downloaded_file(tmp_path):
+    repository,work_folder = _repository(tmp_path)
+    (work_folder / "a.gpkg").write_bytes(DATA["a.gpkg"])
+    group_downloader = downloader.GroupDownloader(repository,"2021-03",str(work_folder))
+    assert len(list(group_downloader.download())) == 3
+    assert sorted(repository.downloaded) == ["b.gpkg","c.gpkg"]
+    assert group_downloader.skipped_files == 1
+    assert group_downloader.downloaded_files == 2
+    assert group_downloader.downloaded_bytes == len(DATA["b.gpkg"]) + len(DATA["c.gpkg"])
+
+def test_changed_local_file(tmp_path):
+    repository,work_folder = _repository(tmp_path)
+    (work_folder / "a.gpkg").write_bytes(b"changed")
+    with pytest.raises(Exception):
+        list(downloader.GroupDownloader(repository,"2021-03",str(work_folder),f_filter=lambda m:m["resource_id"] == "a.gpkg").download())
+    assert repository.downloaded == []
+
+    group_downloader = downloader.GroupDownloader(repository,"2021-03",str(work_folder),overwrite=True,f_filter=lambda m:m["resource_id"] == "a.gpkg")
+    assert len(list(group_downloader.download())) == 1
+    assert (work_folder / "a.gpkg").read_bytes() == DATA["a.gpkg"]
+    assert group_downloader.downloaded_files == 1
+    assert group_downloader.skipped_files == 0
+
+def test_download_resource(tmp_path):
+    repository,work_folder = _repository(tmp_path)
+    metadata,filename = downloader.download_resource(repository,"2021-03","b.gpkg",str(work_folder))
+    assert metadata["resource_id"] == "b.gpkg"
+    assert repository.downloaded == ["b.gpkg"]
+    with pytest.raises(Exception):
+        downloader.download_resource(repository,"2021-03","d.gpkg",str(work_folder))
+
+def _compressed_repository(tmp_path,**kwargs):
+    """
+    Return a repository which stores the compressed resources
+    """
+    repository,work_folder = _repository(tmp_path)
+    for metadata in repository.metadatas:
+        filename = os.path.join(repository.folder,metadata["resource_id"])
+        uncompressed_md5,uncompressed_size,compressed_md5,compressed_size = compression.compress_file(filename,filename + ".zst")
+        os.rename(filename + ".zst",filename)
+        metadata.update(compression=compression.ZSTD,file_md5=compressed_md5,uncompressed_md5=uncompressed_md5)
+        metadata.update(kwargs)
+    return repository,work_folder
+
+def test_download_compressed(tmp_path):
+    pytest.importorskip("zstandard")
+    repository,work_folder = _compressed_repository(tmp_path)
+    group_downloader = downloader.GroupDownloader(repository,"2021-03",str(work_folder))
+    result = list(group_downloader.download())
+    for metadata,filename in result:
+        with open(filename,"rb") as f:
+            assert f.read() == DATA[metadata["resource_id"]]
+    #the downloaded bytes are the compressed bytes, and no compressed file is left
+    assert group_downloader.downloaded_bytes == sum(os.path.getsize(os.path.join(repository.folder,resource_id)) for resource_id in DATA)
+    assert sorted(os.listdir(str(work_folder))) == sorted(DATA.keys())
+
+    #the decompressed file is verified with the uncompressed md5
+    group_downloader = downloader.GroupDownloader(repository,"2021-03",str(work_folder))
+    assert len(list(group_downloader.download())) == 3
+    assert group_downloader.skipped_files == 3
+
+@pytest.mark.parametrize("md5_key",["file_md5","uncompressed_md5"])
+def test_download_corrupted_compressed(tmp_path,md5_key):
+    pytest.importorskip("zstandard")
+    repository,work_folder = _compressed_repository(tmp_path,**{md5_key:_md5(b"corrupted")})
+    with pytest.raises(Exception,match="corrupted"):
+        list(downloader.GroupDownloader(repository,"2021-03",str(work_folder),f_filter=lambda m:m["resource_id"] == "a.gpkg").download())
+
+def test_download_compressed_stream(tmp_path,monkeypatch):
+    pytest.importorskip("zstandard")
+    repository,work_folder = _compressed_repository(tmp_path)
+    def _read_chunks(metadata):
+        with open(os.path.join(repository.folder,metadata["resource_id"]),"rb") as f:
+            data = f.read()
+        return (data[i:i + 100] for i in range(0,len(data),100))
+    monkeypatch.setattr(verify,"read_chunks",_read_chunks)
+    group_downloader = downloader.GroupDownloader(repository,"2021-03",str(work_folder),stream=True)
+    result = list(group_downloader.download())
+    assert len(result) == 3
+    #the files are not downloaded through the repository
+    assert repository.downloaded == []
+    for metadata,filename in result:
+        with open(filename,"rb") as f:
+            assert f.read() == DATA[metadata["resource_id"]]
@@ -0,0 +1,107 @@
+import struct
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from utils import geoparquet,gdal
+
+def point(x,y):
+    return struct.pack("<BIdd",1,1,x,y)
+
+def point_z(x,y,z):
+    return struct.pack("<BIddd",1,1001,x,y,z)
+
+FIELDS = [("deviceid","INTEGER"),("name","TEXT"),("heading","REAL")]
+
+ROWS = [(point(1,2),1,"a",0.5),(point(3,-1),2,"b",None),(None,2,"c",1.0),(point(10,10),3,"d",2.0)]
+
+def _write(filename,rows=ROWS,**kwargs):
+    with geoparquet.GeoParquetWriter(filename,"2021-03-01",FIELDS,**kwargs) as writer:
+        writer.writemany(rows)
+    return writer.metadata
+
+def test_writer(tmp_path):
+    filename = str(tmp_path / "2021-03-01.parquet")
+    metadata = _write(filename,batch_size=3)
+    assert metadata == {
+        "layer":"2021-03-01",
+        "geometry":"POINT",
+        "features":4,
+        "geometry_column":"geom",
+        "fields":[["deviceid","Integer64","0","0"],["name","String","0","0"],["heading","Real","0","0"]],
+        "extent":[1,-1,10,10]
+    }
+    assert geoparquet.is_geoparquet(filename)
+    #the rows are written in row groups of batch_size rows
+    assert geoparquet.parquet.ParquetFile(filename).metadata.num_row_groups == 2
+
+def test_get_layers(tmp_path):
+    filename = str(tmp_path / "2021-03-01.parquet")
+    _write(filename)
+    layers = geoparquet.get_layers(filename)
+    assert layers == [{
+        "layer":"2021-03-01",
+        "geometry":"POINT",
+        "geometry_column":"geom",
+        "features":4,
+        "fields":[["deviceid","Integer64","0","0"],["name","String","0","0"],["heading","Real","0","0"]],
+        "extent":[1,-1,10,10]
+    }]
+    assert geoparquet.get_layers(filename,layer="2021-03-02") == []
+    assert gdal.get_layers(filename) == layers
+
+def test_3d_geometry(tmp_path):
+    filename = str(tmp_path / "2021-03-01.parquet")
+    _write(filename,rows=[(point_z(1,2,3),1,"a",None)])
+    assert geoparquet.get_layers(filename)[0]["geometry"] == "3DPOINT"
+
+def test_reader(tmp_path):
+    filename = str(tmp_path / "2021-03-01.parquet")
+    _write(filename,srs_id=28350)
+    with geoparquet.GeoParquetReader(filename) as reader:
+        assert reader.layer == "2021-03-01"
+        assert reader.srs_id == 28350
+        assert reader.fields == [("deviceid","INTEGER"),("name","TEXT"),("heading","REAL")]
+        assert list(reader.features(batch_size=3)) == ROWS
+        assert [row[2] for row in reader.features(bbox=[0,-2,5,5])] == ["a","b"]
+        assert sorted(reader.distinct("deviceid")) == [1,2,3]
+        assert sorted(reader.distinct("deviceid",bbox=[0,0,20,20])) == [1,3]
+        with pytest.raises(Exception):
+            list(reader.features(where="deviceid = 1"))
+
+def test_reader_filters(tmp_path):
+    filename = str(tmp_path / "2021-03-01.parquet")
+    #two row groups: deviceid 1,2 and deviceid 2,3
+    _write(filename,batch_size=2)
+    with geoparquet.GeoParquetReader(filename) as reader:
+        assert [row[2] for row in reader.features(filters=[("deviceid","=",2)])] == ["b","c"]
+        assert [row[2] for row in reader.features(filters=[("deviceid","in",[1,3])])] == ["a","d"]
+        assert [row[2] for row in reader.features(filters=[("deviceid",">=",2),("heading","<",2.0)])] == ["c"]
+        #the null values don't match any filter
+        assert [row[2] for row in reader.features(filters=[("heading",">=",0)])] == ["a","c","d"]
+        assert [row[2] for row in reader.features(bbox=[0,0,20,20],filters=[("deviceid",">",1)])] == ["d"]
+        assert sorted(reader.distinct("deviceid",filters=[("name","in",["b","d"])])) == [2,3]
+        #the values are converted to the type of the column
+        assert [row[2] for row in reader.features(filters=[("deviceid","in",["3"])])] == ["d"]
+        #the row groups are pruned with the min/max statistics
+        assert reader._get_row_groups(reader._get_filters([("deviceid",">=",3)])) == [1]
+        assert reader._get_row_groups(reader._get_filters([("deviceid","<",2)])) == [0]
+        assert reader._get_row_groups(reader._get_filters([("deviceid","in",[5,6])])) == []
+        assert list(reader.features(filters=[("deviceid","in",[5,6])])) == []
+        with pytest.raises(Exception):
+            list(reader.features(filters=[("deviceid","like","1%")]))
+
+def test_reader_missing_layer(tmp_path):
+    filename = str(tmp_path / "2021-03-01.parquet")
+    _write(filename)
+    with pytest.raises(Exception):
+        geoparquet.GeoParquetReader(filename,layer="2021-03-02")
+
+def test_writer_abort(tmp_path):
+    filename = tmp_path / "2021-03-01.parquet"
+    with pytest.raises(Exception):
+        with geoparquet.GeoParquetWriter(str(filename),"2021-03-01",FIELDS) as writer:
+            writer.write(ROWS[0])
+            raise Exception("Failed")
+    assert not filename.exists()
@@ -0,0 +1,185 @@
+import struct
+import sqlite3
+
+import pytest
+
+from utils import gpkg,gdal
+
+def point(x,y,byteorder="<"):
+    return struct.pack(byteorder + "BIdd",1 if byteorder == "<" else 0,1,x,y)
+
+def ewkb_point(x,y,srid=4326):
+    return struct.pack("<BIIdd",1,1 | 0x20000000,srid,x,y)
+
+def point_z(x,y,z):
+    return struct.pack("<BIddd",1,1001,x,y,z)
+
+def linestring(*points):
+    return struct.pack("<BII",1,2,len(points)) + b"".join(struct.pack("<dd",x,y) for x,y in points)
+
+def multipoint(*points):
+    return struct.pack("<BII",1,4,len(points)) + b"".join(point(x,y) for x,y in points)
+
+def empty_linestring():
+    return struct.pack("<BII",1,2,0)
+
+FIELDS = [("deviceid","INTEGER"),("name","TEXT")]
+
+def test_parse_wkb_type():
+    assert gpkg.parse_wkb_type(point(1,2)) == ("<",1,False,False,False)
+    assert gpkg.parse_wkb_type(point(1,2,">")) == (">",1,False,False,False)
+    assert gpkg.parse_wkb_type(point_z(1,2,3)) == ("<",1,True,False,False)
+    assert gpkg.parse_wkb_type(ewkb_point(1,2)) == ("<",1,False,False,True)
+
+def test_wkb_envelope():
+    assert gpkg.wkb_envelope(point(1,2)) == [1,1,2,2]
+    assert gpkg.wkb_envelope(point(1,2,">")) == [1,1,2,2]
+    assert gpkg.wkb_envelope(point_z(1,2,3)) == [1,1,2,2]
+    assert gpkg.wkb_envelope(linestring((1,5),(3,-2),(2,0))) == [1,3,-2,5]
+    assert gpkg.wkb_envelope(multipoint((1,5),(-3,2))) == [-3,1,2,5]
+    assert gpkg.wkb_envelope(empty_linestring()) is None
+
+def test_gpkg_geometry():
+    geometry,envelope = gpkg.to_gpkg_geometry(point(1,2),4326)
+    assert geometry[:2] == b"GP"
+    assert envelope == [1,1,2,2]
+    assert gpkg.from_gpkg_geometry(geometry) == point(1,2)
+
+    geometry,envelope = gpkg.to_gpkg_geometry(linestring((1,5),(3,-2)),4326)
+    assert envelope == [1,3,-2,5]
+    assert gpkg.from_gpkg_geometry(geometry) == linestring((1,5),(3,-2))
+    assert gpkg._get_envelope(geometry) == [1,3,-2,5]
+
+    #the srid is removed from the postgis ewkb
+    geometry,envelope = gpkg.to_gpkg_geometry(ewkb_point(1,2),4326)
+    assert gpkg.from_gpkg_geometry(geometry) == point(1,2)
+
+    geometry,envelope = gpkg.to_gpkg_geometry(empty_linestring(),4326)
+    assert envelope is None
+    assert gpkg._get_envelope(geometry) is None
+    assert gpkg.from_gpkg_geometry(None) is None
+
+def test_writer(tmp_path):
+    filename = str(tmp_path / "loggedpoint.gpkg")
+    with gpkg.GeoPackageWriter(filename,"2021-03-01",FIELDS,batch_size=2) as writer:
+        writer.write((point(1,2),1,"a"))
+        writer.writemany([(point(3,-1),2,"b"),(None,3,"c")])
+    metadata = writer.metadata
+    assert metadata["features"] == 3
+    assert metadata["geometry"] == "POINT"
+    assert metadata["extent"] == [1,-1,3,2]
+    assert metadata["fields"] == [["deviceid","Integer64","0","0"],["name","String","0","0"]]
+
+    assert gpkg.is_geopackage(filename)
+    conn = sqlite3.connect(filename)
+    try:
+        assert conn.execute("PRAGMA application_id").fetchone()[0] == gpkg.APPLICATION_ID
+        assert conn.execute("SELECT geometry_type_name,srs_id FROM gpkg_geometry_columns WHERE table_name = '2021-03-01'").fetchone() == ("POINT",4326)
+        assert conn.execute("SELECT min_x,min_y,max_x,max_y FROM gpkg_contents WHERE table_name = '2021-03-01'").fetchone() == (1,-1,3,2)
+        #the rtree index only contains the non null geometries
+        assert conn.execute("SELECT count(*) FROM {}".format(gpkg.quote(gpkg.get_rtree_table("2021-03-01","geom")))).fetchone()[0] == 2
+        assert [row[0] for row in conn.execute("SELECT name FROM \"2021-03-01\" ORDER BY fid")] == ["a","b","c"]
+    finally:
+        conn.close()
+
+def test_writer_mixed_geometry_types(tmp_path):
+    filename = str(tmp_path / "loggedpoint.gpkg")
+    with gpkg.GeoPackageWriter(filename,"layer",FIELDS,spatial_index=False) as writer:
+        writer.write((point(1,2),1,"a"))
+        writer.write((linestring((0,0),(1,1)),2,"b"))
+    assert writer.metadata["geometry"] == "GEOMETRY"
+
+def test_writer_abort(tmp_path):
+    filename = tmp_path / "loggedpoint.gpkg"
+    with pytest.raises(Exception):
+        with gpkg.GeoPackageWriter(str(filename),"layer",FIELDS) as writer:
+            writer.write((point(1,2),1,"a"))
+            raise Exception("Failed")
+    assert not filename.exists()
+
+def test_writer_unknown_srs(tmp_path):
+    with pytest.raises(Exception):
+        gpkg.GeoPackageWriter(str(tmp_path / "loggedpoint.gpkg"),"layer",FIELDS,srs_id=28350)
+
+def _write(filename,layer="2021-03-01",rows=None):
+    with gpkg.GeoPackageWriter(filename,layer,FIELDS) as writer:
+        writer.writemany(rows or [(point(1,2),1,"a"),(point(3,-1),2,"b")])
+    return writer.metadata
+
+def test_get_layers(tmp_path):
+    filename = str(tmp_path / "loggedpoint.gpkg")
+    _write(filename)
+    layers = gpkg.get_layers(filename)
+    assert layers == [{
+        "layer":"2021-03-01",
+        "geometry":"POINT",
+        "geometry_column":"geom",
+        "fid_column":"fid",
+        "fields":[["deviceid","Integer64","0","0"],["name","String","0","0"]],
+        "features":2,
+        "extent":[1,-1,3,2]
+    }]
+    assert gpkg.get_layers(filename,layer="2021-03-01") == layers
+    assert gpkg.get_layers(filename,layer="2021-03-02") == []
+
+def test_gdal_get_layers_is_cached(tmp_path,monkeypatch):
+    filename = str(tmp_path / "loggedpoint.gpkg")
+    _write(filename)
+    calls = []
+    get_layers = gpkg.get_layers
+    def _get_layers(filename,layer=None):
+        calls.append(filename)
+        return get_layers(filename,layer=layer)
+    monkeypatch.setattr(gpkg,"get_layers",_get_layers)
+    gdal._layers_cache.clear()
+
+    layers = gdal.get_layers(filename)
+    assert layers[0]["features"] == 2
+    #the cached metadata can't be changed by the caller
+    layers[0]["features"] = 0
+    assert gdal.get_layers(filename)[0]["features"] == 2
+    assert len(calls) == 1
+
+    #the cache is invalidated if the file is changed
+    _write(filename,rows=[(point(1,2),1,"a")])
+    assert gdal.get_layers(filename)[0]["features"] == 1
+    assert len(calls) == 2
+
+def test_reader(tmp_path):
+    filename = str(tmp_path / "loggedpoint.gpkg")
+    _write(filename,rows=[(point(1,2),1,"a"),(point(3,-1),2,"b"),(None,2,"c"),(point(10,10),3,"d")])
+    with gpkg.GeoPackageReader(filename) as reader:
+        assert reader.layer == "2021-03-01"
+        assert reader.fid_column == "fid"
+        assert reader.fields == [("deviceid","INTEGER"),("name","TEXT")]
+        assert reader.rtree_table
+        assert list(reader.features(batch_size=3)) == [(point(1,2),1,"a"),(point(3,-1),2,"b"),(None,2,"c"),(point(10,10),3,"d")]
+        assert [row[2] for row in reader.features(where="a.deviceid = ?",params=[2])] == ["b","c"]
+        assert [row[2] for row in reader.features(bbox=[0,-2,5,5])] == ["a","b"]
+        assert sorted(reader.distinct("deviceid",bbox=[0,0,20,20])) == [1,3]
+
+def test_reader_filters(tmp_path):
+    filename = str(tmp_path / "loggedpoint.gpkg")
+    _write(filename,rows=[(point(1,2),1,"a"),(point(3,-1),2,"b"),(None,2,"c"),(point(10,10),3,"d")])
+    with gpkg.GeoPackageReader(filename) as reader:
+        assert [row[2] for row in reader.features(filters=[("deviceid","in",[1,3])])] == ["a","d"]
+        assert [row[2] for row in reader.features(filters=[("deviceid",">=",2),("name","<","d")])] == ["b","c"]
+        assert [row[2] for row in reader.features(where="a.name <> ?",params=["b"],bbox=[0,-2,20,20],filters=[("deviceid","<",3)])] == ["a"]
+        assert sorted(reader.distinct("deviceid",filters=[("name","=","d")])) == [3]
+        with pytest.raises(Exception):
+            list(reader.features(filters=[("deviceid","like","1%")]))
+
+def test_reader_without_spatial_index(tmp_path):
+    filename = str(tmp_path / "loggedpoint.gpkg")
+    with gpkg.GeoPackageWriter(filename,"layer",FIELDS,spatial_index=False) as writer:
+        writer.writemany([(point(1,2),1,"a"),(linestring((5,5),(8,9)),2,"b")])
+    with gpkg.GeoPackageReader(filename,layer="layer") as reader:
+        assert reader.rtree_table is None
+        assert [row[2] for row in reader.features(bbox=[6,6,7,7])] == ["b"]
+        assert [row[2] for row in reader.features(bbox=[20,20,30,30])] == []
+
+def test_reader_missing_layer(tmp_path):
+    filename = str(tmp_path / "loggedpoint.gpkg")
+    _write(filename)
+    with pytest.raises(Exception):
+        gpkg.GeoPackageReader(filename,layer="2021-03-02")
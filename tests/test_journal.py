@@ -0,0 +1,134 @@
+import os
+import time
+
+import utils
+from utils import timezone
+
+from resource_tracking import journal,settings
+
+def _export_result(work_folder,resource_id="2021-03-01.gpkg"):
+    filename = os.path.join(work_folder,"loggedpoint.gpkg")
+    with open(filename,"wb") as f:
+        f.write(b"loggedpoint")
+    return {
+        "archive_group":"2021-03",
+        "archive_id":"2021-03-01",
+        "start_date":timezone.datetime(2021,3,1),
+        "end_date":timezone.datetime(2021,3,2),
+        "work_folder":work_folder,
+        "metadata":{"resource_id":resource_id,"resource_group":"2021-03","file_md5":utils.file_md5(filename),"start_archive":timezone.now()},
+        "layer_metadata":{"layer":"2021-03-01","features":10},
+        "filename":filename
+    }
+
+def _set_modified(path,modified):
+    for root,dirs,files in os.walk(path):
+        for name in dirs + files:
+            os.utime(os.path.join(root,name),(modified,modified))
+    os.utime(path,(modified,modified))
+
+def test_resume(tmp_path):
+    folder = str(tmp_path)
+    archive_journal = journal.ArchiveJournal("2021-03-01",folder=folder)
+    archive_journal.exported(_export_result(archive_journal.work_folder))
+    archive_journal.done(journal.STAGE_UPLOADED,file_md5="abc")
+
+    archive_journal = journal.ArchiveJournal("2021-03-01",folder=folder)
+    assert archive_journal.is_done(journal.STAGE_UPLOADED)
+    assert not archive_journal.is_done(journal.STAGE_VERIFIED)
+    export_result = archive_journal.get_export_result("2021-03-01.gpkg")
+    assert export_result["start_date"] == timezone.datetime(2021,3,1)
+    assert export_result["layer_metadata"]["features"] == 10
+
+def test_resume_removes_stale_files(tmp_path):
+    archive_journal = journal.ArchiveJournal("2021-03-01",folder=str(tmp_path))
+    archive_journal.exported(_export_result(archive_journal.work_folder))
+    #the downloaded file of an interrupted check
+    os.makedirs(os.path.join(archive_journal.work_folder,"check"))
+    with open(os.path.join(archive_journal.work_folder,"check","loggedpoint.gpkg"),"wb") as f:
+        f.write(b"loggedpoint")
+
+    archive_journal = journal.ArchiveJournal("2021-03-01",folder=str(tmp_path))
+    assert archive_journal.get_export_result("2021-03-01.gpkg")
+    assert os.listdir(archive_journal.work_folder) == ["loggedpoint.gpkg"]
+
+def test_changed_export_file(tmp_path):
+    archive_journal = journal.ArchiveJournal("2021-03-01",folder=str(tmp_path))
+    export_result = _export_result(archive_journal.work_folder)
+    archive_journal.exported(export_result)
+    with open(export_result["filename"],"wb") as f:
+        f.write(b"changed")
+
+    archive_journal = journal.ArchiveJournal("2021-03-01",folder=str(tmp_path))
+    assert archive_journal.get_export_result("2021-03-01.gpkg") is None
+    assert not archive_journal.is_done(journal.STAGE_EXPORTED)
+    assert os.listdir(archive_journal.work_folder) == []
+
+def test_changed_archive_format(tmp_path):
+    archive_journal = journal.ArchiveJournal("2021-03-01",folder=str(tmp_path))
+    archive_journal.exported(_export_result(archive_journal.work_folder))
+    archive_journal = journal.ArchiveJournal("2021-03-01",folder=str(tmp_path))
+    assert archive_journal.get_export_result("2021-03-01.parquet") is None
+    assert archive_journal.data["stages"] == {}
+
+def test_interrupted_export_is_removed(tmp_path):
+    archive_journal = journal.ArchiveJournal("2021-03-01",folder=str(tmp_path))
+    with open(os.path.join(archive_journal.work_folder,"loggedpoint.gpkg"),"wb") as f:
+        f.write(b"partial")
+    assert archive_journal.get_export_result("2021-03-01.gpkg") is None
+    assert os.listdir(archive_journal.work_folder) == []
+
+def test_reset_from_stage(tmp_path):
+    archive_journal = journal.ArchiveJournal("2021-03-01",folder=str(tmp_path))
+    archive_journal.exported(_export_result(archive_journal.work_folder))
+    archive_journal.done(journal.STAGE_UPLOADED,file_md5="abc")
+    archive_journal.done(journal.STAGE_VERIFIED)
+    archive_journal.reset(journal.STAGE_UPLOADED)
+    assert list(archive_journal.data["stages"].keys()) == [journal.STAGE_EXPORTED]
+
+def test_corrupted_journal(tmp_path):
+    with open(str(tmp_path / "2021-03-01.json"),"w") as f:
+        f.write("{")
+    archive_journal = journal.ArchiveJournal("2021-03-01",folder=str(tmp_path))
+    assert archive_journal.data == {"archive_id":"2021-03-01","stages":{}}
+
+def test_clear(tmp_path):
+    archive_journal = journal.ArchiveJournal("2021-03-01",folder=str(tmp_path))
+    archive_journal.exported(_export_result(archive_journal.work_folder))
+    archive_journal.clear()
+    assert os.listdir(str(tmp_path)) == []
+
+def test_cleanup(tmp_path):
+    folder = str(tmp_path)
+    expired = time.time() - 10 * 86400
+    #an expired journal
+    archive_journal = journal.ArchiveJournal("2021-03-01",folder=folder)
+    archive_journal.exported(_export_result(archive_journal.work_folder))
+    _set_modified(archive_journal.work_folder,expired)
+    os.utime(archive_journal.filename,(expired,expired))
+    #an expired work folder without journal
+    archive_journal = journal.ArchiveJournal("2021-03-02",folder=folder)
+    _set_modified(archive_journal.work_folder,expired)
+    #a recent journal
+    archive_journal = journal.ArchiveJournal("2021-03-03",folder=folder)
+    archive_journal.exported(_export_result(archive_journal.work_folder))
+    #an expired journal with a recently changed work folder
+    archive_journal = journal.ArchiveJournal("2021-03-04",folder=folder)
+    archive_journal.exported(_export_result(archive_journal.work_folder))
+    os.utime(archive_journal.filename,(expired,expired))
+
+    assert journal.cleanup(folder=folder,max_age=0) == []
+    assert journal.cleanup(folder=folder,max_age=7) == ["2021-03-01","2021-03-02"]
+    assert sorted(os.listdir(folder)) == ["2021-03-03","2021-03-03.json","2021-03-04","2021-03-04.json"]
+
+def test_get_journal_cleans_up_once(tmp_path,monkeypatch):
+    monkeypatch.setattr(settings,"LOGGEDPOINT_JOURNAL_ENABLED",True)
+    monkeypatch.setattr(settings,"LOGGEDPOINT_JOURNAL_DIR",str(tmp_path))
+    monkeypatch.setattr(journal,"_cleaned",False)
+    calls = []
+    monkeypatch.setattr(journal,"cleanup",lambda: calls.append(1))
+    assert journal.get_journal("2021-03-01").work_folder == str(tmp_path / "2021-03-01")
+    journal.get_journal("2021-03-02")
+    assert calls == [1]
+    monkeypatch.setattr(settings,"LOGGEDPOINT_JOURNAL_ENABLED",False)
+    assert journal.get_journal("2021-03-03") is None
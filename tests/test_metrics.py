@@ -0,0 +1,63 @@
+from resource_tracking import metrics,catalog,settings
+
+def _metadata():
+    return {"resource_group":"2021-03","resource_id":"2021-03-01.gpkg"}
+
+def test_add_stage():
+    metadata = _metadata()
+    archive_metrics = metrics.ArchiveMetrics(metadata)
+    archive_metrics.add("export",2,rows=100,bytes=1000)
+    archive_metrics.add("vrt",0.5)
+    #the stages are kept in the archive metadata
+    assert metadata[metrics.METADATA_KEY]["export"] == {"seconds":2,"rows":100,"rows_per_second":50.0,"bytes":1000,"bytes_per_second":500.0}
+    assert metadata[metrics.METADATA_KEY]["vrt"] == {"seconds":0.5}
+    assert archive_metrics.seconds == 2.5
+
+def test_measure_not_recorded_on_exception():
+    archive_metrics = metrics.ArchiveMetrics(_metadata())
+    try:
+        with archive_metrics.measure("verify"):
+            raise Exception("Failed")
+    except Exception:
+        pass
+    assert archive_metrics.stages == {}
+
+def test_resumed_stages():
+    metadata = _metadata()
+    metrics.ArchiveMetrics(metadata).add("export",1)
+    archive_metrics = metrics.ArchiveMetrics(metadata)
+    archive_metrics.add("delete",2,rows=10)
+    assert list(archive_metrics.stages.keys()) == ["export","delete"]
+
+def test_finish(tmp_path,monkeypatch):
+    textfile = str(tmp_path / "metrics" / "loggedpoint.prom")
+    monkeypatch.setattr(settings,"LOGGEDPOINT_METRICS_TEXTFILE",textfile)
+    archive_metrics = metrics.ArchiveMetrics(_metadata())
+    archive_metrics.add("export",1,rows=100)
+    archive_metrics.add("delete",2,rows=100)
+    totals = archive_metrics.finish()
+    assert totals["seconds"] == 3
+    assert list(totals["stages"].keys()) == ["export","delete"]
+    with open(textfile) as f:
+        content = f.read()
+    assert 'loggedpoint_archive_stage_seconds{stage="delete"} 2' in content
+    assert 'loggedpoint_archive_stage_rows{stage="export"} 100' in content
+
+def test_catalog_metrics(tmp_path):
+    archive_catalog = catalog.ArchiveCatalog(str(tmp_path / "catalog.sqlite"))
+    try:
+        archive_metrics = metrics.ArchiveMetrics(_metadata())
+        archive_metrics.add("upload",1)
+        archive_metrics.add("backup_delete",2,rows=100)
+        totals = archive_metrics.finish()
+        assert archive_catalog.get_metrics("2021-03","2021-03-01.gpkg") is None
+        archive_catalog.set_metrics("2021-03","2021-03-01.gpkg",totals["seconds"],totals["stages"])
+        saved = archive_catalog.get_metrics("2021-03","2021-03-01.gpkg")
+        assert saved["seconds"] == 3
+        assert saved["stages"]["backup_delete"]["rows"] == 100
+        assert saved["archived"] is not None
+        #the metrics are removed with the resource
+        archive_catalog.remove("2021-03","2021-03-01.gpkg")
+        assert archive_catalog.get_metrics("2021-03","2021-03-01.gpkg") is None
+    finally:
+        archive_catalog.close()
@@ -0,0 +1,82 @@
+from datetime import date
+
+import pytest
+
+from db import exceptions
+from utils import timezone
+
+from resource_tracking import partition
+
+class FakeDatabase(object):
+    """
+    A database which returns the configured rows of the queries and records the executed ddls.
+    get raises DataNotExist if no row is returned, same as PostgreSQL.get
+    """
+    def __init__(self,partition_key=None,partitions=None,rows=None):
+        self.partition_key = partition_key
+        self.partitions = partitions or []
+        self.rows = list(rows or [])
+        self.ddls = []
+
+    def query(self,sql,**kwargs):
+        if sql == partition.partition_key_sql:
+            return [(self.partition_key,)] if self.partition_key else []
+        elif sql == partition.partitions_sql:
+            return self.partitions
+        raise Exception("Unexpected sql: {}".format(sql))
+
+    def get(self,sql,**kwargs):
+        rows = self.query(sql) if sql in (partition.partition_key_sql,partition.partitions_sql) else [(self.rows.pop(0),)]
+        if not rows:
+            raise exceptions.DataNotExist()
+        return rows[0]
+
+    def executeDDL(self,sql):
+        self.ddls.append(sql)
+
+def test_is_partitioned_not_partitioned():
+    assert partition.is_partitioned(FakeDatabase()) is False
+
+def test_is_partitioned_by_seen():
+    assert partition.is_partitioned(FakeDatabase(partition_key=partition.PARTITION_KEY)) is True
+
+def test_is_partitioned_by_other_key():
+    assert partition.is_partitioned(FakeDatabase(partition_key="RANGE (id)")) is False
+
+def test_get_partitions_and_days():
+    start = timezone.datetime(2021,3,1)
+    end = timezone.datetime(2021,3,4)
+    db = FakeDatabase(partitions=[("tracking_loggedpoint_p1",start,end)])
+    p = partition.get_partitions(db)[0]
+    assert p.name == "tracking_loggedpoint_p1"
+    assert partition.is_day_aligned(p)
+    assert partition.get_days(p) == [date(2021,3,1),date(2021,3,2),date(2021,3,3)]
+
+def test_is_day_aligned():
+    p = partition.Partition("p",timezone.datetime(2021,3,1,12),timezone.datetime(2021,3,2))
+    assert not partition.is_day_aligned(p)
+
+def _partition():
+    return partition.Partition("p1",timezone.datetime(2021,3,1),timezone.datetime(2021,3,2))
+
+def test_detach_and_drop():
+    db = FakeDatabase(rows=[10,10])
+    partition.detach(db,_partition(),10)
+    assert db.ddls == [partition.detach_partition_sql.format("p1"),partition.drop_partition_sql.format("p1")]
+
+def test_detach_and_move():
+    db = FakeDatabase(rows=[10,10])
+    partition.detach(db,_partition(),10,backup_schema="backup")
+    assert db.ddls[1:] == [sql.format("p1","backup") for sql in partition.move_partition_sqls]
+
+def test_detach_mismatched_rows():
+    db = FakeDatabase(rows=[9])
+    with pytest.raises(Exception):
+        partition.detach(db,_partition(),10)
+    assert db.ddls == []
+
+def test_detach_keeps_changed_table():
+    db = FakeDatabase(rows=[10,11])
+    with pytest.raises(Exception):
+        partition.detach(db,_partition(),10)
+    assert db.ddls == [partition.detach_partition_sql.format("p1")]
@@ -0,0 +1,91 @@
+import io
+import struct
+from datetime import datetime,date
+
+from db import pgcopy
+
+def _point(x,y):
+    return struct.pack("<BIdd",1,1,x,y)
+
+def _decode(data):
+    """
+    Decode the postgresql binary copy data into a list of rows, each value is the raw bytes of the field
+    """
+    assert data[:len(pgcopy.BINARY_HEADER)] == pgcopy.BINARY_HEADER
+    offset = len(pgcopy.BINARY_HEADER)
+    rows = []
+    while True:
+        columns = struct.unpack_from("!h",data,offset)[0]
+        offset += 2
+        if columns == -1:
+            break
+        row = []
+        for i in range(columns):
+            size = struct.unpack_from("!i",data,offset)[0]
+            offset += 4
+            if size == -1:
+                row.append(None)
+            else:
+                row.append(data[offset:offset + size])
+                offset += size
+        rows.append(row)
+    assert offset == len(data)
+    return rows
+
+def test_binary_copy_stream():
+    rows = [(1,"a",1.5,True,_point(1,2)),(2,None,-2.0,False,None)]
+    stream = pgcopy.BinaryCopyStream(rows,["int4","text","float8","bool","geometry"])
+    data = stream.read()
+    assert stream.rows == 2
+    decoded = _decode(data)
+    assert decoded[0] == [struct.pack("!i",1),b"a",struct.pack("!d",1.5),b"\x01",_point(1,2)]
+    assert decoded[1] == [struct.pack("!i",2),None,struct.pack("!d",-2.0),b"\x00",None]
+    #the stream is exhausted
+    assert stream.read() == b""
+
+def test_binary_copy_stream_small_reads():
+    rows = [(i,"row{}".format(i)) for i in range(100)]
+    expected = pgcopy.BinaryCopyStream(rows,["int8","varchar"]).read()
+    stream = pgcopy.BinaryCopyStream(iter(rows),["int8","varchar"])
+    #psycopg2 reads the file in blocks through 'read', io.BufferedReader reads through 'readinto'
+    data = b"".join(iter(lambda:stream.read(7),b""))
+    assert data == expected
+    assert io.BufferedReader(pgcopy.BinaryCopyStream(rows,["int8","varchar"]),buffer_size=16).read() == expected
+
+def test_empty_binary_copy_stream():
+    assert pgcopy.BinaryCopyStream([],["int4"]).read() == pgcopy.BINARY_HEADER + pgcopy.BINARY_TRAILER
+
+def test_to_ewkb():
+    ewkb = pgcopy.to_ewkb(_point(1,2),4326)
+    assert struct.unpack_from("<II",ewkb,1) == (1 | 0x20000000,4326)
+    assert ewkb[9:] == _point(1,2)[5:]
+    #no srid, or already has srid
+    assert pgcopy.to_ewkb(_point(1,2),None) == _point(1,2)
+    assert pgcopy.to_ewkb(ewkb,4326) == ewkb
+    #iso point z is converted to ewkb point with z flag
+    point_z = struct.pack("<BIddd",1,1001,1,2,3)
+    assert struct.unpack_from("<I",pgcopy.to_ewkb(point_z,4326),1)[0] == 1 | 0x80000000 | 0x20000000
+    #big endian
+    point = struct.pack(">BIdd",0,1,1,2)
+    assert struct.unpack_from(">Ii",pgcopy.to_ewkb(point,4326),1) == (1 | 0x20000000,4326)
+
+def test_text_copy_stream():
+    rows = [
+        (1,"a\tb\nc\\d",True,None),
+        (2,b"\x01\xff",False,{"speed":1}),
+        (3,datetime(2021,3,1,8,30),date(2021,3,1),1.5)
+    ]
+    stream = pgcopy.TextCopyStream(rows)
+    assert stream.read() == (
+        "1\ta\\tb\\nc\\\\d\tt\t\\N\n"
+        "2\t\\\\x01ff\tf\t{\"speed\": 1}\n"
+        "3\t2021-03-01T08:30:00\t2021-03-01\t1.5\n"
+    ).encode()
+    assert stream.rows == 3
+    assert stream.read() == b""
+
+def test_text_copy_stream_small_reads():
+    rows = [(i,"row{}".format(i)) for i in range(100)]
+    expected = b"".join(pgcopy.encode_text_row(row) for row in rows)
+    stream = pgcopy.TextCopyStream(iter(rows))
+    assert b"".join(iter(lambda:stream.read(7),b"")) == expected
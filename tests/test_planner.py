@@ -0,0 +1,99 @@
+from datetime import date,timedelta
+
+import pytest
+
+from utils import timezone
+
+from resource_tracking import planner,settings
+
+class FakeDatabase(object):
+    """
+    A database which returns the configured day counts, histogram and statistics of table tracking_loggedpoint
+    """
+    def __init__(self,day_rows=None,earliest_seen=None,histogram=None,null_frac=0,reltuples=0):
+        self.day_rows = day_rows or []
+        self.earliest_seen = earliest_seen
+        self.histogram = histogram
+        self.null_frac = null_frac
+        self.reltuples = reltuples
+
+    def query(self,sql,**kwargs):
+        if sql.startswith("SELECT date_trunc('day'"):
+            return self.day_rows
+        elif sql == planner.seen_histogram_sql:
+            return [(self.null_frac,self.histogram)] if self.histogram is not None else []
+        raise Exception("Unexpected sql: {}".format(sql))
+
+    def get(self,sql,**kwargs):
+        if sql == planner.earliest_seen_sql:
+            return (self.earliest_seen,)
+        elif sql == planner.reltuples_sql:
+            return (self.reltuples,)
+        raise Exception("Unexpected sql: {}".format(sql))
+
+@pytest.fixture(autouse=True)
+def no_catalog(monkeypatch):
+    monkeypatch.setattr(settings,"LOGGEDPOINT_CATALOG_ENABLED",False)
+
+def test_exact_plan():
+    days = [(date(2021,3,1),100),(date(2021,3,3),300)]
+    archive_plan = planner.get_plan(date(2021,3,5),mode=planner.PLANNER_EXACT,db=FakeDatabase(day_rows=days))
+    assert archive_plan.days == days
+    assert archive_plan.rows == 400
+    assert archive_plan.bytes == 400 * settings.LOGGEDPOINT_ARCHIVE_BYTES_PER_ROW
+    assert archive_plan.eta() is None
+
+def test_cheap_plan():
+    #4 buckets of 250 rows, the first two buckets are in the first day
+    histogram = [
+        timezone.datetime(2021,3,1),
+        timezone.datetime(2021,3,1,12),
+        timezone.datetime(2021,3,2),
+        timezone.datetime(2021,3,2,12),
+        timezone.datetime(2021,3,3)
+    ]
+    db = FakeDatabase(earliest_seen=timezone.datetime(2021,3,1,1),histogram=histogram,reltuples=1000)
+    archive_plan = planner.get_plan(date(2021,3,4),mode=planner.PLANNER_CHEAP,db=db)
+    #every day from the earliest loggedpoint is planned
+    assert archive_plan.days == [(date(2021,3,1),500),(date(2021,3,2),500),(date(2021,3,3),0)]
+
+def test_cheap_plan_bucket_across_days():
+    histogram = [timezone.datetime(2021,3,1,12),timezone.datetime(2021,3,2,12)]
+    db = FakeDatabase(earliest_seen=timezone.datetime(2021,3,1,12),histogram=histogram,null_frac=0.5,reltuples=1000)
+    assert planner.get_plan(date(2021,3,3),mode=planner.PLANNER_CHEAP,db=db).days == [(date(2021,3,1),250),(date(2021,3,2),250)]
+
+def test_cheap_plan_empty_table():
+    assert planner.get_plan(date(2021,3,3),mode=planner.PLANNER_CHEAP,db=FakeDatabase()).days == []
+
+def test_cheap_plan_without_statistics():
+    with pytest.raises(Exception):
+        planner.get_plan(date(2021,3,3),mode=planner.PLANNER_CHEAP,db=FakeDatabase(earliest_seen=timezone.datetime(2021,3,1)))
+
+def test_unsupported_planner():
+    with pytest.raises(Exception):
+        planner.get_plan(date(2021,3,3),mode="fast",db=FakeDatabase())
+
+def test_budget():
+    archive_plan = planner.ArchivePlan([(date(2021,3,d),100 * d) for d in range(1,6)],planner.PLANNER_EXACT,bytes_per_row=10)
+    assert len(archive_plan.budget()) == 5
+    assert len(archive_plan.budget(max_days=2)) == 2
+    assert archive_plan.budget(max_rows=600) == [(date(2021,3,1),100),(date(2021,3,2),200),(date(2021,3,3),300)]
+    assert len(archive_plan.budget(max_bytes=3000)) == 2
+    #at least one day is returned
+    assert archive_plan.budget(max_rows=1) == [(date(2021,3,1),100)]
+    assert planner.ArchivePlan([],planner.PLANNER_EXACT).budget(max_days=1) == []
+
+def test_throughput():
+    end_archive = timezone.datetime(2021,3,2)
+    metadatas = [
+        {"features":1000,"file_size":50000,"start_archive":end_archive - timedelta(seconds=10),"end_archive":end_archive},
+        {"features":3000,"file_size":150000,"start_archive":(end_archive - timedelta(seconds=30)).isoformat(),"end_archive":end_archive.isoformat()},
+        #the files without archiving history are ignored
+        {"features":3000,"file_size":150000}
+    ]
+    assert planner.get_throughput(metadatas) == (100,50)
+    assert planner.get_throughput([]) == (None,None)
+
+    archive_plan = planner.ArchivePlan([(date(2021,3,1),1000)],planner.PLANNER_EXACT,rows_per_second=100)
+    assert archive_plan.eta() == 10
+    assert archive_plan.eta(rows=500) == 5
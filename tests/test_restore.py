@@ -0,0 +1,179 @@
+import os
+import shutil
+import struct
+from datetime import timedelta
+
+import pytest
+
+pytest.importorskip("data_storage")
+
+from utils import timezone,gpkg,geoparquet
+
+from resource_tracking import archive,loader,catalog,settings
+
+def point(x,y):
+    return struct.pack("<BIdd",1,1,x,y)
+
+FIELDS = [("deviceid","TEXT"),("seen","INTEGER"),("name","TEXT")]
+
+def _seen(*args):
+    return int(timezone.datetime(*args).timestamp())
+
+#the archived loggedpoints of each day
+DAYS = {
+    "2021-03-01":[(point(1,1),"d1",_seen(2021,3,1,9),"a"),(point(2,2),"d1",_seen(2021,3,1,11),"b"),(point(50,50),"d2",_seen(2021,3,1,12),"c")],
+    "2021-03-02":[(point(3,3),"d2",_seen(2021,3,2,8),"d"),(point(4,4),"d3",_seen(2021,3,2,11),"e"),(point(5,5),"d1",_seen(2021,3,2,13),"f")],
+    "2021-03-03":[(point(6,6),"d1",_seen(2021,3,3,8),"g")]
+}
+
+def _metadata(archive_id,**kwargs):
+    start_date = timezone.datetime(*[int(v) for v in archive_id.split("-")])
+    metadata = {
+        "resource_group":"2021-03",
+        "resource_id":"{}.gpkg".format(archive_id),
+        "start_archive_date":start_date.isoformat(),
+        "end_archive_date":(start_date + timedelta(days=1)).isoformat(),
+        "features":10,
+        "extent":[0,0,10,10]
+    }
+    metadata.update(kwargs)
+    return metadata
+
+class FakeBlobResource(object):
+    """
+    A resource repository which stores the archived files in a local folder
+    """
+    def __init__(self,folder,metadatas):
+        self.folder = folder
+        self.metadatas = metadatas
+        self.metadata_client = self
+        self.downloaded = []
+
+    def resource_metadatas(self,resource_group=None,throw_exception=True):
+        return [m for m in self.metadatas if m["resource_group"] == resource_group]
+
+    def download_resource(self,resource_group,resource_id,filename=None,overwrite=False):
+        self.downloaded.append(resource_id)
+        shutil.copyfile(os.path.join(self.folder,resource_id),filename)
+        return (next(m for m in self.metadatas if m["resource_id"] == resource_id),filename)
+
+class FakeDatabase(object):
+    """
+    A database which counts the rows copied into each table
+    """
+    def __init__(self):
+        self.rows = {}
+
+    def clone(self):
+        return self
+
+    def executeDDL(self,sql):
+        pass
+
+    def copy_from(self,table,f,columns=None,format="binary"):
+        while f.read(65536):
+            pass
+        self.rows[table] = self.rows.get(table,0) + f.rows
+
+def _archive(folder,archive_format):
+    """
+    Write the archived files of the days and return their resource metadata
+    """
+    metadatas = []
+    for archive_id,rows in DAYS.items():
+        resource_id = archive.get_archive_resource_id(archive_id,archive_format)
+        filename = os.path.join(folder,resource_id)
+        if archive_format == archive.ARCHIVE_FORMAT_GPKG:
+            writer = gpkg.GeoPackageWriter(filename,archive_id,FIELDS)
+        else:
+            writer = geoparquet.GeoParquetWriter(filename,archive_id,FIELDS,batch_size=2)
+        with writer:
+            writer.writemany(rows)
+        metadatas.append(_metadata(archive_id,resource_id=resource_id,features=len(rows),extent=writer.metadata["extent"]))
+    return metadatas
+
+@pytest.fixture
+def restore_env(tmp_path,monkeypatch):
+    """
+    Return a function to archive the days in the archive format and return the fake blob resource
+    """
+    monkeypatch.setattr(catalog,"get_catalog",lambda:None)
+    db = FakeDatabase()
+    monkeypatch.setattr(settings,"DATABASE",db)
+    def _prepare(archive_format):
+        folder = str(tmp_path / "storage")
+        os.makedirs(folder)
+        blob_resource = FakeBlobResource(folder,_archive(folder,archive_format))
+        monkeypatch.setattr(archive,"get_blob_resource",lambda:blob_resource)
+        return blob_resource,db
+    return _prepare
+
+START = timezone.datetime(2021,3,1,10)
+END = timezone.datetime(2021,3,2,12)
+
+def test_is_restore_required():
+    assert archive._is_restore_required(_metadata("2021-03-01"),START,END)
+    assert archive._is_restore_required(_metadata("2021-03-02"),START,END)
+    #outside of the time window
+    assert not archive._is_restore_required(_metadata("2021-02-28"),START,END)
+    assert not archive._is_restore_required(_metadata("2021-03-02"),START,timezone.datetime(2021,3,2))
+    assert not archive._is_restore_required(_metadata("2021-03-03"),START,END)
+    #no loggedpoints
+    assert not archive._is_restore_required(_metadata("2021-03-01",features=0),START,END)
+    #the features are unknown
+    assert archive._is_restore_required(_metadata("2021-03-01",features=None),START,END)
+    #not an archived file
+    assert not archive._is_restore_required(_metadata("2021-03-01",resource_id="loggedpoint2021-03.vrt"),START,END)
+
+def test_is_restore_required_bbox():
+    metadata = _metadata("2021-03-01",extent=[0,0,10,10])
+    assert archive._is_restore_required(metadata,START,END,bbox=[5,5,20,20])
+    assert archive._is_restore_required(metadata,START,END,bbox=[10,10,20,20])
+    assert not archive._is_restore_required(metadata,START,END,bbox=[11,0,20,10])
+    assert not archive._is_restore_required(metadata,START,END,bbox=[0,-5,10,-1])
+    #the file without extent is always restored
+    del metadata["extent"]
+    assert archive._is_restore_required(metadata,START,END,bbox=[11,0,20,10])
+
+def _restored_names(filename,kwargs):
+    """
+    Return the names of the loggedpoints read from the archived file with the filter built by 'restore'
+    """
+    with loader._open_reader(filename) as reader:
+        name_index = [name for name,field_type in reader.fields].index("name") + 1
+        return [row[name_index] for row in reader.features(**kwargs)]
+
+@pytest.mark.parametrize("archive_format",[archive.ARCHIVE_FORMAT_GPKG,archive.ARCHIVE_FORMAT_PARQUET])
+def test_restore(tmp_path,monkeypatch,restore_env,archive_format):
+    if archive_format == archive.ARCHIVE_FORMAT_PARQUET:
+        pytest.importorskip("pyarrow")
+    blob_resource,db = restore_env(archive_format)
+    #keep the downloaded files to check the filter
+    calls = []
+    load_files = loader.load_files
+    def _load_files(files,**kwargs):
+        files = list(files)
+        for f in files:
+            shutil.copyfile(f,str(tmp_path / os.path.basename(f)))
+        calls.append(([os.path.basename(f) for f in files],kwargs))
+        return load_files(files,**kwargs)
+    monkeypatch.setattr(loader,"load_files",_load_files)
+
+    table,rows = archive.restore(START,END,deviceids=["d1","d3"],bbox=[0,0,10,10],table="restored")
+    #the file of 2021-03-03 is out of the time window
+    assert sorted(blob_resource.downloaded) == [archive.get_archive_resource_id(d,archive_format) for d in ("2021-03-01","2021-03-02")]
+    assert table == "restored"
+    assert rows == 2
+    assert db.rows == {"restored":2}
+
+    files,kwargs = calls[0]
+    kwargs = {k:v for k,v in kwargs.items() if k in ("where","params","bbox","filters")}
+    names = []
+    for f in sorted(files):
+        names.extend(_restored_names(str(tmp_path / f),kwargs))
+    assert names == ["b","e"]
+
+def test_restore_without_bbox(restore_env):
+    blob_resource,db = restore_env(archive.ARCHIVE_FORMAT_GPKG)
+    table,rows = archive.restore(START,END,table="restored")
+    assert rows == 4
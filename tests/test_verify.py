@@ -0,0 +1,110 @@
+import os
+import shutil
+import hashlib
+
+import pytest
+
+from utils import compression
+
+from resource_tracking import verify,settings
+
+class FakeRepository(object):
+    """
+    A resource repository which stores the resources in a local folder
+    """
+    def __init__(self,folder):
+        self.folder = folder
+
+    def download_resource(self,resource_group,resource_id,filename=None,overwrite=False):
+        shutil.copyfile(os.path.join(self.folder,resource_id),filename)
+        return ({"resource_group":resource_group,"resource_id":resource_id},filename)
+
+def _md5(data):
+    return hashlib.md5(data).hexdigest()
+
+def test_get_check_mode():
+    assert verify.get_check_mode(False) is None
+    assert verify.get_check_mode(verify.CHECK_QUICK) == verify.CHECK_QUICK
+    assert verify.get_check_mode(verify.CHECK_FULL) == verify.CHECK_FULL
+    assert verify.get_check_mode(True) == settings.LOGGEDPOINT_CHECK_MODE
+
+def test_sample_ranges_small_file():
+    assert verify._get_sample_ranges(0,3) == []
+    assert verify._get_sample_ranges(100,3) == [(0,100)]
+
+def test_sample_ranges_large_file():
+    size = verify.SAMPLE_SIZE * 100
+    ranges = verify._get_sample_ranges(size,3)
+    assert len(ranges) == 5
+    assert ranges[0] == (0,verify.SAMPLE_SIZE)
+    assert ranges[-1] == (size - verify.SAMPLE_SIZE,verify.SAMPLE_SIZE)
+    assert ranges == sorted(ranges)
+    assert all(offset >= 0 and offset + length <= size for offset,length in ranges)
+
+def test_full_check(tmp_path):
+    data = b"loggedpoint" * 100
+    (tmp_path / "a.gpkg").write_bytes(data)
+    work_folder = tmp_path / "work"
+    work_folder.mkdir()
+    metadata = {"resource_group":"2021-03","resource_id":"a.gpkg","file_md5":_md5(data)}
+    verify.full_check(FakeRepository(str(tmp_path)),metadata,str(work_folder))
+    #the downloaded file is removed
+    assert os.listdir(str(work_folder)) == []
+
+def test_full_check_corrupted(tmp_path):
+    (tmp_path / "a.gpkg").write_bytes(b"corrupted")
+    work_folder = tmp_path / "work"
+    work_folder.mkdir()
+    metadata = {"resource_group":"2021-03","resource_id":"a.gpkg","file_md5":_md5(b"loggedpoint")}
+    with pytest.raises(Exception):
+        verify.full_check(FakeRepository(str(tmp_path)),metadata,str(work_folder))
+
+def test_download_decompressed(tmp_path):
+    data = b"loggedpoint" * 1000
+    filename = str(tmp_path / "a.gpkg")
+    with open(filename,"wb") as f:
+        f.write(data)
+    uncompressed_md5,uncompressed_size,compressed_md5,compressed_size = compression.compress_file(filename,filename + ".zst")
+    os.rename(filename + ".zst",str(tmp_path / "b.gpkg"))
+
+    work_folder = tmp_path / "work"
+    work_folder.mkdir()
+    metadata = {"resource_group":"2021-03","resource_id":"b.gpkg","compression":compression.ZSTD}
+    d_filename = str(work_folder / "b.gpkg")
+    result = verify.download_decompressed(FakeRepository(str(tmp_path)),metadata,d_filename)
+    assert result == (compressed_md5,compressed_size,uncompressed_md5,uncompressed_size)
+    with open(d_filename,"rb") as f:
+        assert f.read() == data
+    #the compressed file is removed
+    assert os.listdir(str(work_folder)) == ["b.gpkg"]
+
+def test_download_decompressed_stream(tmp_path,monkeypatch):
+    data = b"loggedpoint" * 1000
+    filename = str(tmp_path / "a.gpkg")
+    with open(filename,"wb") as f:
+        f.write(data)
+    uncompressed_md5,uncompressed_size,compressed_md5,compressed_size = compression.compress_file(filename,filename + ".zst")
+    with open(filename + ".zst","rb") as f:
+        compressed_data = f.read()
+    #the blob is downloaded in small chunks
+    monkeypatch.setattr(verify,"read_chunks",lambda metadata:(compressed_data[i:i + 100] for i in range(0,len(compressed_data),100)))
+
+    work_folder = tmp_path / "work"
+    work_folder.mkdir()
+    metadata = {"resource_group":"2021-03","resource_id":"a.gpkg","compression":compression.ZSTD}
+    d_filename = str(work_folder / "a.gpkg")
+    result = verify.download_decompressed(None,metadata,d_filename,stream=True)
+    assert result == (compressed_md5,compressed_size,uncompressed_md5,uncompressed_size)
+    with open(d_filename,"rb") as f:
+        assert f.read() == data
+    #no compressed file is saved
+    assert os.listdir(str(work_folder)) == ["a.gpkg"]
+
+    #the partially decompressed file is removed if the download failed
+    def _read_chunks(metadata):
+        yield compressed_data[:100]
+        raise Exception("Connection reset")
+    monkeypatch.setattr(verify,"read_chunks",_read_chunks)
+    with pytest.raises(Exception):
+        verify.download_decompressed(None,metadata,str(work_folder / "b.gpkg"),stream=True)
+    assert os.listdir(str(work_folder)) == ["a.gpkg"]
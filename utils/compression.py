@@ -0,0 +1,117 @@
+import gzip
+import zlib
+import hashlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZSTD = "zstd"
+GZIP = "gzip"
+#the file extension of the compressed file
+file_exts = {
+    ZSTD:".zst",
+    GZIP:".gz"
+}
+#the size of the chunk read from the source stream
+CHUNK_SIZE = 1024 * 1024
+
+def _check_codec(codec):
+    if codec not in file_exts:
+        raise Exception("Compression codec({}) Not Support".format(codec))
+    if codec == ZSTD and zstandard is None:
+        raise Exception("Please install the package 'zstandard' to compress or decompress file with codec({})".format(codec))
+
+class HashingWriter(object):
+    """
+    A writable file-like object which computes the md5 and size of the written data before writing them to the target file
+    checksum: compute the md5 if True; otherwise only the size is computed and md5 is None
+    """
+    def __init__(self,f,checksum=True):
+        self._f = f
+        self.md5 = hashlib.md5() if checksum else None
+        self.size = 0
+
+    def write(self,data):
+        if self.md5:
+            self.md5.update(data)
+        self.size += len(data)
+        return self._f.write(data)
+
+    @property
+    def hexdigest(self):
+        return self.md5.hexdigest() if self.md5 else None
+
+    def flush(self):
+        self._f.flush()
+
+def stream_writer(f,codec=ZSTD,level=3):
+    """
+    Return a writable file-like object which compresses the written data on the fly into the writable file-like object f.
+    The compressed data is flushed into f when the writer is closed, f is not closed by the writer
+    level: the compression level
+    """
+    _check_codec(codec)
+    if codec == GZIP:
+        return gzip.GzipFile(fileobj=f,mode="wb",compresslevel=level,mtime=0)
+    else:
+        return zstandard.ZstdCompressor(level=level,write_checksum=True).stream_writer(f,closefd=False)
+
+def compress_file(filename,compressed_file,codec=ZSTD,level=3):
+    """
+    Compress the file in one pass, the md5 of the source file and the compressed file are computed during compressing
+    level: the compression level
+    Return (uncompressed md5,uncompressed size,compressed md5,compressed size)
+    """
+    _check_codec(codec)
+    uncompressed_md5 = hashlib.md5()
+    uncompressed_size = 0
+    with open(filename,"rb") as src,open(compressed_file,"wb") as dest:
+        hashing_writer = HashingWriter(dest)
+        with stream_writer(hashing_writer,codec=codec,level=level) as writer:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                uncompressed_md5.update(chunk)
+                uncompressed_size += len(chunk)
+                writer.write(chunk)
+    return (uncompressed_md5.hexdigest(),uncompressed_size,hashing_writer.md5.hexdigest(),hashing_writer.size)
+
+def decompress_chunks(chunks,f,codec=ZSTD):
+    """
+    Decompress a stream of compressed chunks into the writable file-like object f, no compressed data is buffered
+    chunks: an iterable of compressed bytes
+    Return (compressed md5,compressed size,uncompressed md5,uncompressed size)
+    """
+    _check_codec(codec)
+    compressed_md5 = hashlib.md5()
+    compressed_size = 0
+    hashing_writer = HashingWriter(f)
+    if codec == GZIP:
+        decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+    else:
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+    for chunk in chunks:
+        compressed_md5.update(chunk)
+        compressed_size += len(chunk)
+        data = decompressor.decompress(chunk)
+        if data:
+            hashing_writer.write(data)
+    return (compressed_md5.hexdigest(),compressed_size,hashing_writer.md5.hexdigest(),hashing_writer.size)
+
+def _read_chunks(f):
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+def decompress_file(compressed_file,filename,codec=ZSTD):
+    """
+    Decompress the file
+    Return (compressed md5,compressed size,uncompressed md5,uncompressed size)
+    """
+    with open(compressed_file,"rb") as src,open(filename,"wb") as dest:
+        return decompress_chunks(_read_chunks(src),dest,codec=codec)
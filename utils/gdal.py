@@ -1,6 +1,12 @@
 import re
 import os
+import copy
+import threading
 import subprocess
+import collections
+
+from . import gpkg
+from . import geoparquet
 
 def detect_epsg(filename):
     gdal_cmd = ['gdalsrsinfo', '-e', filename]
@@ -19,6 +25,11 @@ layer_re = re.compile("[\r\n]+Layer name:")
 layer_info_re = re.compile("[\r\n]+(?P<key>[a-zA-Z0-9_\-][a-zA-Z0-9_\- ]*)[ \t]*[:=](?P<value>[^\r\n]*([\r\n]+(([ \t]+[^\r\n]*)|(GEOGCS[^\r\n]*)))*)")
 extent_re = re.compile("\s*\(\s*(?P<minx>-?[0-9\.]+)\s*\,\s*(?P<miny>-?[0-9\.]+)\s*\)\s*\-\s*\(\s*(?P<maxx>-?[0-9\.]+)\s*\,\s*(?P<maxy>-?[0-9\.]+)\s*\)\s*")
 field_re = re.compile("[ \t]*(?P<type>[a-zA-Z0-9]+)[ \t]*(\([ \t]*(?P<width>[0-9]+)\.(?P<precision>[0-9]+)\))?[ \t]*")
+#the cache of layers' metadata read from geopackage, key is (path,size,modify time,layer)
+_layers_cache = collections.OrderedDict()
+_layers_cache_lock = threading.Lock()
+_layers_cache_size = 256
+
 def get_layers(datasource,layer=None):
     """
     Get layers' meta data from spatial data file
@@ -29,6 +40,32 @@ def get_layers(datasource,layer=None):
        extent: the extent of the layer
        fid_column: the feature id column
        geometry_column: the geometry column
+    Geopackage's metadata is read from its system tables directly and cached by (path,size,modify time)
+    Geoparquet's metadata is read from its file metadata
+    """
+    if gpkg.is_geopackage(datasource):
+        file_status = os.stat(datasource)
+        key = (os.path.abspath(datasource),file_status.st_size,file_status.st_mtime_ns,layer)
+        with _layers_cache_lock:
+            layers = _layers_cache.get(key)
+            if layers is not None:
+                _layers_cache.move_to_end(key)
+                return copy.deepcopy(layers)
+
+        layers = gpkg.get_layers(datasource,layer=layer)
+        with _layers_cache_lock:
+            _layers_cache[key] = layers
+            while len(_layers_cache) > _layers_cache_size:
+                _layers_cache.popitem(last=False)
+        return copy.deepcopy(layers)
+    elif geoparquet.is_geoparquet(datasource):
+        return geoparquet.get_layers(datasource,layer=layer)
+    else:
+        return _get_layers_by_ogrinfo(datasource,layer=layer)
+
+def _get_layers_by_ogrinfo(datasource,layer=None):
+    """
+    Get layers' meta data from spatial data file by parsing the output of 'ogrinfo'
     """
     # needs gdal 1.10+
     infoIter = None
@@ -38,7 +75,7 @@ def get_layers(datasource,layer=None):
     cmd = "cd {0} && ogrinfo -al -so -ro {1}".format(folder,filename)
 
     if layer:
-        cmd.append(layer)
+        cmd = "{} {}".format(cmd,layer)
 
     def getLayerInfo(layerInfo):
         info = {"fields":[]}
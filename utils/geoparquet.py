@@ -0,0 +1,443 @@
+import os
+import json
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+    import pyarrow.compute as compute
+except ImportError:
+    pyarrow = None
+    parquet = None
+    compute = None
+
+from . import gpkg
+
+#the version of the geoparquet specification
+GEOPARQUET_VERSION = "1.0.0"
+#the default number of rows in a row group
+ROW_GROUP_SIZE = 128 * 1024
+#the default compression codec of the column chunks
+COMPRESSION = "zstd"
+
+#the geopackage field type to the arrow type name
+arrow_types = {
+    "INTEGER":"int64",
+    "MEDIUMINT":"int32",
+    "SMALLINT":"int16",
+    "TINYINT":"int8",
+    "BOOLEAN":"bool_",
+    "FLOAT":"float32",
+    "REAL":"float64",
+    "DOUBLE":"float64",
+    "BLOB":"binary"
+}
+
+#the compute function of the filter operator
+filter_functions = {
+    "=":"equal",
+    "<":"less",
+    "<=":"less_equal",
+    ">":"greater",
+    ">=":"greater_equal"
+}
+
+#the arrow type name to the geopackage field type
+gpkg_field_types = {
+    "int64":"INTEGER",
+    "int32":"MEDIUMINT",
+    "int16":"SMALLINT",
+    "int8":"TINYINT",
+    "bool":"BOOLEAN",
+    "float":"FLOAT",
+    "double":"REAL",
+    "binary":"BLOB",
+    "large_binary":"BLOB"
+}
+
+#the wkb geometry type to the geometry type name used in geoparquet metadata
+geojson_types = {
+    1:"Point",
+    2:"LineString",
+    3:"Polygon",
+    4:"MultiPoint",
+    5:"MultiLineString",
+    6:"MultiPolygon",
+    7:"GeometryCollection"
+}
+
+def _check_pyarrow():
+    if pyarrow is None:
+        raise Exception("Please install the package 'pyarrow' to read or write geoparquet")
+
+def get_arrow_type(field_type):
+    field_type = (field_type or "").upper().split("(")[0].strip()
+    return getattr(pyarrow,arrow_types.get(field_type,"string"))()
+
+def get_gpkg_field_type(arrow_type):
+    return gpkg_field_types.get(str(arrow_type),"TEXT")
+
+def is_geoparquet(filename):
+    """
+    Return True if the file is a parquet file
+    """
+    if os.path.splitext(filename)[1].lower() != ".parquet" or not os.path.isfile(filename):
+        return False
+    with open(filename,"rb") as f:
+        header = f.read(4)
+    return header == b"PAR1"
+
+def _get_geo_metadata(parquet_file):
+    #the 'geo' metadata is added into the file metadata after the data is written, so it is not in the arrow schema stored in the file
+    metadata = parquet_file.metadata.metadata or {}
+    if b"geo" not in metadata:
+        raise Exception("The parquet file is not a geoparquet file, the 'geo' metadata is missing")
+    return json.loads(metadata[b"geo"].decode())
+
+def get_layers(filename,layer=None):
+    """
+    Read the layer's metadata from the geoparquet file metadata without reading the data.
+    A geoparquet file has only one layer.
+    Return a list of layer's metadata which has the same structure as the metadata returned by 'utils.gdal.get_layers'
+    """
+    _check_pyarrow()
+    parquet_file = parquet.ParquetFile(filename)
+    try:
+        schema = parquet_file.schema_arrow
+        geo_metadata = _get_geo_metadata(parquet_file)
+        layer_name = (schema.metadata.get(b"layer") or os.path.splitext(os.path.basename(filename))[0].encode()).decode()
+        if layer and layer != layer_name:
+            return []
+        geometry_column = geo_metadata["primary_column"]
+        column_metadata = geo_metadata["columns"][geometry_column]
+        geometry_types = column_metadata.get("geometry_types") or []
+        info = {
+            "layer":layer_name,
+            "geometry":"{}{}".format("3D" if geometry_types[0].endswith(" Z") else "",geometry_types[0].split(" ")[0].upper()) if len(geometry_types) == 1 else "GEOMETRY",
+            "geometry_column":geometry_column,
+            "features":parquet_file.metadata.num_rows,
+            "fields":[gpkg.get_field(f.name,get_gpkg_field_type(f.type)) for f in schema if f.name != geometry_column]
+        }
+        if column_metadata.get("bbox"):
+            info["extent"] = list(column_metadata["bbox"])
+        return [info]
+    finally:
+        parquet_file.close()
+
+class GeoParquetWriter(object):
+    """
+    Write a feature layer into a new geoparquet file with pyarrow(14.0 or later).
+    It has the same interface as 'utils.gpkg.GeoPackageWriter'.
+    The rows are not sorted by the writer, the caller should write the rows in the required order,
+    and the min/max statistics of each row group are written for each column.
+    fields: a list of (field name, geopackage field type); the geometry column is not included in fields
+    geometry_column: the name of the geometry column, the geometry is stored as ISO wkb
+    srs_id: the spatial reference id of the geometries
+    srs_definition: the wkt definition of the spatial reference
+    batch_size: the number of rows in a row group; if None, use ROW_GROUP_SIZE
+    compression: the compression codec of the column chunks
+
+    Each written row is a tuple of the geometry wkb followed by the field values in the order of fields
+    """
+    def __init__(self,filename,layer,fields,geometry_column="geom",srs_id=4326,srs_definition=None,batch_size=None,compression=COMPRESSION,overwrite=True):
+        _check_pyarrow()
+        if os.path.exists(filename):
+            if overwrite:
+                os.remove(filename)
+            else:
+                raise Exception("The file({}) already exists".format(filename))
+        self.filename = filename
+        self.layer = layer
+        self.fields = fields
+        self.geometry_column = geometry_column
+        self.srs_id = srs_id
+        self.srs_definition = srs_definition
+        self.batch_size = batch_size or ROW_GROUP_SIZE
+        self.features = 0
+        self.extent = None
+        self._geometry_types = set()
+        self._has_z = False
+        self._columns = [[] for i in range(len(fields) + 1)]
+        self._schema = pyarrow.schema(
+            [pyarrow.field(geometry_column,pyarrow.binary())] + [pyarrow.field(name,get_arrow_type(field_type)) for name,field_type in fields],
+            metadata={"layer":layer}
+        )
+        self._writer = parquet.ParquetWriter(filename,self._schema,compression=compression,write_statistics=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,type,value,tb):
+        if type:
+            self.abort()
+        else:
+            self.close()
+
+    def write(self,row):
+        """
+        Write a feature
+        """
+        wkb = row[0]
+        if wkb is not None:
+            if isinstance(wkb,memoryview):
+                wkb = wkb.tobytes()
+            byteorder,geometry_type,has_z,has_m,has_srid = gpkg.parse_wkb_type(wkb)
+            self._geometry_types.add(geometry_type)
+            self._has_z = self._has_z or has_z
+            envelope = gpkg.wkb_envelope(wkb)
+            if envelope:
+                if self.extent is None:
+                    self.extent = list(envelope)
+                else:
+                    self.extent[0] = min(self.extent[0],envelope[0])
+                    self.extent[1] = max(self.extent[1],envelope[1])
+                    self.extent[2] = min(self.extent[2],envelope[2])
+                    self.extent[3] = max(self.extent[3],envelope[3])
+        self._columns[0].append(wkb)
+        for column,v in zip(self._columns[1:],row[1:]):
+            column.append(v)
+        self.features += 1
+        if len(self._columns[0]) >= self.batch_size:
+            self.flush()
+
+    def writemany(self,rows):
+        """
+        Write a list of features
+        """
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        """
+        Write the buffered features as a row group
+        """
+        if not self._columns[0]:
+            return
+        self._writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(column,type=field.type) for column,field in zip(self._columns,self._schema)],
+            schema=self._schema
+        ))
+        for column in self._columns:
+            column.clear()
+
+    def _get_geo_metadata(self):
+        geometry_types = sorted("{}{}".format(geojson_types[t]," Z" if self._has_z else "") for t in self._geometry_types if t in geojson_types)
+        column_metadata = {
+            "encoding":"WKB",
+            "geometry_types":geometry_types
+        }
+        if self.extent:
+            column_metadata["bbox"] = [self.extent[0],self.extent[2],self.extent[1],self.extent[3]]
+        if self.srs_id not in (-1,0,4326):
+            #the crs is optional and defaults to OGC:CRS84, only the identifier is recorded for other crs
+            column_metadata["crs"] = {"id":{"authority":"EPSG","code":self.srs_id}}
+        return {
+            "version":GEOPARQUET_VERSION,
+            "primary_column":self.geometry_column,
+            "columns":{self.geometry_column:column_metadata}
+        }
+
+    def close(self):
+        """
+        Flush the buffered features, write the geoparquet metadata and close the file
+        Return the layer metadata which has the same structure as the metadata returned by 'utils.gdal.get_layers'
+        """
+        if self._writer is None:
+            return self.metadata
+        try:
+            self.flush()
+            self._writer.add_key_value_metadata({"geo":json.dumps(self._get_geo_metadata())})
+        finally:
+            self._writer.close()
+            self._writer = None
+        return self.metadata
+
+    def abort(self):
+        """
+        Close the file and remove it
+        """
+        if self._writer:
+            try:
+                self._writer.close()
+            finally:
+                self._writer = None
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    @property
+    def metadata(self):
+        if len(self._geometry_types) == 1:
+            geometry_type_name = gpkg.geometry_type_names.get(next(iter(self._geometry_types)),"GEOMETRY")
+        else:
+            geometry_type_name = "GEOMETRY"
+        metadata = {
+            "layer":self.layer,
+            "geometry":geometry_type_name,
+            "features":self.features,
+            "geometry_column":self.geometry_column,
+            "fields":[gpkg.get_field(name,field_type) for name,field_type in self.fields]
+        }
+        if self.extent:
+            metadata["extent"] = [self.extent[0],self.extent[2],self.extent[1],self.extent[3]]
+        return metadata
+
+class GeoParquetReader(object):
+    """
+    Read the features from a geoparquet file with pyarrow.
+    It has the same interface as 'utils.gpkg.GeoPackageReader' except that sql conditions are not supported, use filters instead.
+    """
+    def __init__(self,filename,layer=None):
+        _check_pyarrow()
+        self.filename = filename
+        self._file = parquet.ParquetFile(filename)
+        try:
+            schema = self._file.schema_arrow
+            geo_metadata = _get_geo_metadata(self._file)
+            self.layer = (schema.metadata.get(b"layer") or os.path.splitext(os.path.basename(filename))[0].encode()).decode()
+            if layer and layer != self.layer:
+                raise Exception("Layer({}) is not found in geoparquet({})".format(layer,filename))
+            self.geometry_column = geo_metadata["primary_column"]
+            crs = geo_metadata["columns"][self.geometry_column].get("crs")
+            self.srs_id = crs["id"]["code"] if crs and crs.get("id") else 4326
+            self.fields = [(f.name,get_gpkg_field_type(f.type)) for f in schema if f.name != self.geometry_column]
+            self.fid_column = None
+            self.rtree_table = None
+        except:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,type,value,tb):
+        self.close()
+
+    def close(self):
+        if self._file:
+            try:
+                self._file.close()
+            finally:
+                self._file = None
+
+    @staticmethod
+    def _check_where(where):
+        if where:
+            raise Exception("Sql condition is not supported by geoparquet reader")
+
+    @staticmethod
+    def _in_bbox(wkb,bbox):
+        if wkb is None:
+            return False
+        envelope = gpkg.wkb_envelope(wkb)
+        return envelope is not None and envelope[0] <= bbox[2] and envelope[1] >= bbox[0] and envelope[2] <= bbox[3] and envelope[3] >= bbox[1]
+
+    def _get_filters(self,filters):
+        """
+        Return a list of (column,operator,value) whose value is converted to the arrow type of the column
+        """
+        gpkg.check_filters(filters)
+        schema = self._file.schema_arrow
+        result = []
+        for column,operator,value in filters or []:
+            column_type = schema.field(column).type
+            if operator == "in":
+                result.append((column,operator,pyarrow.array(list(value)).cast(column_type)))
+            else:
+                result.append((column,operator,pyarrow.scalar(value).cast(column_type)))
+        return result
+
+    @staticmethod
+    def _may_match(statistics,operator,value):
+        """
+        Return False if no value between the min and max value of the column chunk can match the filter
+        """
+        if statistics is None or not statistics.has_min_max:
+            return True
+        if operator == "in":
+            return any(v is not None and statistics.min <= v <= statistics.max for v in value.to_pylist())
+        value = value.as_py()
+        if operator == "=":
+            return statistics.min <= value <= statistics.max
+        elif operator == "<":
+            return statistics.min < value
+        elif operator == "<=":
+            return statistics.min <= value
+        elif operator == ">":
+            return statistics.max > value
+        else:
+            return statistics.max >= value
+
+    def _get_row_groups(self,filters):
+        """
+        Return the row groups which may contain the features matching the filters, the row groups are pruned with the min/max statistics of the column chunks
+        """
+        metadata = self._file.metadata
+        columns = {metadata.schema.column(i).path:i for i in range(metadata.num_columns)}
+        row_groups = []
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            if all(self._may_match(row_group.column(columns[column]).statistics,operator,value) for column,operator,value in filters if column in columns):
+                row_groups.append(i)
+        return row_groups
+
+    @staticmethod
+    def _filter_batch(batch,filters):
+        """
+        Return the rows of the batch matching the filters
+        """
+        mask = None
+        for column,operator,value in filters:
+            data = batch.column(batch.schema.get_field_index(column))
+            if operator == "in":
+                column_mask = compute.is_in(data,value_set=value)
+            else:
+                column_mask = getattr(compute,filter_functions[operator])(data,value)
+            mask = column_mask if mask is None else compute.and_(mask,column_mask)
+        return batch.filter(mask)
+
+    def _iter_batches(self,columns,filters=None,batch_size=10000):
+        """
+        A generator to read the batches of the columns, only the rows matching the filters are returned
+        """
+        filters = self._get_filters(filters)
+        if not filters:
+            yield from self._file.iter_batches(batch_size=batch_size,columns=columns)
+            return
+        row_groups = self._get_row_groups(filters)
+        if not row_groups:
+            return
+        read_columns = columns + [column for column in set(column for column,operator,value in filters) if column not in columns]
+        for batch in self._file.iter_batches(batch_size=batch_size,row_groups=row_groups,columns=read_columns):
+            batch = self._filter_batch(batch,filters)
+            if batch.num_rows:
+                yield batch
+
+    def distinct(self,column,where=None,params=(),bbox=None,filters=None):
+        """
+        Return the distinct values of the column
+        bbox: [minx,miny,maxx,maxy] to filter the features
+        filters: a list of (column,operator,value) to filter the features, see 'utils.gpkg.check_filters'
+        """
+        self._check_where(where)
+        values = set()
+        columns = [column,self.geometry_column] if bbox else [column]
+        for batch in self._iter_batches(columns,filters=filters):
+            if bbox:
+                values.update(v for v,wkb in zip(batch.column(0).to_pylist(),batch.column(1).to_pylist()) if self._in_bbox(wkb,bbox))
+            else:
+                values.update(batch.column(0).to_pylist())
+        return list(values)
+
+    def features(self,where=None,params=(),bbox=None,batch_size=10000,filters=None):
+        """
+        A generator to read the features, each feature is a tuple of the wkb geometry followed by the field values in the order of fields
+        bbox: [minx,miny,maxx,maxy] to filter the features
+        filters: a list of (column,operator,value) to filter the features, see 'utils.gpkg.check_filters'.
+                 the row groups which can't contain the matching features are skipped with the min/max statistics
+        """
+        self._check_where(where)
+        columns = [self.geometry_column] + [name for name,field_type in self.fields]
+        for batch in self._iter_batches(columns,filters=filters,batch_size=batch_size):
+            for row in zip(*(batch.column(i).to_pylist() for i in range(len(columns)))):
+                if bbox and not self._in_bbox(row[0],bbox):
+                    continue
+                yield row
@@ -0,0 +1,668 @@
+import os
+import struct
+import sqlite3
+import math
+from urllib.request import pathname2url
+
+#the application id of geopackage, 'GPKG'
+APPLICATION_ID = 0x47504B47
+#geopackage version 1.2
+USER_VERSION = 10200
+
+WGS84_DEFINITION = """GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563,AUTHORITY["EPSG","7030"]],AUTHORITY["EPSG","6326"]],PRIMEM["Greenwich",0,AUTHORITY["EPSG","8901"]],UNIT["degree",0.0174532925199433,AUTHORITY["EPSG","9122"]],AUTHORITY["EPSG","4326"]]"""
+
+create_metadata_tables_sql = [
+    """CREATE TABLE gpkg_spatial_ref_sys (
+    srs_name TEXT NOT NULL,
+    srs_id INTEGER NOT NULL PRIMARY KEY,
+    organization TEXT NOT NULL,
+    organization_coordsys_id INTEGER NOT NULL,
+    definition  TEXT NOT NULL,
+    description TEXT)""",
+    """CREATE TABLE gpkg_contents (
+    table_name TEXT NOT NULL PRIMARY KEY,
+    data_type TEXT NOT NULL,
+    identifier TEXT UNIQUE,
+    description TEXT DEFAULT '',
+    last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+    min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE,
+    srs_id INTEGER,
+    CONSTRAINT fk_gc_r_srs_id FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys(srs_id))""",
+    """CREATE TABLE gpkg_geometry_columns (
+    table_name TEXT NOT NULL,
+    column_name TEXT NOT NULL,
+    geometry_type_name TEXT NOT NULL,
+    srs_id INTEGER NOT NULL,
+    z TINYINT NOT NULL,
+    m TINYINT NOT NULL,
+    CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name),
+    CONSTRAINT uk_gc_table_name UNIQUE (table_name),
+    CONSTRAINT fk_gc_tn FOREIGN KEY (table_name) REFERENCES gpkg_contents(table_name),
+    CONSTRAINT fk_gc_srs FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys (srs_id))""",
+    """CREATE TABLE gpkg_extensions (
+    table_name TEXT,
+    column_name TEXT,
+    extension_name TEXT NOT NULL,
+    definition TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    CONSTRAINT ge_tce UNIQUE (table_name, column_name, extension_name))""",
+]
+
+default_spatial_ref_sys = [
+    ("Undefined cartesian SRS",-1,"NONE",-1,"undefined","undefined cartesian coordinate reference system"),
+    ("Undefined geographic SRS",0,"NONE",0,"undefined","undefined geographic coordinate reference system"),
+    ("WGS 84 geodetic",4326,"EPSG",4326,WGS84_DEFINITION,"longitude/latitude coordinates in decimal degrees on the WGS 84 spheroid"),
+]
+
+#wkb geometry type code to geopackage geometry type name
+geometry_type_names = {
+    0:"GEOMETRY",
+    1:"POINT",
+    2:"LINESTRING",
+    3:"POLYGON",
+    4:"MULTIPOINT",
+    5:"MULTILINESTRING",
+    6:"MULTIPOLYGON",
+    7:"GEOMETRYCOLLECTION"
+}
+
+#geopackage field type to ogr field type
+ogr_field_types = {
+    "INTEGER":"Integer64",
+    "INT":"Integer",
+    "MEDIUMINT":"Integer",
+    "SMALLINT":"Integer",
+    "TINYINT":"Integer",
+    "BOOLEAN":"Integer",
+    "REAL":"Real",
+    "DOUBLE":"Real",
+    "FLOAT":"Real",
+    "TEXT":"String",
+    "DATE":"Date",
+    "DATETIME":"DateTime",
+    "BLOB":"Binary"
+}
+
+def get_field(name,field_type):
+    """
+    Return the field metadata [name,ogr type,width,precision] which has the same structure as the field metadata returned by 'utils.gdal.get_layers'
+    """
+    field_type = (field_type or "").upper().strip()
+    width = "0"
+    if "(" in field_type:
+        field_type,width = field_type[:-1].split("(",1)
+        field_type = field_type.strip()
+        width = width.strip()
+    return [name.lower(),ogr_field_types.get(field_type,"String"),width,"0"]
+
+def quote(name):
+    """
+    Quote a sqlite identifier
+    """
+    return "\"{}\"".format(name.replace("\"","\"\""))
+
+def parse_wkb_type(wkb,offset=0):
+    """
+    Parse the geometry type from wkb(ISO wkb or postgis ewkb)
+    Return (byte order prefix, base geometry type, has z, has m, has srid)
+    """
+    byteorder = "<" if wkb[offset] == 1 else ">"
+    code = struct.unpack_from(byteorder + "I",wkb,offset + 1)[0]
+    has_z = bool(code & 0x80000000)
+    has_m = bool(code & 0x40000000)
+    has_srid = bool(code & 0x20000000)
+    code &= 0x0FFFFFFF
+    if code >= 3000:
+        has_z = has_m = True
+    elif code >= 2000:
+        has_m = True
+    elif code >= 1000:
+        has_z = True
+    return (byteorder,code % 1000,has_z,has_m,has_srid)
+
+def wkb_envelope(wkb):
+    """
+    Return the envelope [minx,maxx,miny,maxy] of the wkb geometry; return None if the geometry is empty
+    """
+    envelope = [math.inf,-math.inf,math.inf,-math.inf]
+
+    def _add_points(byteorder,offset,npoints,dims):
+        fmt = byteorder + "d" * dims
+        for i in range(npoints):
+            x,y = struct.unpack_from(fmt,wkb,offset)[0:2]
+            offset += 8 * dims
+            if math.isnan(x) or math.isnan(y):
+                continue
+            if x < envelope[0]:
+                envelope[0] = x
+            if x > envelope[1]:
+                envelope[1] = x
+            if y < envelope[2]:
+                envelope[2] = y
+            if y > envelope[3]:
+                envelope[3] = y
+        return offset
+
+    def _parse(offset):
+        byteorder,geometry_type,has_z,has_m,has_srid = parse_wkb_type(wkb,offset)
+        dims = 2 + (1 if has_z else 0) + (1 if has_m else 0)
+        offset += 5
+        if has_srid:
+            offset += 4
+        if geometry_type == 1:
+            return _add_points(byteorder,offset,1,dims)
+        count = struct.unpack_from(byteorder + "I",wkb,offset)[0]
+        offset += 4
+        if geometry_type == 2:
+            return _add_points(byteorder,offset,count,dims)
+        elif geometry_type == 3:
+            for i in range(count):
+                npoints = struct.unpack_from(byteorder + "I",wkb,offset)[0]
+                offset = _add_points(byteorder,offset + 4,npoints,dims)
+            return offset
+        elif geometry_type in (4,5,6,7):
+            for i in range(count):
+                offset = _parse(offset)
+            return offset
+        else:
+            raise Exception("Geometry type({}) Not Support".format(geometry_type))
+
+    _parse(0)
+    if envelope[0] == math.inf:
+        return None
+    return envelope
+
+def to_gpkg_geometry(wkb,srs_id):
+    """
+    Convert a wkb geometry to a geopackage geometry blob
+    Return (geopackage geometry, envelope)
+    """
+    byteorder,geometry_type,has_z,has_m,has_srid = parse_wkb_type(wkb)
+    if has_srid:
+        #postgis ewkb, remove the srid and the srid flag to get a standard wkb
+        code = struct.unpack_from(byteorder + "I",wkb,1)[0] & ~0x20000000
+        wkb = wkb[0:1] + struct.pack(byteorder + "I",code) + wkb[9:]
+    envelope = wkb_envelope(wkb)
+    if envelope is None:
+        #empty geometry
+        return (b"GP\x00" + struct.pack("<Bi",0x11,srs_id) + wkb,None)
+    elif geometry_type == 1:
+        #no envelope for point
+        return (b"GP\x00" + struct.pack("<Bi",0x01,srs_id) + wkb,envelope)
+    else:
+        return (b"GP\x00" + struct.pack("<Bi4d",0x03,srs_id,*envelope) + wkb,envelope)
+
+def from_gpkg_geometry(blob):
+    """
+    Convert a geopackage geometry blob to a standard wkb geometry
+    """
+    if blob is None:
+        return None
+    flags = blob[3]
+    envelope_indicator = (flags >> 1) & 0x07
+    envelope_size = (0,32,48,48,64)[envelope_indicator]
+    return bytes(blob[8 + envelope_size:])
+
+def _get_envelope(blob):
+    """
+    Return the envelope [minx,maxx,miny,maxy] of a geopackage geometry blob; return None if the geometry is null or empty
+    """
+    if blob is None or blob[3] & 0x10:
+        return None
+    flags = blob[3]
+    if (flags >> 1) & 0x07:
+        return list(struct.unpack_from("<4d" if flags & 0x01 else ">4d",blob,8))
+    return wkb_envelope(from_gpkg_geometry(blob))
+
+def _envelope_function(index):
+    def _func(blob):
+        envelope = _get_envelope(blob)
+        return envelope[index] if envelope else None
+    return _func
+
+def register_functions(conn):
+    """
+    Register the geopackage sql functions required by the rtree spatial index triggers
+    """
+    conn.create_function("ST_MinX",1,_envelope_function(0))
+    conn.create_function("ST_MaxX",1,_envelope_function(1))
+    conn.create_function("ST_MinY",1,_envelope_function(2))
+    conn.create_function("ST_MaxY",1,_envelope_function(3))
+    conn.create_function("ST_IsEmpty",1,lambda blob:None if blob is None else (1 if _get_envelope(blob) is None else 0))
+
+get_rtree_table = lambda table,column:"rtree_{}_{}".format(table,column)
+
+create_rtree_triggers_sql = [
+    ("_insert","""CREATE TRIGGER {trigger} AFTER INSERT ON {t}
+    WHEN (new.{c} NOT NULL AND NOT ST_IsEmpty(NEW.{c}))
+    BEGIN
+        INSERT OR REPLACE INTO {r} VALUES (NEW.{i},ST_MinX(NEW.{c}), ST_MaxX(NEW.{c}),ST_MinY(NEW.{c}), ST_MaxY(NEW.{c}));
+    END"""),
+    ("_update1","""CREATE TRIGGER {trigger} AFTER UPDATE OF {c} ON {t}
+    WHEN OLD.{i} = NEW.{i} AND (NEW.{c} NOTNULL AND NOT ST_IsEmpty(NEW.{c}))
+    BEGIN
+        INSERT OR REPLACE INTO {r} VALUES (NEW.{i},ST_MinX(NEW.{c}), ST_MaxX(NEW.{c}),ST_MinY(NEW.{c}), ST_MaxY(NEW.{c}));
+    END"""),
+    ("_update2","""CREATE TRIGGER {trigger} AFTER UPDATE OF {c} ON {t}
+    WHEN OLD.{i} = NEW.{i} AND (NEW.{c} ISNULL OR ST_IsEmpty(NEW.{c}))
+    BEGIN
+        DELETE FROM {r} WHERE id = OLD.{i};
+    END"""),
+    ("_update3","""CREATE TRIGGER {trigger} AFTER UPDATE ON {t}
+    WHEN OLD.{i} != NEW.{i} AND (NEW.{c} NOTNULL AND NOT ST_IsEmpty(NEW.{c}))
+    BEGIN
+        DELETE FROM {r} WHERE id = OLD.{i};
+        INSERT OR REPLACE INTO {r} VALUES (NEW.{i},ST_MinX(NEW.{c}), ST_MaxX(NEW.{c}),ST_MinY(NEW.{c}), ST_MaxY(NEW.{c}));
+    END"""),
+    ("_update4","""CREATE TRIGGER {trigger} AFTER UPDATE ON {t}
+    WHEN OLD.{i} != NEW.{i} AND (NEW.{c} ISNULL OR ST_IsEmpty(NEW.{c}))
+    BEGIN
+        DELETE FROM {r} WHERE id IN (OLD.{i}, NEW.{i});
+    END"""),
+    ("_delete","""CREATE TRIGGER {trigger} AFTER DELETE ON {t}
+    WHEN old.{c} NOT NULL
+    BEGIN
+        DELETE FROM {r} WHERE id = OLD.{i};
+    END"""),
+]
+
+def create_spatial_index(conn,table,column,fid_column="fid"):
+    """
+    Create and populate the rtree spatial index of the geometry column, and register the rtree extension
+    """
+    rtree_table = get_rtree_table(table,column)
+    register_functions(conn)
+    conn.execute("CREATE VIRTUAL TABLE {} USING rtree(id, minx, maxx, miny, maxy)".format(quote(rtree_table)))
+    conn.execute("INSERT INTO {0} SELECT {2},ST_MinX({3}),ST_MaxX({3}),ST_MinY({3}),ST_MaxY({3}) FROM {1} WHERE {3} NOT NULL AND NOT ST_IsEmpty({3})".format(
+        quote(rtree_table),
+        quote(table),
+        quote(fid_column),
+        quote(column)
+    ))
+    for suffix,sql in create_rtree_triggers_sql:
+        conn.execute(sql.format(trigger=quote(rtree_table + suffix),r=quote(rtree_table),t=quote(table),c=quote(column),i=quote(fid_column)))
+    conn.execute("INSERT INTO gpkg_extensions (table_name,column_name,extension_name,definition,scope) VALUES (?,?,'gpkg_rtree_index','http://www.geopackage.org/spec120/#extension_rtree','write-only')",(table,column))
+
+def create_geopackage(filename,overwrite=True):
+    """
+    Create an empty geopackage and return the sqlite connection
+    """
+    if os.path.exists(filename):
+        if overwrite:
+            os.remove(filename)
+        else:
+            raise Exception("The file({}) already exists".format(filename))
+
+    conn = sqlite3.connect(filename,isolation_level=None)
+    conn.execute("PRAGMA application_id = {}".format(APPLICATION_ID))
+    conn.execute("PRAGMA user_version = {}".format(USER_VERSION))
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("BEGIN")
+    for sql in create_metadata_tables_sql:
+        conn.execute(sql)
+    conn.executemany("INSERT INTO gpkg_spatial_ref_sys (srs_name,srs_id,organization,organization_coordsys_id,definition,description) VALUES (?,?,?,?,?,?)",default_spatial_ref_sys)
+    conn.execute("COMMIT")
+    return conn
+
+class GeoPackageWriter(object):
+    """
+    Write a feature layer into a new geopackage through sqlite3
+    fields: a list of (field name, geopackage field type); the geometry column is not included in fields
+    geometry_column: the name of the geometry column
+    srs_id: the spatial reference id of the geometries
+    srs_definition: the wkt definition of the spatial reference, only required if srs_id is not a default one(-1,0,4326)
+    batch_size: the number of features written in one transaction
+    spatial_index: if true, build the rtree spatial index after all features are written
+
+    Each written row is a tuple of the geometry wkb followed by the field values in the order of fields
+    """
+    def __init__(self,filename,layer,fields,geometry_column="geom",srs_id=4326,srs_definition=None,batch_size=10000,spatial_index=True,overwrite=True):
+        self.filename = filename
+        self.layer = layer
+        self.fields = fields
+        self.geometry_column = geometry_column
+        self.srs_id = srs_id
+        self.batch_size = batch_size
+        self.spatial_index = spatial_index
+        self.features = 0
+        self.extent = None
+        self._geometry_types = set()
+        self._has_z = False
+        self._has_m = False
+        self._batch = []
+
+        self._conn = create_geopackage(filename,overwrite=overwrite)
+        if srs_id not in (-1,0,4326):
+            if not srs_definition:
+                raise Exception("Please specify the definition of the spatial reference system({})".format(srs_id))
+            self._conn.execute("INSERT INTO gpkg_spatial_ref_sys (srs_name,srs_id,organization,organization_coordsys_id,definition) VALUES (?,?,?,?,?)",
+                ("EPSG:{}".format(srs_id),srs_id,"EPSG",srs_id,srs_definition))
+
+        columns = ["fid INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL","{} GEOMETRY".format(quote(geometry_column))]
+        columns.extend("{} {}".format(quote(name),field_type) for name,field_type in fields)
+        self._conn.execute("CREATE TABLE {} ({})".format(quote(layer),", ".join(columns)))
+        self._insert_sql = "INSERT INTO {} ({}) VALUES ({})".format(
+            quote(layer),
+            ",".join(quote(c) for c in [geometry_column] + [name for name,field_type in fields]),
+            ",".join(["?"] * (len(fields) + 1))
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,type,value,tb):
+        if type:
+            self.abort()
+        else:
+            self.close()
+
+    def write(self,row):
+        """
+        Write a feature
+        """
+        wkb = row[0]
+        if wkb is None:
+            self._batch.append(row)
+        else:
+            if isinstance(wkb,memoryview):
+                wkb = wkb.tobytes()
+            byteorder,geometry_type,has_z,has_m,has_srid = parse_wkb_type(wkb)
+            self._geometry_types.add(geometry_type)
+            self._has_z = self._has_z or has_z
+            self._has_m = self._has_m or has_m
+            geometry,envelope = to_gpkg_geometry(wkb,self.srs_id)
+            if envelope:
+                if self.extent is None:
+                    self.extent = list(envelope)
+                else:
+                    if envelope[0] < self.extent[0]:
+                        self.extent[0] = envelope[0]
+                    if envelope[1] > self.extent[1]:
+                        self.extent[1] = envelope[1]
+                    if envelope[2] < self.extent[2]:
+                        self.extent[2] = envelope[2]
+                    if envelope[3] > self.extent[3]:
+                        self.extent[3] = envelope[3]
+            self._batch.append((geometry,) + tuple(row[1:]))
+        self.features += 1
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def writemany(self,rows):
+        """
+        Write a list of features
+        """
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        """
+        Write the buffered features in one transaction
+        """
+        if not self._batch:
+            return
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(self._insert_sql,self._batch)
+            self._conn.execute("COMMIT")
+        except:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._batch.clear()
+
+    def _register_layer(self):
+        if len(self._geometry_types) == 1:
+            geometry_type_name = geometry_type_names.get(next(iter(self._geometry_types)),"GEOMETRY")
+        else:
+            geometry_type_name = "GEOMETRY"
+        extent = self.extent or [None,None,None,None]
+        self._conn.execute("INSERT INTO gpkg_contents (table_name,data_type,identifier,min_x,min_y,max_x,max_y,srs_id) VALUES (?,?,?,?,?,?,?,?)",
+            (self.layer,"features",self.layer,extent[0],extent[2],extent[1],extent[3],self.srs_id))
+        self._conn.execute("INSERT INTO gpkg_geometry_columns (table_name,column_name,geometry_type_name,srs_id,z,m) VALUES (?,?,?,?,?,?)",
+            (self.layer,self.geometry_column,geometry_type_name,self.srs_id,1 if self._has_z else 0,1 if self._has_m else 0))
+
+    def close(self):
+        """
+        Flush the buffered features, register the layer and close the geopackage
+        Return the layer metadata which has the same structure as the metadata returned by 'utils.gdal.get_layers'
+        """
+        if self._conn is None:
+            return self.metadata
+        try:
+            self.flush()
+            self._conn.execute("BEGIN")
+            self._register_layer()
+            if self.spatial_index:
+                create_spatial_index(self._conn,self.layer,self.geometry_column)
+            self._conn.execute("COMMIT")
+        finally:
+            self._conn.close()
+            self._conn = None
+        return self.metadata
+
+    def abort(self):
+        """
+        Close the geopackage and remove the file
+        """
+        if self._conn:
+            try:
+                self._conn.close()
+            finally:
+                self._conn = None
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    @property
+    def metadata(self):
+        if len(self._geometry_types) == 1:
+            geometry_type_name = geometry_type_names.get(next(iter(self._geometry_types)),"GEOMETRY")
+        else:
+            geometry_type_name = "GEOMETRY"
+        metadata = {
+            "layer":self.layer,
+            "geometry":geometry_type_name,
+            "features":self.features,
+            "fid_column":"fid",
+            "geometry_column":self.geometry_column,
+            "fields":[get_field(name,field_type) for name,field_type in self.fields]
+        }
+        if self.extent:
+            metadata["extent"] = [self.extent[0],self.extent[2],self.extent[1],self.extent[3]]
+        return metadata
+
+def connect(filename):
+    """
+    Open the geopackage in read only mode and return the sqlite connection
+    """
+    return sqlite3.connect("file:{}?mode=ro".format(pathname2url(os.path.abspath(filename))),uri=True)
+
+def is_geopackage(filename):
+    """
+    Return True if the file is a geopackage
+    """
+    if os.path.splitext(filename)[1].lower() != ".gpkg" or not os.path.isfile(filename):
+        return False
+    with open(filename,"rb") as f:
+        header = f.read(72)
+    #sqlite header and application id
+    return header[0:16] == b"SQLite format 3\x00" and header[68:72] in (b"GPKG",b"GP10",b"GP11")
+
+def get_layers(filename,layer=None):
+    """
+    Read the layers' metadata from the geopackage's system tables directly.
+    layer: only get the specified layer; if none, get all layers
+    Return a list of layer's metadata which has the same structure as the metadata returned by 'utils.gdal.get_layers'
+    """
+    layers = []
+    conn = connect(filename)
+    try:
+        has_ogr_contents = conn.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = 'gpkg_ogr_contents'").fetchone()[0] > 0
+        sql = """SELECT c.table_name,g.column_name,g.geometry_type_name,g.z,c.min_x,c.min_y,c.max_x,c.max_y 
+        FROM gpkg_contents c LEFT JOIN gpkg_geometry_columns g ON c.table_name = g.table_name 
+        WHERE c.data_type IN ('features','attributes')"""
+        if layer:
+            rows = conn.execute("{} AND c.table_name = ? ORDER BY c.rowid".format(sql),(layer,)).fetchall()
+        else:
+            rows = conn.execute("{} ORDER BY c.rowid".format(sql)).fetchall()
+
+        for table_name,geometry_column,geometry_type_name,z,min_x,min_y,max_x,max_y in rows:
+            info = {"layer":table_name,"fields":[]}
+            if geometry_column:
+                info["geometry"] = "{}{}".format("3D" if z == 1 else "",geometry_type_name.upper())
+                info["geometry_column"] = geometry_column
+            for cid,name,field_type,notnull,default,pk in conn.execute("PRAGMA table_info({})".format(quote(table_name))):
+                if pk and (field_type or "").upper() == "INTEGER":
+                    info["fid_column"] = name
+                elif name == geometry_column:
+                    continue
+                else:
+                    info["fields"].append(get_field(name,field_type))
+
+            features = None
+            if has_ogr_contents:
+                row = conn.execute("SELECT feature_count FROM gpkg_ogr_contents WHERE lower(table_name) = lower(?)",(table_name,)).fetchone()
+                features = row[0] if row else None
+            if features is None:
+                features = conn.execute("SELECT count(*) FROM {}".format(quote(table_name))).fetchone()[0]
+            info["features"] = features
+
+            if None not in (min_x,min_y,max_x,max_y):
+                info["extent"] = [min_x,min_y,max_x,max_y]
+            elif geometry_column:
+                rtree_table = get_rtree_table(table_name,geometry_column)
+                if conn.execute("SELECT count(*) FROM sqlite_master WHERE name = ?",(rtree_table,)).fetchone()[0]:
+                    row = conn.execute("SELECT min(minx),min(miny),max(maxx),max(maxy) FROM {}".format(quote(rtree_table))).fetchone()
+                    if row and row[0] is not None:
+                        info["extent"] = list(row)
+
+            layers.append(info)
+    finally:
+        conn.close()
+
+    return layers
+
+#the operators of the filters supported by the readers
+filter_operators = ("=","<","<=",">",">=","in")
+
+def check_filters(filters):
+    """
+    Check the filters of the readers
+    filters: a list of (column,operator,value) which are combined with 'AND'; the value of the operator 'in' is a list of values
+    """
+    for column,operator,value in filters or []:
+        if operator not in filter_operators:
+            raise Exception("Filter operator({}) Not Support".format(operator))
+
+class GeoPackageReader(object):
+    """
+    Read the features of a feature layer from a geopackage through sqlite3
+    layer: the layer to read; if None, read the first feature layer
+    """
+    def __init__(self,filename,layer=None):
+        self.filename = filename
+        self._conn = connect(filename)
+        try:
+            sql = "SELECT table_name,column_name,srs_id FROM gpkg_geometry_columns"
+            if layer:
+                row = self._conn.execute("{} WHERE table_name = ?".format(sql),(layer,)).fetchone()
+            else:
+                row = self._conn.execute("{} ORDER BY rowid LIMIT 1".format(sql)).fetchone()
+            if not row:
+                raise Exception("Layer({}) is not found in geopackage({})".format(layer or "",filename))
+            self.layer,self.geometry_column,self.srs_id = row
+            self.fields = []
+            self.fid_column = None
+            for cid,name,field_type,notnull,default,pk in self._conn.execute("PRAGMA table_info({})".format(quote(self.layer))):
+                if pk and (field_type or "").upper() == "INTEGER":
+                    self.fid_column = name
+                elif name != self.geometry_column:
+                    self.fields.append((name,(field_type or "TEXT").upper()))
+            self.rtree_table = get_rtree_table(self.layer,self.geometry_column)
+            if not self._conn.execute("SELECT count(*) FROM sqlite_master WHERE name = ?",(self.rtree_table,)).fetchone()[0]:
+                self.rtree_table = None
+        except:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,type,value,tb):
+        self.close()
+
+    def close(self):
+        if self._conn:
+            try:
+                self._conn.close()
+            finally:
+                self._conn = None
+
+    def _get_condition(self,where=None,params=(),bbox=None,filters=None):
+        """
+        Return (sql condition,params) to filter the features
+        where: the sql condition on the layer table with alias 'a'
+        bbox: [minx,miny,maxx,maxy]; only the features whose envelope intersects the bbox are returned.
+              the rtree spatial index is used if the layer has one
+        filters: a list of (column,operator,value), see 'check_filters'
+        """
+        check_filters(filters)
+        conditions = []
+        params = list(params or [])
+        if where:
+            conditions.append("({})".format(where))
+        for column,operator,value in filters or []:
+            if operator == "in":
+                conditions.append("a.{} IN ({})".format(quote(column),",".join("?" for v in value)))
+                params.extend(value)
+            else:
+                conditions.append("a.{} {} ?".format(quote(column),operator))
+                params.append(value)
+        if bbox:
+            minx,miny,maxx,maxy = bbox
+            if self.rtree_table and self.fid_column:
+                conditions.append("a.{} IN (SELECT id FROM {} WHERE minx <= ? AND maxx >= ? AND miny <= ? AND maxy >= ?)".format(quote(self.fid_column),quote(self.rtree_table)))
+            else:
+                register_functions(self._conn)
+                conditions.append("ST_MinX(a.{0}) <= ? AND ST_MaxX(a.{0}) >= ? AND ST_MinY(a.{0}) <= ? AND ST_MaxY(a.{0}) >= ?".format(quote(self.geometry_column)))
+            params.extend([maxx,minx,maxy,miny])
+        return (" AND ".join(conditions),params)
+
+    def distinct(self,column,where=None,params=(),bbox=None,filters=None):
+        """
+        Return the distinct values of the column
+        where: the sql condition to filter the features
+        bbox: [minx,miny,maxx,maxy] to filter the features
+        filters: a list of (column,operator,value) to filter the features
+        """
+        sql = "SELECT DISTINCT a.{} FROM {} a".format(quote(column),quote(self.layer))
+        condition,params = self._get_condition(where,params,bbox,filters)
+        if condition:
+            sql = "{} WHERE {}".format(sql,condition)
+        return [row[0] for row in self._conn.execute(sql,params)]
+
+    def features(self,where=None,params=(),bbox=None,batch_size=10000,filters=None):
+        """
+        A generator to read the features, each feature is a tuple of the wkb geometry followed by the field values in the order of fields
+        where: the sql condition to filter the features
+        bbox: [minx,miny,maxx,maxy] to filter the features
+        filters: a list of (column,operator,value) to filter the features
+        """
+        sql = "SELECT a.{},{} FROM {} a".format(quote(self.geometry_column),",".join("a.{}".format(quote(name)) for name,field_type in self.fields),quote(self.layer))
+        condition,params = self._get_condition(where,params,bbox,filters)
+        if condition:
+            sql = "{} WHERE {}".format(sql,condition)
+
+        cursor = self._conn.execute(sql,params)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    if row[0] is None:
+                        yield row
+                    else:
+                        yield (from_gpkg_geometry(row[0]),) + row[1:]
+        finally:
+            cursor.close()
@@ -26,6 +26,22 @@ def nativetime(d=None):
     else:
         return now()
 
+def fromtimestamp(ts):
+    """
+    Return the datetime with configured timezone from a posix timestamp
+    """
+    return pdatetime.fromtimestamp(ts,tz=settings.TZ)
+
+def parse(v):
+    """
+    Return the datetime with configured timezone from a datetime or an iso formated string, return None if v is empty
+    """
+    if not v:
+        return None
+    if isinstance(v,str):
+        v = pdatetime.fromisoformat(v)
+    return nativetime(v)
+
 def utctime(d=None):
     """
     Return the datetime with utc timezone, 